@@ -2,6 +2,10 @@
 
 import sys
 import re
+import time
+import random
+
+from .cache import LRUCache
 
 default_token = {
     'True'  : True,
@@ -85,6 +89,101 @@ def nested_bool_eval(token):
     return formatted_bool_eval(create_token(s))
 
 
+## ==================================================== ##
+
+_operators = {
+    id(default_token['&&']) : 'and',
+    id(default_token['||']) : 'or',
+}
+
+# Compiled expressions by source: {source: (function, number of keys)}
+MAX_COMPILED = 1000
+_compiled = LRUCache(MAX_COMPILED)
+
+
+def _is_key(x):
+    return not (callable(x) or x in ('(', ')', True, False))
+
+def _compile_node(node):
+    """
+        Makes a closure of the expression node, argument of the closure is a bitset of keys results
+    """
+    kind = node[0]
+
+    if kind not in ('key', 'const', 'node'):
+        raise TypeError('Invalid expression')
+
+    if kind == 'key':
+        mask = 1 << node[1]
+        return lambda bits: bits & mask and True or False
+
+    if kind == 'const':
+        value = node[1]
+        return lambda bits: value
+
+    left, right = _compile_node(node[2]), _compile_node(node[3])
+
+    if node[1] == 'and':
+        return lambda bits: left(bits) and right(bits)
+
+    return lambda bits: left(bits) or right(bits)
+
+def compile_token(token):
+    """
+        Compiles the token list into a closure with short-circuit evaluation.
+
+        Expression is reduced as `formatted_bool_eval` does (innermost parentheses first, then from left to right),
+        but over expression nodes instead of values, so the result is the same for any keys results.
+
+        Returns:
+            func  -- callable: func(bits) -> bool, bit `n` of `bits` is a result of the key number `n`
+            count -- int: number of keys
+    """
+    nodes = []
+    count = 0
+
+    for x in token:
+        if callable(x):
+            nodes.append(('op', _operators.get(id(x)) or 'and'))
+        elif x in ('(', ')'):
+            nodes.append(x)
+        elif x is True or x is False:
+            nodes.append(('const', x))
+        elif x in '(||&&)':
+            raise TypeError('Invalid key: %s' % x)
+        else:
+            nodes.append(('key', count))
+            count += 1
+
+    def _reduce(items):
+        if len(items) < 3 or not isinstance(items[1], tuple) or items[1][0] != 'op':
+            raise TypeError('Invalid expression')
+        return ('node', items[1][1], items[0], items[2])
+
+    if not nodes:
+        return (lambda bits: empty), count
+
+    while len(nodes) > 1:
+        has_parens, left, right = _parens(nodes)
+
+        if not has_parens:
+            nodes[:3] = [_reduce(nodes[:3])]
+        else:
+            nodes[left:right+1] = [_reduce(nodes[left+1:right])]
+
+    return _compile_node(nodes[0]), count
+
+def get_compiled(source, token=None):
+    """
+        Returns compiled expression of the source (cached by source string)
+    """
+    compiled = _compiled.get(source)
+    if compiled is None:
+        compiled = compile_token(token if token is not None else create_token(source))
+        _compiled.set(source, compiled)
+    return compiled
+
+
 class Token:
 
     def __init__(self):
@@ -93,16 +192,35 @@ class Token:
         self.eval_token = []
         self.is_evaluated = False
 
+        self._func = None
+        self._bits = 0
+
     def _init_state(self, source):
         self.source = source
         self.token = create_token(source)
         self.is_evaluated = False
 
+        try:
+            self._func = get_compiled(source, self.token)[0]
+        except (IndexError, TypeError):
+            self._func = None
+
     def __call__(self):
         if not self.is_evaluated:
             return False
+        if self._func is not None:
+            return self._func(self._bits)
         return formatted_bool_eval(self.eval_token)
 
+    def evaluate(self, bits):
+        """
+            Evaluates the expression by keys results bitset (bit `n` - result of the key number `n`)
+        """
+        if self._func is None:
+            self.set_values([{'res': bits >> n & 1} for n in range(len(self.get_keys()))])
+            return self()
+        return self._func(bits)
+
     def get_token(self):
         return self.token
 
@@ -128,6 +246,10 @@ class Token:
     def set_values(self, values=None):
         if not values:
             return
+        if self._func is not None:
+            self._bits = sum([1 << n for n, x in enumerate(values) if x['res']])
+            self.is_evaluated = True
+            return
         token = []
         n = 0
         for x in self.token:
@@ -148,11 +270,48 @@ def new_token():
     return Token()
 
 
+def _benchmark(source, count):
+    """
+        Compares the list evaluator (`formatted_bool_eval`) with the compiled expression
+    """
+    token = create_token(source)
+    func, keys = get_compiled(source, token)
+
+    samples = [random.getrandbits(max(keys, 1)) for n in range(count)]
+
+    started = time.time()
+    expected = []
+    for bits in samples:
+        values, n = [], 0
+        for x in token:
+            if _is_key(x):
+                values.append(bits >> n & 1 and True or False)
+                n += 1
+            else:
+                values.append(x)
+        expected.append(formatted_bool_eval(values))
+    list_time = time.time() - started
+
+    started = time.time()
+    results = [func(bits) for bits in samples]
+    compiled_time = time.time() - started
+
+    return keys, expected == results, list_time, compiled_time
+
+
 if __name__ == "__main__":
     argv = sys.argv
 
     if len(argv) < 2 or argv[1].lower() in ('/h', '/help', '-h', 'help', '--help'):
-        pass
+        print('--> Usage: python -m app.booleval <any> | benchmark <expression> [<count>]')
+    elif argv[1] == 'benchmark':
+        source = len(argv) > 2 and argv[2] or '(a && b) || (c && d) || e'
+        count = len(argv) > 3 and int(argv[3]) or 100000
+
+        keys, is_valid, list_time, compiled_time = _benchmark(source, count)
+
+        print('--> %s, keys: %d, count: %d, valid: %s' % (source, keys, count, is_valid))
+        print('--> list evaluator: %.3f sec, compiled: %.3f sec' % (list_time, compiled_time))
     else:
         token = new_token()
 
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+        Simple thread-safe LRU-cache (least recently used items are evicted first).
+
+        Arguments:
+            size     -- int: max number of items, 0 - unlimited
+    """
+
+    def __init__(self, size=0):
+        self._items = OrderedDict()
+        self._lock = threading.RLock()
+
+        self.size = size or 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return default
+
+            self._items.move_to_end(key)
+            self.hits += 1
+
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+            self._items[key] = value
+
+            while self.size and len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return { \
+            'size'   : len(self._items),
+            'limit'  : self.size,
+            'hits'   : self.hits,
+            'misses' : self.misses,
+        }
+
+
+class AliasCache:
+    """
+        Process-wide cache of Client Aliases (`SHOW_Aliases_vw`).
+
+        All the aliases are loaded by one query (`loader`) and indexed by Client name and by alias.
+        Aliases of a client are looked up as the DB-filter does (`Aliases like '%client%' or Name=client`)
+        once, the result is kept until the cache is expired (`ttl`) or invalidated.
+
+        Arguments:
+            ttl      -- int: time to live of loaded aliases (sec), 0 - forever
+    """
+
+    def __init__(self, ttl=0):
+        self._lock = threading.RLock()
+
+        self.ttl = ttl or 0
+
+        self._reset()
+
+    def _reset(self):
+        self._rows = []
+        self._names = {}
+        self._aliases = {}
+        self._clients = {}
+        self._loaded = None
+
+    @property
+    def loaded(self):
+        return self._loaded is not None
+
+    def is_expired(self):
+        if self._loaded is None:
+            return True
+        return self.ttl and time.time() - self._loaded > self.ttl or False
+
+    def invalidate(self):
+        """
+            Drops loaded aliases, they will be loaded again by the next lookup
+        """
+        with self._lock:
+            self._reset()
+
+    def load(self, rows):
+        """
+            Indexes the aliases.
+
+            Arguments:
+                rows     -- list: (Name, Aliases) items, `Aliases` is a string splitted by ':'
+        """
+        with self._lock:
+            self._reset()
+
+            for name, aliases in rows:
+                items = aliases and [x for x in aliases.split(':') if x] or []
+
+                self._rows.append((name, aliases or '', items,))
+
+                if name:
+                    self._names.setdefault(name, []).extend(items)
+                for alias in items:
+                    self._aliases.setdefault(alias, set()).add(name)
+
+            self._loaded = time.time()
+
+    def get(self, client, loader=None):
+        """
+            Returns aliases list of the client (a new list, the client itself included).
+
+            Arguments:
+                client   -- string: Client name
+                loader   -- func: callable returning rows for `load`, None if failed
+        """
+        if not client:
+            return []
+
+        with self._lock:
+            if self.is_expired() and loader is not None:
+                rows = loader()
+                if rows is not None:
+                    self.load(rows)
+
+            if client not in self._clients:
+                aliases = set([client])
+                aliases.update(self._names.get(client) or ())
+
+                key = client.lower()
+                for name, value, items in self._rows:
+                    if key in value.lower() or name and name.lower() == key:
+                        aliases.update(items)
+
+                self._clients[client] = tuple(aliases)
+
+            return list(self._clients[client])
+
+    def clients(self, alias):
+        """
+            Returns names of clients having the given alias
+        """
+        return set(self._aliases.get(alias) or ())
+
+    def stats(self):
+        return { \
+            'rows'    : len(self._rows),
+            'clients' : len(self._clients),
+            'aliases' : len(self._aliases),
+            'loaded'  : self._loaded,
+        }
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import time
+import hashlib
+import threading
+import sqlite3
+
+# Size of the file tail to find the last line, max size of the line (bytes)
+LINE_BLOCK_SIZE = 1024*4
+MAX_LINE_SIZE = 1024*64
+# Checkpoints not updated for the given number of days are dropped
+DEFAULT_KEEP_DAYS = 7
+
+EOL = b'\n'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS checkpoints (
+    filename  TEXT PRIMARY KEY,
+    inode     INTEGER,
+    size      INTEGER,
+    mtime     REAL,
+    offset    INTEGER,
+    line_hash TEXT,
+    updated   REAL
+)
+'''
+
+
+def fingerprint(filename):
+    """
+        Returns (inode, size, mtime) of the file or None if it doesn't exist
+    """
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime,)
+
+
+def last_line_hash(filename, offset):
+    """
+        Returns hash of the last line before the given offset (the line ends at `offset`)
+    """
+    if not offset:
+        return None
+
+    size = LINE_BLOCK_SIZE
+
+    try:
+        with open(filename, 'rb') as fin:
+            while True:
+                start = max(0, offset - size)
+                fin.seek(start, 0)
+                data = fin.read(offset - start)
+
+                if len(data) < offset - start:
+                    return None
+
+                n = data.rfind(EOL, 0, len(data) - 1)
+
+                if n > -1 or start == 0 or size >= MAX_LINE_SIZE:
+                    break
+
+                size *= 4
+    except (IOError, OSError):
+        return None
+
+    return hashlib.md5(data[n+1:]).hexdigest()
+
+
+class CheckpointStore:
+    """
+        Durable store of Log-files read offsets (local SQLite).
+
+        Keeps for every Log-file: fingerprint (inode, size, mtime), offset of the end of the last registered line
+        and hash of this line. Checkpoints are loaded at start-up, updated by `set` and written to the store
+        by `commit` (after successful registration of Log-items), in one transaction.
+
+        Offset is given back by `resume` only if the file is the same: rotated (other inode), truncated
+        (size less than offset) or rewritten (other last line) files are read from the beginning.
+
+        Arguments:
+            path        -- string: SQLite database file
+            keep_days   -- int: drop checkpoints not updated for the given number of days
+    """
+
+    def __init__(self, path, keep_days=None):
+        self.path = path
+        self.keep_days = keep_days or DEFAULT_KEEP_DAYS
+
+        self._items = {}
+        self._pending = {}
+        self._lock = threading.RLock()
+
+        self.resumed = 0
+        self.reset = {}
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+        self.load()
+
+    def load(self):
+        """
+            Loads (replays) the checkpoints, the old ones are dropped
+        """
+        with self._lock:
+            self._conn.execute('DELETE FROM checkpoints WHERE updated < ?', (time.time() - self.keep_days * 86400,))
+            self._conn.commit()
+
+            self._items = {}
+
+            for row in self._conn.execute('SELECT filename, inode, size, mtime, offset, line_hash FROM checkpoints'):
+                self._items[row[0]] = tuple(row[1:])
+
+        return len(self._items)
+
+    def get(self, filename):
+        return self._items.get(filename)
+
+    def resume(self, filename):
+        """
+            Returns offset to resume reading of the Log-file from (0 - from the beginning)
+        """
+        item = self._items.get(filename)
+
+        if item is None:
+            return 0
+
+        inode, size, mtime, offset, line_hash = item
+
+        info = fingerprint(filename)
+
+        if info is None:
+            reason = 'deleted'
+        elif inode and info[0] and info[0] != inode:
+            reason = 'rotated'
+        elif info[1] < offset:
+            reason = 'truncated'
+        elif line_hash and last_line_hash(filename, offset) != line_hash:
+            reason = 'rewritten'
+        else:
+            self.resumed += 1
+            return offset
+
+        self.reset[reason] = self.reset.get(reason, 0) + 1
+
+        with self._lock:
+            self._items.pop(filename, None)
+            self._pending[filename] = None
+
+        return 0
+
+    def set(self, filename, offset):
+        """
+            Sets a new checkpoint of the Log-file (kept till `commit`)
+        """
+        if not offset:
+            return
+
+        info = fingerprint(filename)
+        if info is None:
+            return
+
+        item = info + (offset, last_line_hash(filename, offset),)
+
+        with self._lock:
+            self._pending[filename] = item
+
+    def discard(self, filenames):
+        """
+            Drops pending checkpoints of the given Log-files (their Log-items are not registered)
+        """
+        with self._lock:
+            for filename in filenames:
+                self._pending.pop(filename, None)
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def commit(self):
+        """
+            Writes the pending checkpoints. Returns number of written items.
+        """
+        with self._lock:
+            if not self._pending:
+                return 0
+
+            items, self._pending = self._pending, {}
+
+            now = time.time()
+
+            self._conn.executemany('DELETE FROM checkpoints WHERE filename = ?',
+                                   [(x,) for x, item in items.items() if item is None])
+            self._conn.executemany('INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                   [(x,) + item + (now,) for x, item in items.items() if item is not None])
+            self._conn.commit()
+
+            for filename, item in items.items():
+                if item is None:
+                    self._items.pop(filename, None)
+                else:
+                    self._items[filename] = item
+
+        return len(items)
+
+    def close(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            self.commit()
+            self._conn.close()
+            self._conn = None
+
+    def stats(self):
+        return { \
+            'files'   : len(self._items),
+            'pending' : len(self._pending),
+            'resumed' : self.resumed,
+            'reset'   : self.reset,
+        }
+
+
+if __name__ == "__main__":
+    argv = sys.argv
+
+    if len(argv) < 2 or argv[1].lower() in ('/h', '/help', '-h', 'help', '--help'):
+        print('--> Usage: python -m app.checkpoints <checkpoints.db> [<Log-file>...]')
+        print('--> Prints checkpoints of the given Log-files (all by default) and offsets to resume from')
+    else:
+        store = CheckpointStore(argv[1])
+
+        for filename in argv[2:] or sorted(store._items.keys()):
+            print('--> %s: %s resume: %s' % (filename, store.get(filename), store.resume(filename)))
@@ -1,19 +1,24 @@
 ﻿# -*- coding: utf-8 -*-
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
 import pymssql
+import threading
 import time
 
 from config import (
-     CONNECTION, IsDebug, IsDeepDebug, IsPrintExceptions,
-     default_unicode, default_encoding, default_iso,
+     CONNECTION, DB_POOL, IsDebug, IsDeepDebug, IsPrintExceptions,
+     default_unicode, default_encoding, default_iso,
      print_to, print_exception
      )
 
 from .utils import splitter, worder, getMaskedPAN
+from . import metrics
 
 default_connection = CONNECTION['bankperso']
 
+# SQL Server limit of parameters count per request (2100) with a reserve
+_MAX_BATCH_PARAMS = 2000
+
 database_config = { \
     # ---------
     # BANKPERSO
@@ -709,6 +714,11 @@ database_config = { \
         },
         'export'  : ('TID', 'SourceID', 'ModuleID', 'LogID', 'FileID', 'FileName', 'BatchID', 'Client', 'Code', 'Count', 'Message', 'IsError', 'IsWarning', 'IsInfo', 'SystemType', 'IP', 'Root', 'Module', 'LogFile', 'EventDate', 'RD'),
     },
+    # Dimensions view (Source/Module/Log, one row per Log), not in OrderLog by default: used by `dimensions_warm`
+    'orderlog-dimensions' : { \
+        'columns' : ('SourceID', 'ModuleID', 'LogID', 'Module', 'ModulePath', 'LogFile',),
+        'view'    : '[OrderLog].[dbo].[WEB_OrderLogDimensions_vw]',
+    },
     'orderlog-check-source' : { \
         'params'  : "0,'%(root)s','%(ip)s','%(ctype)s',null",
         'args'    : '0,%s,%s,%s,null',
@@ -741,21 +751,183 @@ for item in database_config:
         if database_config[item][key] == 'self':
             database_config[item][key] = database_config[parent][key]
 
+##  -----------------------
+##  Pooled Engines Registry
+##  -----------------------
+
+_pool_lock = threading.Lock()
+_pooled_engines = {}
+_pool_stats = {}
+# Pool statistics are updated by pool events of any thread
+_stats_lock = threading.Lock()
+
+def _engine_url(connection):
+    return 'mssql+pymssql://%(user)s:%(password)s@%(server)s' % connection
+
+def get_pool_config(connection):
+    """
+        Pool settings of the given connection: `DB_POOL` defaults updated by `connection['pool']`
+    """
+    config = dict(DB_POOL)
+    config.update(connection.get('pool') or {})
+    return config
+
+def _make_pool_stats():
+    return { \
+        'created'    : 0,    # number of DBAPI connections opened by the pool
+        'checkouts'  : 0,    # number of connections taken from the pool
+        'waits'      : 0,    # number of checkouts made while the pool was exhausted
+        'wait_time'  : 0.0,  # total time of such waits (sec)
+        'pings'      : 0,    # number of pre-ping failures (dead connections)
+        'reconnects' : 0,    # number of pool recreations on errors
+    }
+
+def _count_pool_stats(stats, key, value=1):
+    with _stats_lock:
+        stats[key] += value
+
+def _set_pool_listeners(name, engine, config):
+    stats = _pool_stats[name]
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        _count_pool_stats(stats, 'created')
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        _count_pool_stats(stats, 'checkouts')
+
+        if not config.get('pre_ping'):
+            return
+
+        # ---------------------------------------------------------
+        # Ping connection, the pool retries checkout with a new one
+        # ---------------------------------------------------------
+
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+            cursor.fetchall()
+        except:
+            _count_pool_stats(stats, 'pings')
+            raise exc.DisconnectionError()
+        finally:
+            try:
+                cursor.close()
+            except:
+                pass
+
+def _create_pooled_engine(name, connection):
+    config = get_pool_config(connection)
+
+    engine = create_engine(_engine_url(connection),
+                           pool_size=config.get('size') or 5,
+                           max_overflow=config.get('overflow') or 0,
+                           pool_timeout=config.get('timeout') or 30,
+                           pool_recycle=config.get('recycle') or -1,
+                           )
+
+    if name not in _pool_stats:
+        _pool_stats[name] = _make_pool_stats()
+
+    _set_pool_listeners(name, engine, config)
+
+    if IsDeepDebug:
+        print('>>> pooled engine[%s] created: %s' % (name, engine.pool.status()))
+
+    return engine
+
+def get_pooled_engine(name, connection):
+    """
+        Returns long-lived pooled engine for the given `CONNECTION` item (one per process).
+    """
+    with _pool_lock:
+        engine = _pooled_engines.get(name)
+        if engine is None:
+            engine = _pooled_engines[name] = _create_pooled_engine(name, connection)
+        return engine
+
+def dispose_pooled_engine(name, reconnect=False):
+    """
+        Closes pooled connections of the given engine, next checkout opens a new one.
+
+        Keyword arguments:
+            reconnect -- boolean: disposed on error, count it as reconnect
+    """
+    with _pool_lock:
+        engine = _pooled_engines.get(name)
+        if engine is None:
+            return
+        try:
+            engine.dispose()
+        except:
+            if IsPrintExceptions:
+                print_exception()
+
+        if reconnect:
+            _count_pool_stats(_pool_stats[name], 'reconnects')
+
+    if IsDebug:
+        print_to(None, '!!! pooled engine disposed[%s], reconnect:%s' % (name, reconnect))
+
+def pool_stats(name=None):
+    """
+        Returns pool statistics: {name: {checkouts, waits, reconnects...}}
+    """
+    stats = {}
+    with _pool_lock:
+        for key, engine in _pooled_engines.items():
+            if name and key != name:
+                continue
+            with _stats_lock:
+                stats[key] = dict(_pool_stats.get(key) or {})
+            stats[key]['checkedout'] = engine.pool.checkedout()
+            stats[key]['status'] = engine.pool.status()
+    return stats
+
 
 class BankPersoEngine():
     
-    def __init__(self, name=None, user=None, connection=None):
-        self.name = name or 'default'
+    def __init__(self, name=None, user=None, connection=None, pooled=None):
+        self.name = name or 'default'
         self.connection = connection or default_connection
         self.engine = None
-        self.conn = None
-        self.engine_error = False
-        self.user = user
+        self.conn = None
+        self.engine_error = False
+        self.user = user
+
+        if pooled is None:
+            pooled = get_pool_config(self.connection).get('pooled')
+
+        self.pooled = pooled and True or False
 
         self.create_engine()
 
     def create_engine(self):
-        self.engine = create_engine('mssql+pymssql://%(user)s:%(password)s@%(server)s' % self.connection)
+        if self.pooled:
+            self.engine = get_pooled_engine(self.name, self.connection)
+        else:
+            self.engine = create_engine(_engine_url(self.connection))
+
+    def _connect(self):
+        if not self.pooled:
+            return self.engine.connect()
+
+        # The checkout waits only if the pool and its overflow are exhausted
+        pool = self.engine.pool
+        overflow = get_pool_config(self.connection).get('overflow') or 0
+        is_busy = pool.checkedout() >= pool.size() + overflow
+        started = time.time()
+
+        conn = self.engine.connect()
+
+        if is_busy:
+            stats = _pool_stats[self.name]
+            with _stats_lock:
+                stats['waits'] += 1
+                stats['wait_time'] += time.time() - started
+
+        return conn
 
     def open(self):
         n = 1
@@ -763,7 +935,7 @@ class BankPersoEngine():
             try:
                 if self.engine is None:
                     self.create_engine()
-                self.conn = self.engine.connect()
+                self.conn = self._connect()
                 self.engine_error = False
 
                 if IsDeepDebug:
@@ -774,6 +946,8 @@ class BankPersoEngine():
                 n += 1
 
                 if n > 3:
+                    if self.pooled:
+                        dispose_pooled_engine(self.name, reconnect=True)
                     self.engine = None
 
                 self.conn = None
@@ -820,7 +994,97 @@ class BankPersoEngine():
         if IsDeepDebug:
             print('>>> %s' % sql)
 
-        return self.run(sql, args=args, no_cursor=no_cursor)
+        started = metrics.enabled and time.time()
+
+        rows = self.run(sql, args=args, no_cursor=no_cursor)
+
+        if started:
+            metrics.db_procedure_seconds.observe(time.time() - started, name)
+
+        return rows
+
+    def runProcedureBatch(self, name, items):
+        """
+            Executes database stored procedure for every item as one SQL batch inside a single transaction.
+            The batch is splitted into chunks to stay under SQL Server parameters limit.
+
+            Arguments:
+                name   -- string: `database_config` item with `exec` and `args`
+                items  -- list of tuples: `args` values of every procedure call
+
+            Returns:
+                rows   -- list: the first row of every procedure response (in order of `items`),
+                          None if the batch was failed (rolled back)
+        """
+        if self.engine_error or not items:
+            return None
+
+        sql = 'EXEC %(sql)s %(args)s' % { \
+            'sql'    : database_config[name]['exec'],
+            'args'   : database_config[name]['args'],
+        }
+
+        size = max(1, _MAX_BATCH_PARAMS // max(1, len(items[0])))
+
+        started = metrics.enabled and time.time()
+
+        self.open()
+
+        if self.engine is None or self.conn is None or self.conn.closed:
+            return None
+
+        rows = []
+
+        with self.conn.begin() as trans:
+            try:
+                cursor = self.conn.connection.cursor()
+
+                for n in range(0, len(items), size):
+                    chunk = items[n:n+size]
+                    batch = 'SET NOCOUNT ON; %s' % '; '.join([sql] * len(chunk))
+                    args = tuple([x for item in chunk for x in item])
+
+                    if IsDeepDebug:
+                        print('>>> batch[%s]: %d' % (name, len(chunk)))
+
+                    cursor.execute(batch, args)
+
+                    # -------------------------------------------
+                    # Every procedure call gives its own resultset
+                    # -------------------------------------------
+
+                    responses = []
+                    while True:
+                        responses.append(cursor.fetchone())
+                        if not cursor.nextset():
+                            break
+
+                    if len(responses) != len(chunk):
+                        raise ValueError('Unexpected number of resultsets: %d, expected: %d' % (len(responses), len(chunk)))
+
+                    rows += responses
+
+                cursor.close()
+                trans.commit()
+            except:
+                try:
+                    trans.rollback()
+                except:
+                    pass
+
+                print_to(None, 'NO SQL BATCH EXEC: %s [%d]' % (sql, len(items)))
+
+                if IsPrintExceptions:
+                    print_exception()
+
+                rows = None
+
+        self.close()
+
+        if started:
+            metrics.db_procedure_seconds.observe(time.time() - started, name)
+
+        return rows
 
     def runQuery(self, name, top=None, columns=None, where=None, order=None, distinct=False, as_dict=False, **kw):
         """
@@ -873,6 +1137,8 @@ class BankPersoEngine():
         encode_columns = kw.get('encode_columns') or []
         worder_columns = kw.get('worder_columns') or []
 
+        started = metrics.enabled and time.time()
+
         cursor = self.execute(sql)
 
         if cursor and not cursor.closed:
@@ -889,6 +1155,9 @@ class BankPersoEngine():
 
             cursor.close()
 
+        if started:
+            metrics.db_query_seconds.observe(time.time() - started, name)
+
         return rows
 
     def run(self, sql, args=None, no_cursor=False):
@@ -949,6 +1218,10 @@ class BankPersoEngine():
         return res
 
     def dispose(self):
+        if self.pooled:
+            dispose_pooled_engine(self.name)
+            return
+
         try:
             self.engine.dispose()
         except:
@@ -963,8 +1236,11 @@ class BankPersoEngine():
         except:
             pass
 
-        if IsDeepDebug:
-            print('>>> close connection[%s]' % self.name)
+        if IsDeepDebug:
+            print('>>> close connection[%s]' % self.name)
 
         self.conn = None
-        self.engine = None
+
+        # Pooled engine lives as long as the process, connection is returned to the pool
+        if not self.pooled:
+            self.engine = None
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+try:
+    from sys import intern
+except ImportError:
+    intern = None
+
+# Item attributes: Log-line columns (all the sources), Order attributes, error info
+LOGITEM_FIELDS = ('filename', 'Date', 'Time', 'Module', 'Code', 'Message', 'bp_fileid', 'bp_filename', 'client', 'exception',)
+
+# Attributes of repeated values (interned)
+LOGITEM_INTERNED = ('filename', 'bp_filename', 'client', 'Code',)
+
+
+class LogItem(object):
+    """
+        Compact Log-item record (slotted), used instead of per-line dicts by the Log-lines getters.
+
+        Gives the mapping access to its attributes as the dict did (`ob['Date']`, `ob.get`, `in`, `update`),
+        missing attributes are not in the item. Repeated string values (filename, client...) are interned.
+        Keys not in `LOGITEM_FIELDS` are kept in `extra` dict.
+
+        Arguments:
+            filename    -- string: Log-file name
+    """
+
+    __slots__ = LOGITEM_FIELDS + ('extra',)
+
+    def __init__(self, filename=None):
+        self.extra = None
+
+        if filename is not None:
+            self['filename'] = filename
+
+    def __getitem__(self, key):
+        if key in LOGITEM_FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+
+    def __setitem__(self, key, value):
+        if key in LOGITEM_FIELDS:
+            if intern is not None and key in LOGITEM_INTERNED and type(value) is str:
+                value = intern(value)
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in LOGITEM_FIELDS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        elif self.extra is not None and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in LOGITEM_FIELDS:
+            return hasattr(self, key)
+        return self.extra is not None and key in self.extra
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, (LogItem, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        x = self.__eq__(other)
+        return x if x is NotImplemented else not x
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'LogItem(%r)' % dict(self.items())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        keys = [x for x in LOGITEM_FIELDS if hasattr(self, x)]
+        if self.extra:
+            keys.extend(self.extra.keys())
+        return keys
+
+    def items(self):
+        return [(x, self[x]) for x in self.keys()]
+
+    def values(self):
+        return [self[x] for x in self.keys()]
+
+    def update(self, values=None, **kw):
+        for key, value in (values or {}).items():
+            self[key] = value
+        for key, value in kw.items():
+            self[key] = value
+
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def as_dict(self):
+        return dict(self.items())
+
+
+def _synthetic_lines(count, files):
+    """
+        Makes Bankperso-like Log-lines of a synthetic day: (filename, line)
+    """
+    codes = ('INFO', 'INFO', 'INFO', 'WARNING', 'ERROR',)
+    for n in range(count):
+        filename = '//persoserver/Bankperso/Bin/Log_Client%03d/20240105_Load_SyncroRes.log' % (n % files)
+        line = '2024-01-05 %02d:%02d:%02d\t[%s]\tFileID:%d TZ:%d file processed, records:%d' % (
+            n // 3600 % 24, n // 60 % 60, n % 60, codes[n % len(codes)], 100000 + n % 3000, n % 97, n)
+        yield filename, line
+
+
+def _measure(count, files, factory):
+    import tracemalloc
+    import gc
+
+    gc.collect()
+    tracemalloc.start()
+
+    items = []
+    for filename, line in _synthetic_lines(count, files):
+        date, code, message = line.split('\t')
+        ob = factory('%s' % filename)
+        ob['Date'] = date
+        ob['Code'] = code[1:-1]
+        ob['Message'] = message
+        ob.update({
+            'bp_fileid'   : 100000 + len(items) % 3000,
+            'bp_filename' : 'CLIENT_%04d.TXT' % (len(items) % 3000),
+            'client'      : 'CLIENT',
+        })
+        items.append(ob)
+
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return size, peak
+
+
+if __name__ == "__main__":
+    argv = sys.argv
+
+    if len(argv) > 1 and argv[1].lower() in ('/h', '/help', '-h', 'help', '--help'):
+        print('--> Usage: python -m app.logitem [<lines count> [<files count>]]')
+        print('--> Measures memory of Log-items of a synthetic day of logs: dict vs LogItem')
+    else:
+        count = len(argv) > 1 and int(argv[1]) or 200000
+        files = len(argv) > 2 and int(argv[2]) or 50
+
+        def _dict(filename):
+            return {'filename': filename}
+
+        for title, factory in (('dict', _dict), ('LogItem', LogItem),):
+            size, peak = _measure(count, files, factory)
+            print('--> %-8s items: %d, memory: %.1f MB (%d bytes per item), peak: %.1f MB' % (
+                title, count, size / 1048576.0, size // count, peak / 1048576.0))
@@ -7,11 +7,18 @@ mails.py
 This module provides an easy way to send email with docx-attachment.
 """
 
-__all__ = ['SendMail', 'send_materials_order', 'send_test', 'send_simple_mail', 'send_mail_with_attachment']
+__all__ = ['SendMail', 'MailDispatcher', 'send_materials_order', 'send_test', 'send_simple_mail', 'send_mail_with_attachment']
 
 import io
 import sys
+import time
 import smtplib
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 from email import encoders
 from email.mime.text import MIMEText
@@ -35,6 +42,11 @@ except:
     default_encoding = 'cp1251'
     default_print_encoding = 'cp866'
 
+try:
+    from . import metrics
+except ImportError:
+    metrics = None
+
 DEAULT_MAILROBOT = 'mailrobot@rosan.ru'
 
 try:
@@ -68,8 +80,21 @@ except:
 
 smtphost = None
 
+# Dispatcher: digest window (sec), NOOP keepalive interval (sec), SMTP connection timeout (sec)
+DEFAULT_DIGEST_WINDOW = 60
+DEFAULT_KEEPALIVE = 30
+DEFAULT_SMTP_TIMEOUT = 10
+
 ## ============================== ##
 
+def _count_mail(result):
+    """
+        Adds the mail result (sent, failed, queued) to the metrics
+    """
+    if metrics is not None and metrics.enabled:
+        metrics.mails.inc(1, result)
+
+
 class SendMail(object):
     """
         SMTP Mail Sender.
@@ -264,9 +289,230 @@ class SendMail(object):
                 if smtp is not None:
                     smtp.quit()
 
+        _count_mail(code and 'sent' or 'failed')
+
         return code
 
 
+class MailDispatcher(threading.Thread):
+    """
+        Background mail dispatcher.
+
+        Messages are queued by `post` without blocking the caller and are sent by the dispatcher thread.
+        SMTP session is kept open per host (NOOP keepalive), hosts are tried in order of `smtphosts`
+        (as `SendMail._set_smtp` does). Messages of the same `group` (bp_fileid) posted within
+        the digest window are folded into one digest mail.
+
+        Keyword arguments:
+            hosts     -- tuple: SMTP hosts configs (`smtphosts` by default)
+            window    -- int: digest window (sec), 0 - no digests
+            keepalive -- int: NOOP interval for idle sessions (sec)
+            timeout   -- int: SMTP connection timeout (sec)
+    """
+
+    def __init__(self, **kw):
+        threading.Thread.__init__(self, name='MailDispatcher', daemon=True)
+
+        self._hosts = kw.get('hosts') or smtphosts
+        self._window = kw.get('window') or 0
+        self._keepalive = kw.get('keepalive') or DEFAULT_KEEPALIVE
+        self._timeout = kw.get('timeout') or DEFAULT_SMTP_TIMEOUT
+
+        self._queue = queue.Queue()
+        self._sessions = {}
+        self._digests = {}
+
+        self.sent = 0
+        self.failed = 0
+
+    def post(self, subject, html, addr_to, addr_cc=None, group=None):
+        """
+            Queues the message. Returns 1 if queued.
+        """
+        if not addr_to:
+            return 0
+        self._queue.put((subject, html, addr_to, addr_cc, group,))
+        _count_mail('queued')
+        return 1
+
+    def stop(self, timeout=None):
+        """
+            Sends pending digests, closes sessions and stops the dispatcher
+        """
+        self._queue.put(None)
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=1)
+            except queue.Empty:
+                item = False
+
+            if item is None:
+                break
+
+            try:
+                if item:
+                    self._dispatch(*item)
+                self._check_digests()
+                self._check_sessions()
+            except:
+                if IsPrintExceptions and callable(print_exception):
+                    print_exception()
+
+        self._check_digests(force=True)
+
+        for n in list(self._sessions.keys()):
+            self._close(n)
+
+    def _dispatch(self, subject, html, addr_to, addr_cc, group):
+        if not (self._window and group):
+            self._send(subject, html, addr_to, addr_cc)
+            return
+
+        key = (group, addr_to,)
+
+        if key not in self._digests:
+            self._digests[key] = {'subject' : subject, 'addr_cc' : addr_cc, 'items' : [], 'started' : time.time()}
+
+        self._digests[key]['items'].append(html)
+
+    def _check_digests(self, force=False):
+        now = time.time()
+
+        for key in [x for x in self._digests if force or now - self._digests[x]['started'] >= self._window]:
+            digest = self._digests.pop(key)
+            group, addr_to = key
+            items = digest['items']
+
+            if len(items) == 1:
+                subject = digest['subject']
+            else:
+                subject = '%s [%d]' % (digest['subject'], len(items))
+
+            self._send(subject, make_digest(items), addr_to, digest['addr_cc'])
+
+    def _check_sessions(self):
+        now = time.time()
+
+        for n, (smtp, used) in list(self._sessions.items()):
+            if now - used < self._keepalive:
+                continue
+            try:
+                code = smtp.noop()[0]
+            except:
+                code = 0
+            if code == 250:
+                self._sessions[n] = (smtp, now)
+            else:
+                self._close(n)
+
+    def _connect(self, n):
+        host = self._hosts[n]
+
+        smtp = smtplib.SMTP(host['host'], host['port'], timeout=self._timeout)
+        if host.get('tls'):
+            smtp.ehlo()
+            smtp.starttls()
+        if host.get('connect'):
+            smtp.ehlo()
+            smtp.login(host['connect']['login'], host['connect']['password'])
+
+        if host.get('debug'):
+            smtp.set_debuglevel(True)
+
+        self._sessions[n] = (smtp, time.time())
+
+        return smtp
+
+    def _close(self, n):
+        smtp, used = self._sessions.pop(n, (None, None))
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except:
+            try:
+                smtp.close()
+            except:
+                pass
+
+    def _send(self, subject, html, addr_to, addr_cc=None):
+        """
+            Sends the message by the first available host (failover in order of hosts)
+        """
+        for n, host in enumerate(self._hosts):
+            if not host.get('host'):
+                continue
+
+            addr_from = host.get('from') or DEAULT_MAILROBOT
+
+            msg = MIMEMultipart()
+            msg['Subject'] = subject
+            msg['From'] = addr_from
+            msg['To'] = addr_to
+            if addr_cc:
+                msg['CC'] = addr_cc
+            if html:
+                msg.attach(MIMEText(html, 'html'))
+
+            for attempt in range(2):
+                is_new = n not in self._sessions
+
+                try:
+                    smtp = is_new and self._connect(n) or self._sessions[n][0]
+
+                    if 'method' not in host or host['method'] == 1:
+                        smtp.send_message(msg)
+                    else:
+                        smtp.sendmail(addr_from, addr_to, msg.as_string())
+
+                    self._sessions[n] = (smtp, time.time())
+                    self.sent += 1
+
+                    _count_mail('sent')
+
+                    return 1
+
+                except:
+                    self._close(n)
+
+                    # Kept session may be dropped by the server, try a new one
+                    if is_new:
+                        if IsPrintExceptions and callable(print_exception):
+                            print_exception()
+                        break
+
+        self.failed += 1
+
+        _count_mail('failed')
+
+        return 0
+
+
+def make_digest(items):
+    """
+        Folds html-documents into one: bodies of the next documents are added to the first one
+    """
+    if len(items) < 2:
+        return items and items[0] or ''
+
+    html = items[0]
+    bodies = []
+
+    for x in items[1:]:
+        start, end = x.find('<body>'), x.rfind('</body>')
+        bodies.append(start > -1 and end > start and x[start+6:end] or x)
+
+    n = html.rfind('</body>')
+    if n == -1:
+        return ''.join(items)
+
+    return html[:n] + ''.join(bodies) + html[n:]
+
+
 def send_test(subject, document, filename, html, **kw):
     if subject:
         msg = MIMEMultipart()
@@ -375,9 +621,12 @@ if __name__ == "__main__":
 
     #   Arguments in debug mode:
     #       0: script name
-    #       1: mode     {0|1|2|3}
-    #       2: canal    {-1|0}
+    #       1: mode     {0|1|2|3|4}
+    #       2: canal    {-1|0}, mode 4: port of local SMTP stand-in
     #       3: addr_to  {<emails>}
+    #
+    #   Mode 4 runs MailDispatcher against a local SMTP stand-in, for example:
+    #       python -m aiosmtpd -n -l localhost:8025
 
     #from local import setup_console
     #setup_console(default_encoding)
@@ -453,5 +702,15 @@ if __name__ == "__main__":
         mail.create_message('See attachment')
         mail.attach_zip(source, filename)
         code = mail.send()
+    elif mode == 4:
+        hosts = ({'host' : 'localhost', 'port' : canal or 8025, 'from' : addr_from},)
+        dispatcher = MailDispatcher(hosts=hosts, window=2)
+        dispatcher.start()
+        for n in range(5):
+            dispatcher.post('%s %d' % (subject, n), html, addr_to, group='test')
+        dispatcher.post(subject, html, addr_to)
+        time.sleep(3)
+        dispatcher.stop()
+        code = dispatcher.sent
 
     print('Mail sent to: %s, cc: %s, code: %d' % (addr_to, addr_cc, code))
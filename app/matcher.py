@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+from .booleval import Token
+
+# Max number of keys added after the last build of the automaton (searched as substrings)
+MAX_PENDING_KEYS = 64
+
+
+class KeyMatcher:
+    """
+        Multi-pattern keys matcher (Aho-Corasick automaton).
+
+        Holds keys of many owners (Orders) and finds all of them by one pass over the line.
+        Keys of an owner may be given as a list of strings or as a `booleval.Token` expression.
+
+        Automaton is extended by batches: new keys are kept pending (searched as substrings)
+        and are added to the trie with one rebuild of failure links by `commit` (once per refresh
+        of the keys) or when their number gets greater than `MAX_PENDING_KEYS`. Removed keys are kept
+        in the trie as dead ones until their number gets greater than number of the live keys.
+
+        Arguments:
+            case_insensitive -- boolean: fold case of keys and lines
+    """
+
+    def __init__(self, case_insensitive=False):
+        self.case_insensitive = case_insensitive and True or False
+
+        self._owners = {}
+        self._keys = {}
+
+        self._reset()
+
+    def _reset(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        self._terminal = {}
+        self._pending = {}
+        self._dirty = False
+        self._dead = 0
+
+    def __len__(self):
+        return len(self._owners)
+
+    def __contains__(self, owner):
+        return owner in self._keys
+
+    def fold(self, key):
+        return self.case_insensitive and key.lower() or key
+
+    def _insert(self, key):
+        node = 0
+        for c in key:
+            nodes = self._goto[node]
+            if c not in nodes:
+                nodes[c] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nodes[c]
+
+        if node not in self._terminal:
+            self._terminal[node] = key
+        else:
+            self._dead = max(0, self._dead - 1)
+
+        self._dirty = True
+
+    def _build(self):
+        """
+            Rebuilds failure links and outputs of the trie (BFS)
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+
+        queue = []
+
+        for c, node in goto[0].items():
+            fail[node] = 0
+            queue.append(node)
+
+        out[0] = ()
+
+        i = 0
+        while i < len(queue):
+            node = queue[i]
+            i += 1
+
+            key = self._terminal.get(node)
+            out[node] = (key is not None and (key,) or ()) + out[fail[node]]
+
+            for c, child in goto[node].items():
+                f = fail[node]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                fail[child] = goto[f].get(c, 0) if goto[f].get(c, 0) != child else 0
+                queue.append(child)
+
+        self._dirty = False
+
+    def _compact(self):
+        """
+            Rebuilds the trie by the live keys only
+        """
+        self._reset()
+        for key in self._owners:
+            self._insert(key)
+        self._build()
+
+    def commit(self):
+        """
+            Adds pending keys to the trie and rebuilds the automaton (once for all of them)
+        """
+        if self._pending:
+            for key in self._pending:
+                self._insert(key)
+            self._pending = {}
+
+        if self._dirty:
+            self._build()
+
+    def add(self, owner, keys):
+        """
+            Sets keys of the owner.
+
+            Arguments:
+                owner  -- any hashable: keys owner (Order ID)
+                keys   -- list of strings or `Token`: keys expression
+        """
+        if owner in self._keys:
+            self.discard(owner)
+
+        token = None
+
+        if isinstance(keys, Token):
+            token = keys
+            keys = [x['value'] for x in token.get_keys()]
+
+        values = tuple([self.fold(x) for x in keys or [] if x])
+
+        self._keys[owner] = (values, token)
+
+        for key in values:
+            if key not in self._owners:
+                self._owners[key] = set()
+                self._pending[key] = None
+            self._owners[key].add(owner)
+
+    def discard(self, owner):
+        """
+            Removes keys of the owner
+        """
+        if owner not in self._keys:
+            return
+
+        values, token = self._keys.pop(owner)
+
+        for key in values:
+            owners = self._owners.get(key)
+            if owners is None:
+                continue
+            owners.discard(owner)
+            if not owners:
+                del self._owners[key]
+                if key in self._pending:
+                    del self._pending[key]
+                else:
+                    self._dead += 1
+
+        if self._dead > len(self._owners):
+            self._compact()
+
+    def clear(self):
+        self._owners = {}
+        self._keys = {}
+        self._reset()
+
+    def search(self, line):
+        """
+            Finds all the live keys in the line.
+
+            Returns:
+                found  -- set: folded keys found in the line
+        """
+        found = set()
+
+        if not line or not self._owners:
+            return found
+
+        if len(self._pending) > MAX_PENDING_KEYS:
+            self.commit()
+
+        goto, fail, out, owners = self._goto, self._fail, self._out, self._owners
+
+        line = self.fold(line)
+
+        node = 0
+        for c in line:
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            if out[node]:
+                for key in out[node]:
+                    if key in owners:
+                        found.add(key)
+
+        for key in self._pending:
+            if key in line:
+                found.add(key)
+
+        return found
+
+    def match(self, line, found=None):
+        """
+            Finds owners of the keys matched with the line.
+
+            Arguments:
+                line   -- string: checking line
+                found  -- set: keys found before by `search` (optional)
+
+            Returns:
+                owners -- set: matched owners
+        """
+        if found is None:
+            found = self.search(line)
+
+        owners = set()
+
+        for key in found:
+            owners.update(self._owners.get(key) or ())
+
+        for owner in [x for x in owners if self._keys[x][1] is not None]:
+            if not self.evaluate(owner, found):
+                owners.discard(owner)
+
+        return owners
+
+    def evaluate(self, owner, found):
+        """
+            Evaluates `Token` expression of the owner by found keys
+        """
+        values, token = self._keys[owner]
+        if token is None:
+            return len([1 for x in values if x in found]) > 0
+        return token.evaluate(sum([1 << n for n, x in enumerate(values) if x in found]))
+
+
+if __name__ == "__main__":
+    argv = sys.argv
+
+    if len(argv) < 2 or argv[1].lower() in ('/h', '/help', '-h', 'help', '--help'):
+        print('--> Usage: python -m app.matcher <keys:comma-separated> [<line>...]')
+    else:
+        matcher = KeyMatcher(case_insensitive=True)
+        matcher.add('keys', argv[1].split(','))
+
+        for line in argv[2:]:
+            print('--> %s : %s' % (line, repr(matcher.search(line))))
@@ -0,0 +1,498 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import json
+import time
+import os
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    HTTPServer = None
+
+# Default histogram buckets (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,)
+
+# Exposition: loopback host of the endpoint, interval of JSON snapshots (sec)
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_SNAPSHOT_INTERVAL = 60
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Flag: metrics are recorded (set by `start`), callers check it before recording
+enabled = False
+
+
+class Histogram:
+    """
+        Cumulative histogram of observed values (latency in seconds).
+
+        Arguments:
+            name        -- string: name of metric
+            buckets     -- tuple: upper bounds of buckets (sorted), +Inf is added
+    """
+
+    def __init__(self, name, buckets=None):
+        self.name = name
+        self.buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def observe(self, value):
+        n = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                n = i
+                break
+
+        with self._lock:
+            self._counts[n] += 1
+            self._sum += value
+            self._count += 1
+            if value > self._max:
+                self._max = value
+
+    def quantile(self, q):
+        """
+            Returns upper bound of the bucket holding the given quantile (0..1)
+        """
+        if not self._count:
+            return 0.0
+
+        rank = q * self._count
+        total = 0
+        for i, count in enumerate(self._counts):
+            total += count
+            if total >= rank:
+                return i < len(self.buckets) and self.buckets[i] or self._max
+        return self._max
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count, maximum = self._sum, self._count, self._max
+
+        cumulative = []
+        n = 0
+        for bound, x in zip(list(self.buckets) + ['+Inf'], counts):
+            n += x
+            cumulative.append((bound, n,))
+
+        return { \
+            'name'    : self.name,
+            'count'   : count,
+            'sum'     : total,
+            'max'     : maximum,
+            'buckets' : cumulative,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._sum = 0.0
+            self._count = 0
+            self._max = 0.0
+
+    def __str__(self):
+        return '%s: count:%d avg:%.3f p50:%s p90:%s p99:%s max:%.3f' % ( \
+            self.name,
+            self._count,
+            self._count and self._sum / self._count or 0.0,
+            self.quantile(0.5),
+            self.quantile(0.9),
+            self.quantile(0.99),
+            self._max,
+        )
+
+
+##  ----------------
+##  Metrics Registry
+##  ----------------
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    return labels and '{%s}' % ','.join(['%s="%s"' % (k, _escape(v)) for k, v in labels]) or ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+        Base of the registry metrics: values by label values.
+
+        Arguments:
+            name        -- string: name of metric
+            help        -- string: description of metric
+            labels      -- tuple: label names, values are given by position on recording
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, help='', labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+        self._values = {}
+        self._func = None
+        self._lock = threading.Lock()
+
+    def set_function(self, func):
+        """
+            Sets callback to get the value on collecting (instead of recorded values).
+            Callback returns a number or dict {label values: number}.
+        """
+        self._func = func
+
+    def values(self):
+        """
+            Returns list of (label values, value)
+        """
+        if self._func is not None:
+            try:
+                value = self._func()
+            except:
+                return []
+            if isinstance(value, dict):
+                return sorted(value.items())
+            return [((), value,)]
+
+        with self._lock:
+            return sorted(self._values.items())
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+
+class Counter(Metric):
+    """
+        Monotonic counter
+    """
+
+    kind = 'counter'
+
+    def inc(self, value=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+
+class Gauge(Metric):
+    """
+        Current value (set, inc/dec or by callback)
+    """
+
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, value=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def dec(self, value=1, *labels):
+        self.inc(-value, *labels)
+
+
+class HistogramMetric(Metric):
+    """
+        Histograms by label values.
+
+        Keyword arguments:
+            buckets     -- tuple: upper bounds of buckets (`DEFAULT_BUCKETS` by default)
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help='', labels=(), buckets=None):
+        Metric.__init__(self, name, help=help, labels=labels)
+        self.buckets = buckets
+
+    def get(self, *labels):
+        histogram = self._values.get(labels)
+        if histogram is None:
+            with self._lock:
+                histogram = self._values.setdefault(labels, Histogram(self.name, self.buckets))
+        return histogram
+
+    def observe(self, value, *labels):
+        self.get(*labels).observe(value)
+
+    def values(self):
+        with self._lock:
+            return sorted([(k, v.snapshot(),) for k, v in self._values.items()])
+
+
+class MetricsRegistry:
+    """
+        Registry of the process metrics (counters, gauges, histograms).
+
+        Metrics are created once by name (the same metric is returned for the same name).
+        `labels` of the registry are added to every value on collecting (source of the process).
+    """
+
+    def __init__(self):
+        self.labels = {}
+
+        self._metrics = {}
+        self._order = []
+        self._lock = threading.Lock()
+
+    def _add(self, factory, name, *args, **kw):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory(name, *args, **kw)
+                self._order.append(name)
+        return metric
+
+    def counter(self, name, help='', labels=()):
+        return self._add(Counter, name, help=help, labels=labels)
+
+    def gauge(self, name, help='', labels=()):
+        return self._add(Gauge, name, help=help, labels=labels)
+
+    def histogram(self, name, help='', labels=(), buckets=None):
+        return self._add(HistogramMetric, name, help=help, labels=labels, buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def collect(self):
+        """
+            Returns list of metrics with values: (metric, [(labels list, value)...])
+        """
+        common = sorted(self.labels.items())
+        items = []
+        for name in list(self._order):
+            metric = self._metrics[name]
+            items.append((metric, [(common + list(zip(metric.labels, key)), value) for key, value in metric.values()],))
+        return items
+
+    def exposition(self):
+        """
+            Returns metrics in Prometheus text format
+        """
+        lines = []
+        for metric, values in self.collect():
+            lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+
+            for labels, value in values:
+                if metric.kind != 'histogram':
+                    lines.append('%s%s %s' % (metric.name, _format_labels(labels), _format_value(value)))
+                    continue
+
+                for bound, count in value['buckets']:
+                    le = bound == '+Inf' and bound or _format_value(float(bound))
+                    lines.append('%s_bucket%s %d' % (metric.name, _format_labels(labels + [('le', le)]), count))
+                lines.append('%s_sum%s %s' % (metric.name, _format_labels(labels), _format_value(value['sum'])))
+                lines.append('%s_count%s %d' % (metric.name, _format_labels(labels), value['count']))
+
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+            Returns metrics as dict (JSON snapshot)
+        """
+        metrics = {}
+        for metric, values in self.collect():
+            items = []
+            for labels, value in values:
+                if metric.kind == 'histogram':
+                    value = dict(value)
+                    value['buckets'] = [[str(bound), count] for bound, count in value['buckets']]
+                items.append({'labels' : dict(labels), 'value' : value})
+
+            metrics[metric.name] = { \
+                'type'   : metric.kind,
+                'help'   : metric.help,
+                'values' : items,
+            }
+
+        return { \
+            'timestamp' : time.time(),
+            'pid'       : os.getpid(),
+            'metrics'   : metrics,
+        }
+
+    def reset(self):
+        for name in list(self._order):
+            self._metrics[name].reset()
+
+
+registry = MetricsRegistry()
+
+# ---------------------------------
+# Metrics of the Logger (by source)
+# ---------------------------------
+
+read_bytes = registry.counter('logger_read_bytes_total', 'Bytes read from Log-files')
+read_lines = registry.counter('logger_read_lines_total', 'Lines read from Log-files')
+decoded_lines = registry.counter('logger_decoded_lines_total', 'Lines decoded by encoding', labels=('encoding',))
+matched_lines = registry.counter('logger_matched_lines_total', 'Log-lines matched with orders')
+unresolved_lines = registry.counter('logger_unresolved_lines_total', 'Log-lines dropped unresolved (not matched with orders)')
+pending_lines = registry.gauge('logger_pending_lines', 'Unresolved Log-lines kept to be matched later')
+registrations = registry.counter('logger_registrations_total', 'Log-messages registrations by status (new, existing, failed)', labels=('status',))
+mails = registry.counter('logger_mails_total', 'Mails by result (sent, failed, queued)', labels=('result',))
+db_query_seconds = registry.histogram('logger_db_query_seconds', 'Latency of DB queries', labels=('name',))
+db_procedure_seconds = registry.histogram('logger_db_procedure_seconds', 'Latency of DB stored procedures (batch as one)', labels=('name',))
+queue_depth = registry.gauge('logger_queue_depth', 'Observer events waiting in the producer queue')
+oldest_event_age = registry.gauge('logger_oldest_event_age_seconds', 'Age of the oldest unprocessed observer event')
+
+
+##  ----------
+##  Exposition
+##  ----------
+
+class _MetricsHandler(BaseHTTPRequestHandler if HTTPServer is not None else object):
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+
+        if path in ('/', '/metrics'):
+            body, content_type = registry.exposition(), PROMETHEUS_CONTENT_TYPE
+        elif path == '/metrics.json':
+            body, content_type = json.dumps(registry.snapshot()), 'application/json'
+        else:
+            self.send_error(404)
+            return
+
+        body = body.encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsExporter(threading.Thread):
+    """
+        Exposition of the registry metrics: HTTP endpoint on loopback (Prometheus text format,
+        `/metrics` and `/metrics.json`) and periodic JSON snapshot file.
+
+        Keyword arguments:
+            port        -- int: port of the HTTP endpoint, 0 - no endpoint
+            host        -- string: host of the HTTP endpoint (loopback by default)
+            snapshot    -- string: path to JSON snapshot file, None - no snapshots
+            interval    -- int: interval of snapshots (sec)
+    """
+
+    def __init__(self, **kw):
+        threading.Thread.__init__(self, name='MetricsExporter', daemon=True)
+
+        self.port = kw.get('port') or 0
+        self.host = kw.get('host') or DEFAULT_HOST
+        self.snapshot = kw.get('snapshot') or None
+        self.interval = kw.get('interval') or DEFAULT_SNAPSHOT_INTERVAL
+
+        self._server = None
+        self._server_thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self.port and HTTPServer is not None:
+            self._server = HTTPServer((self.host, self.port), _MetricsHandler)
+            self._server_thread = threading.Thread(target=self._server.serve_forever, name='MetricsServer', daemon=True)
+            self._server_thread.start()
+
+        threading.Thread.start(self)
+
+    def write_snapshot(self):
+        """
+            Writes JSON snapshot (replaces the file at once)
+        """
+        if not self.snapshot:
+            return
+
+        tmp = '%s.tmp' % self.snapshot
+
+        with open(tmp, 'w') as fo:
+            json.dump(registry.snapshot(), fo, indent=1)
+
+        os.replace(tmp, self.snapshot)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.write_snapshot()
+            except:
+                pass
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+        if self.is_alive():
+            self.join(timeout)
+
+        try:
+            self.write_snapshot()
+        except:
+            pass
+
+
+_exporter = None
+
+def start(port=0, snapshot=None, interval=None, labels=None, host=None):
+    """
+        Enables recording of metrics and starts their exposition.
+
+        Keyword arguments:
+            port        -- int: port of the loopback HTTP endpoint, 0 - no endpoint
+            snapshot    -- string: path to JSON snapshot file
+            interval    -- int: interval of snapshots (sec)
+            labels      -- dict: labels of the process added to every metric (ctype, alias)
+            host        -- string: host of the endpoint
+    """
+    global enabled, _exporter
+
+    if labels:
+        registry.labels.update(labels)
+
+    enabled = True
+
+    if _exporter is None and (port or snapshot):
+        _exporter = MetricsExporter(port=port, snapshot=snapshot, interval=interval, host=host)
+        _exporter.start()
+
+    return _exporter
+
+def stop():
+    """
+        Stops exposition (the last snapshot is written) and disables recording
+    """
+    global enabled, _exporter
+
+    enabled = False
+
+    if _exporter is not None:
+        _exporter.stop()
+        _exporter = None
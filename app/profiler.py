@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import time
+import marshal
+import threading
+
+from functools import wraps
+
+try:
+    import cProfile
+    import pstats
+except ImportError:
+    cProfile = None
+
+from config import (
+     IsDebug, IsPrintExceptions, LOCAL_EXPORT_TIMESTAMP,
+     print_to, print_exception, getErrorlog, errorlog
+     )
+
+# Profiling modes
+PROFILE_CPROFILE = 'cprofile'
+PROFILE_SAMPLING = 'sampling'
+PROFILE_MODES = (PROFILE_CPROFILE, PROFILE_SAMPLING,)
+
+# Number of cycles armed by trigger file without cycles count
+DEFAULT_TRIGGER_CYCLES = 10
+
+# Sampling interval (ms), min interval of trigger file checks (sec)
+DEFAULT_SAMPLING_INTERVAL = 5
+TRIGGER_CHECK_INTERVAL = 1.0
+
+# Name of output files (next to the errorlog)
+PROFILE_NAME = 'profile-%(ctype)s-%(alias)s-%(now)s'
+
+
+def _frame(func):
+    """
+        Collapsed-stack frame name of the function key (filename, line, name)
+    """
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return '%s (%s:%d)' % (name, os.path.basename(filename), line)
+
+def collapse_stats(stats):
+    """
+        Makes collapsed stacks of cProfile stats.
+
+        cProfile keeps caller-callee edges only, so the stack of every function is restored by its
+        heaviest callers (cumulative time). Values are own times in microseconds.
+
+        Arguments:
+            stats       -- dict: `pstats.Stats.stats`
+
+        Returns:
+            stacks      -- dict: {collapsed stack: value}
+    """
+    stacks = {}
+
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        value = int(tt * 1000000)
+        if value <= 0:
+            continue
+
+        stack = [func]
+        seen = set(stack)
+        caller = func
+
+        while True:
+            candidates = [(isinstance(v, tuple) and v[3] or 0, k,) for k, v in stats[caller][4].items()
+                if k not in seen and k in stats]
+            if not candidates:
+                break
+            caller = max(candidates)[1]
+            stack.append(caller)
+            seen.add(caller)
+
+        key = ';'.join([_frame(x) for x in reversed(stack)])
+        stacks[key] = stacks.get(key, 0) + value
+
+    return stacks
+
+
+class StackSampler(threading.Thread):
+    """
+        Stack-sampling of the profiled thread (low overhead, wall time).
+
+        Samples are taken while the sampler is active (inside profiled cycles) only.
+
+        Arguments:
+            interval    -- float: sampling interval (sec)
+
+        Attributes:
+            samples     -- dict: number of samples by stack, stack is a tuple of function keys (root first)
+    """
+
+    def __init__(self, interval):
+        threading.Thread.__init__(self, name='StackSampler', daemon=True)
+
+        self.interval = interval
+        self.samples = {}
+
+        self._thread_id = None
+        self._stopped = threading.Event()
+
+    def activate(self, thread_id):
+        self._thread_id = thread_id
+
+    def deactivate(self):
+        self._thread_id = None
+
+    def stop(self):
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            thread_id = self._thread_id
+            if thread_id is None:
+                continue
+
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name,))
+                frame = frame.f_back
+
+            if stack:
+                key = tuple(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+    def stats(self):
+        """
+            Returns samples as cProfile stats (times are sampled wall times)
+        """
+        stats = {}
+
+        def _add(func, count, tt, ct, caller=None):
+            cc, nc, t, c, callers = stats.get(func) or (0, 0, 0.0, 0.0, {})
+            if ct:
+                cc, nc, c = cc + count, nc + count, c + ct
+            if caller is not None:
+                x = callers.get(caller) or (0, 0, 0.0, 0.0)
+                callers[caller] = (x[0] + count, x[1] + count, x[2] + tt, x[3] + ct)
+            stats[func] = (cc, nc, t + tt, c, callers)
+
+        for stack, count in self.samples.items():
+            value = count * self.interval
+            seen = set()
+            for n, func in enumerate(stack):
+                tt = n == len(stack) - 1 and value or 0.0
+                ct = func not in seen and value or 0.0
+                seen.add(func)
+                _add(func, count, tt, ct, caller=n > 0 and stack[n-1] or None)
+
+        return stats
+
+    def collapsed(self):
+        return dict([(';'.join([_frame(x) for x in stack]), count) for stack, count in self.samples.items()])
+
+
+class CycleProfiler:
+    """
+        On-demand profiler of the emitter and observer cycles.
+
+        Profiles the next N cycles (calls of the wrapped members), then writes `.pstats`
+        and collapsed stacks (`.collapsed`, for flame graphs) next to the errorlog.
+        Profiling is armed by config (`profile`) on start or by touching the trigger file at any time,
+        the file may contain `<cycles> [<mode>]`, it's removed when armed.
+
+        Arguments:
+            config      -- dict: logger config
+
+        Config parameters:
+            profile          -- int: number of cycles to profile from the start, 0 - by trigger only
+            profile_mode     -- string: cprofile|sampling
+            profile_interval -- int: sampling interval (ms)
+            profile_trigger  -- string: trigger file (formatted by config, relative to the errorlog folder)
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+        self.mode = self._get_mode(config.get('profile_mode'))
+        self.interval = (config.get('profile_interval') or DEFAULT_SAMPLING_INTERVAL) / 1000.0
+
+        trigger = config.get('profile_trigger')
+        self.trigger = trigger and os.path.join(self._folder(), (trigger % config).lower()) or None
+
+        self.cycles = 0
+        self.done = 0
+        self.names = {}
+
+        self._profile = None
+        self._sampler = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+        self.arm(config.get('profile') or 0)
+
+    def _get_mode(self, mode):
+        mode = (mode or '').lower()
+        if mode not in PROFILE_MODES or (mode == PROFILE_CPROFILE and cProfile is None):
+            return cProfile is not None and PROFILE_CPROFILE or PROFILE_SAMPLING
+        return mode
+
+    @property
+    def is_armed(self):
+        return self.cycles > 0
+
+    def arm(self, cycles, mode=None):
+        """
+            Arms profiling of the next cycles (current session is continued if it's active)
+        """
+        if cycles <= 0:
+            return
+
+        if not self.is_armed:
+            self.mode = self._get_mode(mode or self.mode)
+            self.done = 0
+            self.names = {}
+
+        self.cycles = max(self.cycles, cycles)
+
+        if IsDebug:
+            print_to(None, '>>> profiler armed: %s cycles, mode:%s' % (self.cycles, self.mode))
+
+    def check_trigger(self):
+        """
+            Arms profiling if the trigger file exists (checked once per `TRIGGER_CHECK_INTERVAL`)
+        """
+        now = time.time()
+
+        if not self.trigger or now - self._checked < TRIGGER_CHECK_INTERVAL:
+            return
+
+        self._checked = now
+
+        if not os.path.exists(self.trigger):
+            return
+
+        try:
+            with open(self.trigger, 'r') as fi:
+                values = fi.read().split()
+            os.remove(self.trigger)
+        except:
+            values = None
+
+        # The trigger file is not removed, don't arm it again
+        if values is None and os.path.exists(self.trigger):
+            self.trigger = None
+            return
+
+        cycles = values and values[0].isdigit() and int(values[0]) or DEFAULT_TRIGGER_CYCLES
+
+        self.arm(cycles, mode=values and len(values) > 1 and values[1] or None)
+
+    def run(self, name, func, *args, **kw):
+        """
+            Calls the function as a profiled cycle if profiling is armed (nested cycles are not profiled)
+        """
+        self.check_trigger()
+
+        if not self.is_armed or not self._lock.acquire(False):
+            return func(*args, **kw)
+
+        try:
+            self._begin()
+            try:
+                return func(*args, **kw)
+            finally:
+                self._end(name)
+        finally:
+            self._lock.release()
+
+    def _begin(self):
+        if self.mode == PROFILE_CPROFILE:
+            if self._profile is None:
+                self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            if self._sampler is None:
+                self._sampler = StackSampler(self.interval)
+                self._sampler.start()
+            self._sampler.activate(threading.get_ident())
+
+    def _end(self, name):
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.deactivate()
+
+        self.names[name] = self.names.get(name, 0) + 1
+        self.done += 1
+        self.cycles -= 1
+
+        if self.cycles <= 0:
+            self.flush()
+
+    def _folder(self):
+        """
+            Folder of the errorlog: profiling results and relative trigger file
+        """
+        return os.path.dirname(getErrorlog() or errorlog)
+
+    def _output(self):
+        props = dict(self.config)
+        props['now'] = time.strftime(LOCAL_EXPORT_TIMESTAMP)
+        return os.path.join(self._folder(), (PROFILE_NAME % props).lower())
+
+    def flush(self):
+        """
+            Writes results of the profiling session and resets it
+        """
+        profile, sampler = self._profile, self._sampler
+        self._profile = self._sampler = None
+        self.cycles = 0
+
+        if profile is None and sampler is None:
+            return
+
+        try:
+            output = self._output()
+
+            if profile is not None:
+                profile.dump_stats('%s.pstats' % output)
+                stacks = collapse_stats(pstats.Stats(profile).stats)
+            else:
+                sampler.stop()
+                with open('%s.pstats' % output, 'wb') as fo:
+                    marshal.dump(sampler.stats(), fo)
+                stacks = sampler.collapsed()
+
+            with open('%s.collapsed' % output, 'w', encoding='utf-8') as fo:
+                for stack, value in sorted(stacks.items()):
+                    fo.write('%s %d\n' % (stack, value))
+
+            print_to(None, '>>> profile[%s]: %s cycles %s -> %s' % (self.mode, self.done, self.names, output))
+        except:
+            if IsPrintExceptions:
+                print_exception()
+
+    def stop(self):
+        """
+            Writes results of the incomplete session
+        """
+        if self._profile is not None or self._sampler is not None:
+            self.flush()
+
+
+def profiled(name):
+    """
+        Decorator of the Source members: runs the member by the source profiler (`_profiler`) if it's set
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(self, *args, **kw):
+            profiler = self._profiler
+            if profiler is None:
+                return f(self, *args, **kw)
+            return profiler.run(name, f, self, *args, **kw)
+        return wrapper
+    return decorator
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import time
+
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+# Default size of block to read (bytes)
+DEFAULT_BLOCK_SIZE = 1024*1024*4
+MIN_BLOCK_SIZE = 1024*64
+
+EOL = b'\n'
+
+
+class BlockReader:
+    """
+        Block-buffered Log-file lines reader.
+
+        Reads the file by large blocks and splits lines itself, partial trailing line is carried over
+        to the next block. The last line of the file is given back even without EOL (as `readline` does).
+
+        Arguments:
+            fin         -- file: opened in binary mode, positioned at the start offset
+            block_size  -- int: size of block to read (bytes)
+            offset      -- int: start offset (`fin.tell()` by default)
+
+        Iterator yields (pointer, line):
+            pointer     -- int: offset of the line in the file
+            line        -- bytes: the line with EOL
+
+        After iteration `position` is an offset of the end of the last line (next seek-pointer).
+    """
+
+    def __init__(self, fin, block_size=None, offset=None):
+        self._fin = fin
+        self.block_size = max(block_size or DEFAULT_BLOCK_SIZE, MIN_BLOCK_SIZE)
+        self.position = offset if offset is not None else fin.tell()
+
+        self.blocks = 0
+
+    def __iter__(self):
+        fin = self._fin
+        carry = b''
+        pointer = self.position
+
+        while True:
+            block = fin.read(self.block_size)
+
+            if not block:
+                break
+
+            self.blocks += 1
+
+            data = carry and carry + block or block
+            start = 0
+
+            while True:
+                end = data.find(EOL, start)
+                if end == -1:
+                    break
+                end += 1
+                line = data[start:end]
+                self.position = pointer + end
+                yield pointer + start, line
+                start = end
+
+            pointer += start
+            carry = data[start:]
+
+        # ------------------------------
+        # The last line of file (no EOL)
+        # ------------------------------
+
+        if carry:
+            self.position = pointer + len(carry)
+            yield pointer, carry
+
+
+class MmapReader:
+    """
+        Memory-mapped Log-file lines reader (local files only).
+
+        Maps the file from the start offset, finds EOL by `find` on the mapped buffer and yields
+        `memoryview` slices of lines without copying. Lines containing any of `skip` patterns
+        (or none of `keys`, if given) are dropped on the byte level before decoding.
+        If the file grows while reading, the rest of it is mapped again.
+
+        Arguments:
+            fin         -- file: opened in binary mode, positioned at the start offset
+            offset      -- int: start offset (`fin.tell()` by default)
+            skip        -- tuple of bytes: patterns of lines to drop (`is_valid_line` keys)
+            keys        -- tuple of bytes: patterns of lines to keep, at least one of them
+
+        Iterator yields (pointer, line) as `BlockReader`, `line` is a memoryview.
+    """
+
+    def __init__(self, fin, offset=None, skip=None, keys=None):
+        self._fin = fin
+        self.position = offset if offset is not None else fin.tell()
+
+        self.skip = skip or ()
+        self.keys = keys or ()
+
+        self.maps = 0
+
+    @staticmethod
+    def is_available(fin):
+        if mmap is None:
+            return False
+        try:
+            fin.fileno()
+        except:
+            return False
+        return True
+
+    def _map(self, offset, size):
+        base = offset - offset % mmap.ALLOCATIONGRANULARITY
+        mm = mmap.mmap(self._fin.fileno(), size - base, access=mmap.ACCESS_READ, offset=base)
+        self.maps += 1
+        return base, mm
+
+    def _is_dropped(self, mm, start, end):
+        for key in self.skip:
+            if mm.find(key, start, end) > -1:
+                return True
+        if not self.keys:
+            return False
+        for key in self.keys:
+            if mm.find(key, start, end) > -1:
+                return False
+        return True
+
+    def __iter__(self):
+        fileno = self._fin.fileno()
+        pointer = self.position
+
+        while True:
+            size = os.fstat(fileno).st_size
+
+            if size <= pointer:
+                break
+
+            base, mm = self._map(pointer, size)
+            view = memoryview(mm)
+
+            try:
+                start = pointer - base
+                length = size - base
+
+                while start < length:
+                    end = mm.find(EOL, start)
+                    if end == -1:
+                        break
+                    end += 1
+                    self.position = base + end
+                    if not self._is_dropped(mm, start, end):
+                        yield base + start, view[start:end]
+                    start = end
+
+                pointer = base + start
+
+                # ------------------------------------------------
+                # The last line (no EOL) if the file doesn't grow
+                # ------------------------------------------------
+
+                if start < length and os.fstat(fileno).st_size == size:
+                    self.position = size
+                    if not self._is_dropped(mm, start, length):
+                        yield pointer, view[start:length]
+                    pointer = size
+            finally:
+                view.release()
+                try:
+                    mm.close()
+                except BufferError:
+                    pass
+
+            if os.fstat(fileno).st_size == size:
+                break
+
+        self._fin.seek(self.position, 0)
+
+
+class LineReader:
+    """
+        Line by line reader (`readline` with a check of the file size per line).
+        Used for files opened in text mode and as a reference of `BlockReader`.
+
+        Arguments:
+            fin         -- file: opened file, positioned at the start offset
+            filename    -- string: full path to the file
+    """
+
+    def __init__(self, fin, filename):
+        self._fin = fin
+        self._filename = filename
+        self.position = fin.tell()
+
+    def __iter__(self):
+        fin = self._fin
+
+        while True:
+            pointer = fin.tell()
+
+            if pointer == os.path.getsize(self._filename):
+                break
+
+            line = fin.readline()
+
+            if not line:
+                break
+
+            self.position = fin.tell()
+            yield pointer, line
+
+        self.position = fin.tell()
+
+
+def _benchmark(filename, block_size, encodings):
+    from .utils import decoder
+    from .worker import is_valid_line
+
+    results = []
+
+    for title in ('readline', 'block'):
+        started = time.time()
+        lines = size = 0
+
+        with open(filename, 'rb') as fin:
+            if title == 'block':
+                reader = BlockReader(fin, block_size=block_size)
+            else:
+                reader = LineReader(fin, filename)
+
+            for pointer, line in reader:
+                lines += 1
+                if not is_valid_line(line, True):
+                    continue
+                s, encoding = decoder(line, encodings)
+                size += len(s)
+
+        results.append((title, lines, size, time.time() - started))
+
+    return results
+
+
+if __name__ == "__main__":
+    argv = sys.argv
+
+    if len(argv) < 2 or argv[1].lower() in ('/h', '/help', '-h', 'help', '--help'):
+        print('--> Usage: python -m app.reader <Log-file> [<block size, KB>]')
+        print('--> Compares `readline` path with `BlockReader` on the given Log-file (Bankperso Bin/Log_*)')
+    else:
+        filename = argv[1]
+        block_size = len(argv) > 2 and int(argv[2]) * 1024 or DEFAULT_BLOCK_SIZE
+
+        print('--> file: %s, size: %d, block: %d' % (filename, os.path.getsize(filename), block_size))
+
+        for title, lines, size, duration in _benchmark(filename, block_size, ('cp1251', 'utf-8',)):
+            print('--> %-10s lines: %d, decoded: %d, time: %.3f sec' % (title, lines, size, duration))
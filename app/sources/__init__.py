@@ -11,19 +11,30 @@ from config import (
      default_unicode, default_encoding, default_iso, cr,
      LOCAL_EASY_DATESTAMP, UTC_FULL_TIMESTAMP, DATE_STAMP, 
      MAX_UNRESOLVED_LINES, COMPLETE_STATUSES,
-     print_to, print_exception
+     print_to, print_exception, getErrorlog, errorlog, TRACE_DEBUG
      )
 
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, RegexMatchingEventHandler
 
 from functools import wraps
-from copy import deepcopy
+from collections import deque
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = None
 
 from ..settings import *
-from ..database import database_config, BankPersoEngine
-from ..mails import send_simple_mail
-from ..worker import checkfile, lines_emitter
+from ..database import database_config, BankPersoEngine, dispose_pooled_engine, pool_stats
+from ..cache import LRUCache, AliasCache
+from ..checkpoints import CheckpointStore
+from ..matcher import KeyMatcher
+from ..metrics import Histogram
+from .. import metrics
+from ..mails import send_simple_mail, MailDispatcher
+from ..profiler import CycleProfiler, profiled
+from ..worker import checkfile, lines_emitter, catchup_file
 from ..utils import normpath, getToday, getTime, getDate, getDateOnly, checkDate, isIterable, monthdelta, daydelta
 
 engines = {}
@@ -54,6 +65,15 @@ ORDER_REFRESHED = '_refreshed'
 # Local constants
 _MIN_MESSAGE_SIZE = 20
 _CHECK_UNRESOLVED_LIMIT = 10
+_REGISTER_PROCEDURE = 'orderlog-register-log-message'
+_DIMENSIONS_CACHE_SIZE = 1000
+_PREFETCH_CHUNK_SIZE = 1000
+_ALIASES_TTL = 3600
+_CATCHUP_CHUNK_LINES = 10000
+_CATCHUP_GLOBALS = ('debug', 'deepdebug', 'trace', 'logtrace', 'printexceptions', 'read_block', 'read_mode', 'decoder_sample',)
+
+# Client Aliases shared by all the sources of the process
+client_aliases = AliasCache(_ALIASES_TTL)
 
 _EMERGENCY_CODES = ('ERROR', 'WARNING')
 _EMERGENCY_HTML = '''
@@ -161,11 +181,20 @@ def check_engine(engine, force=False):
     name = getattr(engine, 'name')
 
     if engine.engine_error or force:
+
+        # --------------------------------------------------
+        # Reconnect on error: drop connections of the pool
+        # --------------------------------------------------
+
+        if engine.engine_error and getattr(engine, 'pooled', False):
+            dispose_pooled_engine(name, reconnect=True)
+
         connect(name)
         engine = engines.get(name)
 
         if IsDebug:
-            print_to(None, '!!! engine reopened[%s], error:%s, force:%s' % (name, engine.engine_error, force))
+            print_to(None, '!!! engine reopened[%s], error:%s, force:%s, pool:%s' % (
+                name, engine.engine_error, force, pool_stats(name).get(name)))
 
     return engine
 
@@ -183,6 +212,8 @@ def after(name):
         @wraps(f)
         def wrapper(*args):
             if engines[name] is not None:
+                if IsDebug and engines[name].pooled:
+                    print_to(None, '... pool[%s]: %s' % (name, pool_stats(name).get(name)))
                 engines[name].close()
                 engines[name] = None
             return f(*args)
@@ -268,10 +299,28 @@ class Orders:
 
         self._check_datefrom = False
 
+        self.matcher = KeyMatcher()
+
+        self._index = {}
+        self._order_keys = {}
+
+        self._active = set()
+        self._filter = None
+        self._watermark = None
+        self._reconciled = None
+        self._reconcile = 0
+
     def _init_state(self, engine, config, **kw):
         self._engine = engine
 
         self._check_datefrom = config.get('check_datefrom') and True or False
+        self._reconcile = config.get('orders_reconcile') or 0
+
+        case_insensitive = config.get('case_insensitive') and True or False
+        if case_insensitive != self.matcher.case_insensitive:
+            self.matcher = KeyMatcher(case_insensitive=case_insensitive)
+            self._index = {}
+            self._order_keys = {}
 
     @property
     def keys(self):
@@ -311,6 +360,71 @@ class Orders:
     def getActiveItems(self):
         return [x for x in self.keys if not self._is_inactive_order(x)]
 
+    def is_indexed(self, id):
+        return id in self._order_keys
+
+    def index(self, id, order=None):
+        """
+            Adds keys of the Order (FileID, FName, stem, TID, TZ) into the inverted index (if they are made already).
+
+            Class properties:
+                _index      -- dict: {key: set of Order IDs}
+                _order_keys -- dict: {Order ID: indexed keys}
+        """
+        if order is None:
+            order = self._orders.get(id)
+        if order is None or 'keys' not in order:
+            return
+
+        keys = tuple(set([self.matcher.fold(x) for x in order['keys'] if x]))
+
+        if id in self._order_keys and set(self._order_keys[id]) == set(keys):
+            return
+
+        self.unindex(id)
+
+        for key in keys:
+            if key not in self._index:
+                self._index[key] = set()
+                self.matcher.add(key, [key])
+            self._index[key].add(id)
+
+        self._order_keys[id] = keys
+
+    def unindex(self, id):
+        """
+            Removes keys of the Order from the inverted index
+        """
+        for key in self._order_keys.pop(id, None) or ():
+            ids = self._index.get(key)
+            if ids is None:
+                continue
+            ids.discard(id)
+            if not ids:
+                del self._index[key]
+                self.matcher.discard(key)
+
+    def snapshot(self):
+        """
+            Returns a copy of the keys index and IDs of active Orders whose keys were not made yet
+        """
+        index = dict([(key, set(ids)) for key, ids in self._index.items()])
+        unkeyed = [x for x in self.getActiveItems() if x not in self._order_keys]
+        return index, unkeyed
+
+    def getCandidates(self, *lines):
+        """
+            Returns active Orders which can be matched with the given Log-lines (in order of `keys`).
+            Orders whose keys were not made yet are candidates always.
+        """
+        matched = set()
+        for line in lines:
+            for key in self.matcher.search(line):
+                matched.update(self._index[key])
+        matched.update([x for x in self._orders if x not in self._order_keys])
+        return sorted([x for x in matched if x in self._orders and not self._is_inactive_order(x)],
+                      key=lambda x: self._orders[x]['FName'], reverse=True)
+
     def make_filter(self, date_from=None, delta=None, finalized=False):
         """
             Make filter `where` for orders selection SQL query.
@@ -385,19 +499,59 @@ class Orders:
 
         return where
 
-    def refresh(self, date_from=None, delta=None, finalized=False, extra=None):
+    def _is_incremental(self, where):
+        """
+            Checks if only changed orders may be selected: the same filter as the last full refresh
+            and the full reconciliation is not expired (`orders_reconcile`, sec)
+        """
+        if not self._reconcile or self._watermark is None or where != self._filter:
+            return False
+        return time.time() - self._reconciled < self._reconcile
+
+    def _make_watermark_filter(self, where):
+        status_date, file_id = self._watermark
+        changed = "(%s >= '%s' or %s > %s)" % ( \
+                ORDER_PARAMS['date_from'],
+                getDate(status_date, format=UTC_FULL_TIMESTAMP),
+                ORDER_PARAMS['id'],
+                file_id,
+            )
+        return where and '%s and %s' % (where, changed) or changed
+
+    def _update_watermark(self, row, watermark):
+        status_date, file_id = watermark or (None, 0)
+        if row.get('StatusDate') and (status_date is None or row['StatusDate'] > status_date):
+            status_date = row['StatusDate']
+        if row['FileID'] > file_id:
+            file_id = row['FileID']
+        return status_date is not None and (status_date, file_id) or None
+
+    def reset(self):
+        """
+            Forces the next refresh to be the full one
+        """
+        self._watermark = None
+
+    def refresh(self, date_from=None, delta=None, finalized=False, extra=None, prefetch=None):
         """
             Get Bankperso Orders list.
+
+            If `orders_reconcile` is set, orders changed since the last refresh are selected only
+            (`StatusDate`/`FileID` watermark) and merged into the collection. The full selection runs
+            when the filter changes or every `orders_reconcile` seconds to find out inactive orders.
             
             Class properties:
                 _engine    -- connected engine to BankDB
                 _orders    -- dict: orders mapped list: {FileID, FName...}, order is a dict
+                _active    -- set: IDs of active orders
+                _watermark -- tuple: (StatusDate, FileID) max values of selected orders
 
             Keyword Arguments:
                 date_from  -- datetime: current date for orders sellections
                 delta      -- int: timestamp delta in days
                 finalized  -- boolean: build query for completed orders
                 extra      -- func: callable for extra refreshing of the order
+                prefetch   -- func: callable for bulk refreshing of new and changed orders (before `extra`)
 
             Returns length of `active` orders (int).
         """
@@ -409,11 +563,17 @@ class Orders:
         where = self.make_filter(date_from=date_from, delta=delta, finalized=finalized)
         with_extra = extra is not None and callable(extra) and True or False
 
-        columns = ('FileID', 'FName', 'BankName', 'FileStatusID',)
+        is_incremental = self._is_incremental(where)
+
+        columns = ('FileID', 'FName', 'BankName', 'FileStatusID', 'StatusDate',)
 
-        active = []
+        active = set()
+        changed = []
+        watermark = is_incremental and self._watermark or None
 
-        cursor = engine.runQuery('orders', columns=columns, where=where, order=order, as_dict=True,
+        cursor = engine.runQuery('orders', columns=columns, 
+                                 where=is_incremental and self._make_watermark_filter(where) or where, 
+                                 order=order, as_dict=True,
                                  encode_columns=('BankName',),
                                  distinct=True,
                                  debug=IsDeepDebug)
@@ -432,9 +592,21 @@ class Orders:
                     self._orders[id][ORDER_REFRESHED] = False
                     order = self._orders[id]
 
-                active.append(id)
+                    # Keys will be made again
+                    self.unindex(id)
+
+                active.add(id)
+                watermark = self._update_watermark(row, watermark)
+
+                if order:
+                    changed.append(order)
 
-                if with_extra and order and not order.get(ORDER_REFRESHED):
+        if changed and prefetch is not None:
+            prefetch(changed)
+
+        if with_extra:
+            for order in changed:
+                if not order.get(ORDER_REFRESHED):
                     extra(order)
 
         # ----------------------------------------
@@ -443,9 +615,27 @@ class Orders:
 
         self._orders.update(orders)
 
+        if is_incremental:
+            active.update(self._active)
+        elif not engine.engine_error:
+            self._filter = where
+            self._reconciled = time.time()
+
+        if not engine.engine_error:
+            self._watermark = watermark
+        self._active = active
+
         for id in self._orders:
             self._orders[id][ORDER_INACTIVE] = id not in active
 
+            if self._orders[id][ORDER_INACTIVE]:
+                self.unindex(id)
+            elif not self.is_indexed(id) and self._orders[id].get(ORDER_REFRESHED):
+                self.index(id)
+
+        # Build the keys automaton once for the keys indexed by refresh
+        self.matcher.commit()
+
         # ----------------------
         # Check engine on errors
         # ----------------------
@@ -467,6 +657,98 @@ class Orders:
             )
 
 
+class RegisterBuffer:
+    """
+        Buffered registration stage of Log-items (`REGISTER_LogMessage_sp`).
+
+        Items are collected by `add` and registered in bulk (one SQL batch, one transaction).
+        Buffer is flushed by size, by age of the first item or forced (end of scenario, shutdown).
+        DB-response of every item is given back to the `callback` in order of registration.
+    """
+
+    def __init__(self, callback, size=0, age=0):
+        self._callback = callback
+        self._items = []
+        self._started = None
+        self._lock = threading.RLock()
+
+        self.size = size or 0
+        self.age = age or 0
+
+    @property
+    def enabled(self):
+        return self.size > 1
+
+    @property
+    def count(self):
+        return len(self._items)
+
+    def is_ready(self):
+        if not self._items:
+            return False
+        return len(self._items) >= self.size or (self.age and time.time() - self._started >= self.age) and True or False
+
+    def add(self, args, ob, filename, state):
+        """
+            Adds Log-item to the buffer.
+
+            Arguments:
+                args     -- tuple: `REGISTER_LogMessage_sp` arguments
+                ob       -- dict: Log-item
+                filename -- string: Log-filename
+                state    -- dict: registration state to restore on response (module_id, log_id, count...)
+
+            Returns number of new messages if the buffer was flushed.
+        """
+        with self._lock:
+            if not self._items:
+                self._started = time.time()
+            self._items.append((args, ob, filename, state,))
+
+            if not self.is_ready():
+                return 0
+
+        return self.flush()
+
+    def flush(self):
+        """
+            Registers buffered Log-items.
+
+            Returns number of new messages.
+        """
+        with self._lock:
+            items, self._items = self._items, []
+            self._started = None
+
+            if not items:
+                return 0
+
+            engine = engines[_database]
+
+            rows = engine.runProcedureBatch(_REGISTER_PROCEDURE, [x[0] for x in items])
+
+            # -----------------------------------------------------
+            # If batch failed, register items one by one as before
+            # -----------------------------------------------------
+
+            if rows is None:
+                rows = []
+                for args, ob, filename, state in items:
+                    cursor = engine.runProcedure(_REGISTER_PROCEDURE, args)
+                    rows.append(cursor and cursor[0] or None)
+
+            if IsDebug:
+                print_to(None, '... registered batch: %d' % len(items))
+
+            done = 0
+
+            for (args, ob, filename, state), row in zip(items, rows):
+                if self._callback(ob, filename, state, row):
+                    done += 1
+
+        return done
+
+
 class AbstractSource:
 
     def __init__(self, config, logger):
@@ -475,6 +757,9 @@ class AbstractSource:
 
         self.params = {}
 
+        # Source keys of orders by batches (TID/TZ)
+        self._with_batches = False
+
         self.source_id = None
         self.module_id = None
         self.log_id = None
@@ -487,13 +772,19 @@ class AbstractSource:
 
         self._filename = None
         self._files = {}
+        self._decoders = {}
         self._lines = []
         self._message = ''
         self._seen = None
         self._callback = None
         self._mailkeys = None
+        self._dimensions = None
+        self._checkpoints = None
+        self._failed = set()
+        self._profiler = None
 
         self.orders = None
+        self._finalized = None
 
         self._delta_datefrom = [0, 0]
         self._unresolved = []
@@ -528,7 +819,38 @@ class AbstractSource:
         mailkeys = self.config.get('mailkeys')
         self._mailkeys = isIterable(mailkeys) and mailkeys or mailkeys and list(mailkeys) or None
 
+        self._registrar = RegisterBuffer(self._registered_log_item,
+                                         size=self.config.get('register_batch'),
+                                         age=self.config.get('register_age'),
+                                         )
+
+        self._dimensions = LRUCache(self.config.get('dimensions_cache') or _DIMENSIONS_CACHE_SIZE)
+
+        client_aliases.ttl = self.config.get('aliases_ttl') or _ALIASES_TTL
+
+        if self.config.get('checkpoints') and self._checkpoints is None:
+            self._checkpoints = CheckpointStore(self._checkpoints_path())
+
+            if IsDebug:
+                self.logger.out('_init_state: checkpoints %s' % self._checkpoints.stats())
+
+        # The source is started again without `_term` (dead source): pending mails of the dispatcher are sent
+        if self._mailer is not None:
+            self._mailer.stop()
+            self._mailer = None
+
+        if self.config.get('mail_async') and not IsNoEmail:
+            self._mailer = MailDispatcher(window=self.config.get('mail_digest'))
+            self._mailer.start()
+
+        if self.config.get('metrics') and not metrics.enabled:
+            self._start_metrics()
+
+        if (self.config.get('profile') or self.config.get('profile_trigger')) and self._profiler is None:
+            self._profiler = CycleProfiler(self.config)
+
         self.orders = Orders(self.params)
+        self._finalized = Orders(self.params)
 
         self.stop = False
 
@@ -581,30 +903,79 @@ class AbstractSource:
     def should_be_stop(self):
         self.stop = True
 
-    @after(_database)
+    def _start_metrics(self):
+        """
+            Starts recording and exposition of the metrics.
+
+            Config parameters:
+                metrics_port     -- int: port of the loopback HTTP endpoint (Prometheus), 0 - no endpoint
+                metrics_snapshot -- string: JSON snapshot file (formatted by config)
+                metrics_interval -- int: interval of snapshots (sec)
+        """
+        snapshot = self.config.get('metrics_snapshot')
+
+        metrics.pending_lines.set_function(lambda: len(self._lines))
+
+        try:
+            metrics.start(port=self.config.get('metrics_port') or 0,
+                          snapshot=snapshot and (snapshot % self.config).lower() or None,
+                          interval=self.config.get('metrics_interval'),
+                          labels={'ctype' : self.config.get('ctype') or '', 'alias' : self.config.get('alias') or ''},
+                          )
+        except:
+            if IsPrintExceptions:
+                print_exception()
+
+        if IsDebug:
+            self.logger.out('_init_state: metrics port:%s snapshot:%s' % (self.config.get('metrics_port'), snapshot))
+
     def _term(self):
+        self.flushLogItems()
+
+        if self._mailer is not None:
+            self._mailer.stop()
+            self._mailer = None
+
+        if metrics.enabled:
+            metrics.stop()
+
+        if self._profiler is not None:
+            self._profiler.stop()
+
+        self._term_engine()
+
+    @after(_database)
+    def _term_engine(self):
         self._engine = None
 
+    def _load_client_aliases(self):
+        """
+            Get all the Client Aliases (one query), returns None if failed
+        """
+        engine = self._engine
+
+        if engine is None:
+            return None
+
+        cursor = engine.runQuery('orderstate-aliases', columns=('Name', 'Aliases',), encode_columns=('Aliases',), 
+                                 as_dict=True)
+
+        if engine.engine_error:
+            return None
+
+        return [(row['Name'], row['Aliases'],) for row in cursor or []]
+
+    def invalidateAliases(self):
+        """
+            Drops the Client Aliases cache (changed aliases will be loaded by the next lookup)
+        """
+        client_aliases.invalidate()
+
     def _get_client_aliases(self, client):
         """
-            Get Client Aliases list
-        """
-        aliases = []
-
-        if client:
-            aliases.append(client)
-
-            where = "Aliases like '%" + client +"%' or Name='" + client + "'"
-            encode_columns = ('Aliases',)
-
-            cursor = self._engine.runQuery('orderstate-aliases', where=where, encode_columns=encode_columns, as_dict=True)
-            if cursor:
-                for n, row in enumerate(cursor):
-                    if row['Aliases'] is not None and len(row['Aliases']):
-                        aliases.extend(row['Aliases'].split(':'))
-
-        if len(aliases):
-            aliases = list(set(aliases))
+            Get Client Aliases list (from the process-wide cache)
+        """
+        aliases = client_aliases.get(client, loader=self._load_client_aliases)
 
         if IsDebug:
             print_to(None, '... client: %s, aliases: %s' % (client, aliases))
@@ -620,6 +991,7 @@ class AbstractSource:
             Sets FSO initial Log-file pointers
         """
         self._files = {}
+        self._decoders = {}
         self._lines = []
         self._message = ''
 
@@ -649,6 +1021,7 @@ class AbstractSource:
         for filename in [x for x in sorted(self._files.keys())]:
             if not self._is_matched_filename(filename):
                 del self._files[filename]
+                self._decoders.pop(filename, None)
 
         # ------------
         # Set new date
@@ -657,6 +1030,12 @@ class AbstractSource:
         if date_from != self._seen:
             self._refresh_seen(date_from)
 
+        # ---------------------------
+        # Invalidate dimensions cache
+        # ---------------------------
+
+        self._warm_dimensions()
+
         self.params['date_from'] = getDate(date_from, format=LOCAL_EASY_DATESTAMP)
         self.config['now'] = getDate(date_from, format=DATE_STAMP)
 
@@ -750,47 +1129,66 @@ class AbstractSource:
         """
             Explore `lines` for overstock.
             Check all lines for finalized orders.
+
+            Finalized orders are kept in a separate `Orders` collection (`_finalized`) with its own keys index,
+            so every unresolved line is checked with its candidate orders only. Keys of the finalized orders
+            are made once and kept between the checks. While checking, `_finalized` is set as `orders`
+            (collections are swapped, not copied).
         """
         if func is None:
             return
-        
-        orders = deepcopy(self.orders.items)
-        lines = self._lines[:]
 
-        self.orders.items = {}
-        self.orders.refresh(date_from=date_from, delta=self._delta_datefrom[1])
+        finalized = self._finalized
+        finalized._init_state(self._engine, self.config)
+        finalized.refresh(date_from=date_from, delta=self._delta_datefrom[1], prefetch=self.prefetchOrders)
+
+        lines = self._lines
 
         if IsDebug:
             print_to(None, '*** %s Check completed started, lines: %s, orders: %s [%s]' % (
-                     getTime(format=UTC_FULL_TIMESTAMP), len(lines), self.orders.count, self._n))
+                     getTime(format=UTC_FULL_TIMESTAMP), len(lines), finalized.count, self._n))
 
-        overstock = []
+        removed = set()
 
-        for n, id in enumerate(self.orders.keys):
-            order = self.orders.get(id)
+        orders, self.orders = self.orders, finalized
 
-            # ---------------------------------------
-            # Check every line for the selected order
-            # ---------------------------------------
+        try:
+            for i, item in enumerate(lines):
+                filename, line = item
 
-            for i, line in enumerate(lines):
-                if i in overstock:
-                    continue
+                # -------------------------------------------------
+                # Check the line for its candidate orders (by keys)
+                # -------------------------------------------------
 
-                self._lines = [line]
+                for id in finalized.getCandidates(line):
+                    order = finalized.get(id)
 
-                # ----------------------------------------
-                # If matched, remove it (just overstocked)
-                # ----------------------------------------
+                    self._lines = [item]
 
-                if func(order, id, **kw):
-                    overstock.append(i)
+                    done = func(order, id, **kw)
 
-            if IsDeepDebug:
-                print_to(None, self.orders._print(n, id))
+                    if not finalized.is_indexed(id) and order.get(ORDER_REFRESHED):
+                        finalized.index(id)
+
+                    # ----------------------------------------
+                    # If matched, remove it (just overstocked)
+                    # ----------------------------------------
 
-        if overstock:
-            lines = [lines[i] for i in range(len(lines)) if i not in overstock]
+                    if done:
+                        removed.add(i)
+                        break
+
+                if self.stop:
+                    break
+        finally:
+            self.orders = orders
+
+        if IsDeepDebug:
+            for n, id in enumerate(finalized.keys):
+                print_to(None, finalized._print(n, id))
+
+        if removed:
+            lines = [line for i, line in enumerate(lines) if i not in removed]
 
         if IsDeepDebug:
             for i, line in enumerate(lines):
@@ -800,11 +1198,7 @@ class AbstractSource:
             print_to(None, '*** %s Check completed finished, lines: %s' % (
                      getTime(format=UTC_FULL_TIMESTAMP), len(lines)))
 
-        self._lines = lines[:]
-        self.orders.items = deepcopy(orders)
-
-        del lines
-        del orders
+        self._lines = lines
 
     def _formatted_dump(self, ob, title):
         dump = '%s%s%s%s' % ('-'*19, cr, title, cr)
@@ -856,6 +1250,14 @@ class AbstractSource:
                 'client'      : client,
             })
 
+    def _send_mail(self, subject, html, addr_to, group=None):
+        """
+            Sends the mail by the dispatcher (queued, 1 if accepted) or directly (blocking)
+        """
+        if self._mailer is not None:
+            return self._mailer.post(subject, html, addr_to, group=group)
+        return send_simple_mail(subject, html, addr_to)
+
     def _mail_emergency(self, ob):
         addr_to = self.config.get('emergency')
 
@@ -904,7 +1306,7 @@ class AbstractSource:
                 subject = '%s: %s' % (title, code)
                 html = _EMERGENCY_EOL.join(_EMERGENCY_ALARM_HTML.split('\n')) % props
 
-                send_simple_mail(subject, html, alarm_to)
+                self._send_mail(subject, html, alarm_to, group=ob['bp_fileid'])
 
         # -------------------------
         # Notification to emergency
@@ -913,7 +1315,7 @@ class AbstractSource:
         subject = '%s %s' % (ob['client'], code)
         html = _EMERGENCY_EOL.join(_EMERGENCY_HTML.split('\n')) % props
 
-        return send_simple_mail(subject, html, addr_to)
+        return self._send_mail(subject, html, addr_to, group=ob['bp_fileid'])
 
     def _processed_log_item(self, ob, current_filename, with_mail=False):
         """
@@ -925,11 +1327,13 @@ class AbstractSource:
 
             Keyword Arguments:
                 with_mail        -- boolean: mail to emergency
+
+            Returns:
+                is_logged        -- bool: Log-item is a new message (number of new messages if buffer was flushed)
+                filename         -- string: Log-filename of the item
         """
         filename = current_filename
 
-        is_logged = False
-
         # If Log-filename changed
         if ob['filename'] != filename or 'Module' in ob:
             filename = ob['filename']
@@ -952,8 +1356,55 @@ class AbstractSource:
         # Check existing & Register Log item
         # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
         self.message_id = None
+
+        if self._registrar is not None and self._registrar.enabled:
+            state = { \
+                'module_id' : self.module_id,
+                'log_id'    : self.log_id,
+                'with_mail' : with_mail,
+            }
+            done = self._registrar.add(self.getLogItemArgs(filename, ob), ob, filename, state)
+            return done, filename
+
         self.registerLogItem(filename, ob)
 
+        if self.message_id is None:
+            self._failed.add(filename)
+
+        return self._report_log_item(ob, with_mail=with_mail), filename
+
+    def _registered_log_item(self, ob, filename, state, row):
+        """
+            Callback of `RegisterBuffer`: restores registration state and reports Log-item.
+
+            Arguments:
+                ob               -- dict: line log object (Log-item)
+                filename         -- string: log filename
+                state            -- dict: state of the item on the moment of registration
+                row              -- tuple: DB-response (message_id, status) or None
+        """
+        self.module_id = state.get('module_id')
+        self.log_id = state.get('log_id')
+        self.getMessageCount(ob)
+
+        self.message_id, self.status = row and (row[0], row[1]) or (None, '')
+
+        if row is None:
+            self._failed.add(filename)
+
+            if IsDebug:
+                self.logger.out('!!! register_log_message, no response: %s' % filename)
+
+        return self._report_log_item(ob, with_mail=state.get('with_mail'))
+
+    def _report_log_item(self, ob, with_mail=False):
+        """
+            Checks registration status of the Log-item, mails to emergency and outputs trace.
+
+            Returns `is_logged`: True if Log-item is a new message.
+        """
+        is_logged = False
+
         if not self.status:
             title = '!!! no status'
 
@@ -974,6 +1425,9 @@ class AbstractSource:
         else:
             title = 'Not registered! MessageID is null'
 
+        if metrics.enabled:
+            metrics.registrations.inc(1, is_logged and 'new' or self.message_id is not None and 'existing' or 'failed')
+
         if with_mail and is_logged and self._mail_emergency(ob):
             title += ' mailed'
 
@@ -983,11 +1437,22 @@ class AbstractSource:
             if IsDebug and not IsDisableOutput:
                 self.logger.out(title)
 
-        return is_logged, filename
+        return is_logged
 
     def _pickup_logs(self, logs, **kw):
+        """
+            Registers Log-items.
+
+            Keyword arguments:
+                filename         -- string: current log filename
+                with_mail        -- boolean: mail to emergency
+                deferred         -- boolean: don't flush buffered registration (count matched items)
+
+            Returns number of new messages (or matched items if deferred).
+        """
         filename = kw.get('filename') or ''
         with_mail = kw.get('with_mail') and True or False
+        deferred = kw.get('deferred') and self._registrar.enabled or False
 
         done = 0
 
@@ -999,11 +1464,98 @@ class AbstractSource:
 
             is_logged, filename = self._processed_log_item(ob, filename, with_mail=with_mail)
 
-            if is_logged:
+            if deferred:
                 done += 1
+            elif is_logged:
+                done += int(is_logged)
+
+        if self._registrar.enabled and not deferred:
+            done += self._registrar.flush()
 
         return done
 
+    def _make_order_keys(self, order):
+        """
+            Makes base keys of the Order: FileID, FName and its stem
+        """
+        keys = []
+
+        file_id = order.get('FileID')
+        file_name = order.get('FName')
+
+        keys.append(str(file_id))
+
+        if file_name:
+            keys.append(file_name)
+            if point in file_name:
+                keys.append(file_name.split(point)[0])
+
+        return keys
+
+    def _batches_engine(self):
+        """
+            Engine of BankDB with `batches` view (the source engine)
+        """
+        return self._engine
+
+    def prefetchOrders(self, orders):
+        """
+            Bulk loader of the Orders keys (TID/TZ): batches of all the given not refreshed orders are selected
+            by `FileID in (...)` queries (chunked), keys are made as `_make_logger_params` does.
+
+            Arguments:
+                orders  -- list: Order items (new and changed by `Orders.refresh`)
+        """
+        if not self._with_batches:
+            return
+
+        items = dict([(x['FileID'], x) for x in orders if x.get('FileID') is not None and not x.get(ORDER_REFRESHED)])
+
+        if not items:
+            return
+
+        engine = self._batches_engine()
+
+        if engine is None:
+            return
+
+        columns = tuple(database_config['batches']['columns']) + ('FileID',)
+        batches = {}
+
+        ids = sorted(items.keys())
+
+        for n in range(0, len(ids), _PREFETCH_CHUNK_SIZE):
+            where = 'FileID in (%s)' % ','.join([str(x) for x in ids[n:n+_PREFETCH_CHUNK_SIZE]])
+
+            cursor = engine.runQuery('batches', columns=columns, where=where, order='FileID, TID', as_dict=True)
+
+            # Reconnect the source engine, the orders are refreshed one by one
+            if engine.engine_error:
+                check_engine(engine)
+                return
+
+            for row in cursor or []:
+                if row['FileID'] not in batches:
+                    batches[row['FileID']] = []
+                batches[row['FileID']].append(row)
+
+        for file_id, order in items.items():
+            rows = batches.get(file_id)
+            if not rows:
+                continue
+
+            keys = self._make_order_keys(order)
+
+            for row in rows:
+                self._update_batch(row, keys)
+
+            order['keys'] = keys
+            order['aliases'] = order.get('aliases') or []
+            order[ORDER_REFRESHED] = True
+
+        if IsDeepDebug:
+            print_to(None, '*** prefetchOrders: orders: %d, batches: %d' % (len(items), len(batches)))
+
     def _update_batch(self, row, keys):
         def _update_key(name):
             value = str(row[name])
@@ -1104,6 +1656,10 @@ class AbstractSource:
             Keyword arguments:
                 filename    -- string: path to Log-file passed by observer event
 
+            Config parameters:
+                forced_refresh -- flag: keys of Orders are refreshed by every observer event,
+                                  all the active Orders are checked (keys index is not used)
+
             Returns:
                 _processed  -- int: number of Order items successfully performed
                 _found      -- dict: number of Log-messages found by order
@@ -1111,6 +1667,8 @@ class AbstractSource:
         _processed = 0
         _found = {}
 
+        forced_refresh = self.config.get('forced_refresh') and True or False
+
         self.finished = False
 
         date_from = kw.get('date_from') or getDate(self.params['date_from'], format=LOCAL_EASY_DATESTAMP, is_date=True)
@@ -1119,9 +1677,16 @@ class AbstractSource:
         # Get Orders for given Logger config params
         # -----------------------------------------
 
-        self.orders.refresh(date_from=date_from, delta=self._delta_datefrom[0])
+        self.orders.refresh(date_from=date_from, delta=self._delta_datefrom[0], prefetch=self.prefetchOrders)
 
-        orders = self.orders.getActiveItems()
+        # ------------------------------------------------------------------
+        # For a Observer's event check only Orders matched with the Log-lines
+        # ------------------------------------------------------------------
+
+        if func is not None and not forced_refresh:
+            orders = self.orders.getCandidates(*[line for filename, line in self._lines])
+        else:
+            orders = self.orders.getActiveItems()
 
         for n, id in enumerate(orders):
             if self.stop:
@@ -1140,6 +1705,11 @@ class AbstractSource:
                 # ---------------------------------
 
                 done = func(order, id, **kw)
+
+                # Forced refresh may add new keys (TID) of the indexed Order
+                if order.get(ORDER_REFRESHED) and (forced_refresh or not self.orders.is_indexed(id)):
+                    self.orders.index(id)
+
                 if done:
                     _found[id] = done
 
@@ -1184,6 +1754,55 @@ class AbstractSource:
         cursor = engines[_database].runProcedure('orderlog-check-source', **kw)
         self.source_id = cursor[0][0] if cursor else None
 
+        self._warm_dimensions()
+
+    def _warm_dimensions(self):
+        """
+            Resets cache of `ModuleID`/`LogID` and loads known dimensions of the current Source from OrderLog.
+            The cache is filled by `check_module`/`check_log` responses anyway, warm-up is optional.
+
+            Cache keys:
+                ('module', source_id, cname, cpath) -- `ModuleID`
+                ('log', module_id, cname)           -- `LogID`
+
+            Config parameters:
+                dimensions_warm  -- flag: load dimensions by `orderlog-dimensions` view (should exist in OrderLog)
+        """
+        if self._dimensions is None:
+            return
+
+        self._dimensions.clear()
+
+        if not (self.source_id and self.config.get('dimensions_warm')):
+            return
+
+        n = 0
+
+        # Failed warm-up should not break the shared engine used by registration
+        engine = engines[_database]
+        engine_error = engine.engine_error
+
+        try:
+            cursor = engine.runQuery('orderlog-dimensions', where='SourceID=%s' % self.source_id, distinct=True,
+                                     as_dict=True)
+        except:
+            cursor = None
+
+            if IsPrintExceptions:
+                print_exception()
+        finally:
+            engine.engine_error = engine_error
+
+        for row in cursor or []:
+            if row['ModuleID']:
+                self._dimensions.set(('module', self.source_id, row['Module'], row['ModulePath']), row['ModuleID'])
+            if row['LogID']:
+                self._dimensions.set(('log', row['ModuleID'], row['LogFile']), row['LogID'])
+            n += 1
+
+        if IsDebug:
+            print_to(None, '... dimensions cache: %s, warmed by %d rows' % (self.source_id, n))
+
     def check_module(self, **kw):
         """
             DB-Check if `module` exists.
@@ -1196,9 +1815,18 @@ class AbstractSource:
             Returns:
                 If OK: `ModuleID`
         """
+        key = ('module', kw.get('source_id'), kw.get('cname'), kw.get('cpath'))
+
+        self.module_id = self._dimensions is not None and self._dimensions.get(key) or None
+        if self.module_id:
+            return
+
         cursor = engines[_database].runProcedure('orderlog-check-module', **kw)
         self.module_id = cursor[0][0] if cursor else None
 
+        if self.module_id and self._dimensions is not None:
+            self._dimensions.set(key, self.module_id)
+
     def check_log(self, **kw):
         """
             DB-Check if `log` exists.
@@ -1211,9 +1839,18 @@ class AbstractSource:
             Returns:
                 If OK: `LogID`
         """
+        key = ('log', kw.get('module_id'), kw.get('cname'))
+
+        self.log_id = self._dimensions is not None and self._dimensions.get(key) or None
+        if self.log_id:
+            return
+
         cursor = engines[_database].runProcedure('orderlog-check-log', **kw)
         self.log_id = cursor[0][0] if cursor else None
 
+        if self.log_id and self._dimensions is not None:
+            self._dimensions.set(key, self.log_id)
+
     def register_log_message(self, args=None, **kw):
         """
             Check if exists & Register Log-message.
@@ -1284,8 +1921,78 @@ class AbstractSource:
         self.count = 1
         return self.count
 
+    def flushLogItems(self):
+        """
+            Registers Log-items kept in the registration buffer, then writes checkpoints of Log-files
+            if all the items are registered.
+
+            Returns number of new messages.
+        """
+        if self._registrar is None:
+            return 0
+
+        failed = len(self._failed)
+
+        done = self._registrar.flush()
+
+        if len(self._failed) == failed:
+            self._commit_checkpoints()
+        elif self._checkpoints is not None:
+            self._checkpoints.discard(self._failed)
+
+        return done
+
+    def _checkpoints_path(self):
+        """
+            Checkpoints store file, relative path is located next to the errorlog
+        """
+        path = self.config['checkpoints']
+        if os.path.isabs(path):
+            return path
+        return os.path.join(os.path.dirname(getErrorlog() or errorlog), path)
+
+    def _commit_checkpoints(self):
+        """
+            Writes pending checkpoints. Log-files with not registered Log-items (DB errors) keep the previous ones,
+            so they are read again after restart.
+        """
+        if self._checkpoints is None:
+            return
+
+        if self._failed:
+            self._checkpoints.discard(self._failed)
+
+        self._checkpoints.commit()
+
+    def _resume_pointer(self, filename):
+        """
+            Returns Log-file pointer to resume reading from (last checkpoint), 0 - from the beginning
+        """
+        if self._checkpoints is None:
+            return 0
+        return self._checkpoints.resume(filename)
+
+    def _checkpoint(self, filename):
+        """
+            Sets checkpoint of the Log-file by its current pointer.
+            Checkpoint is written when all the Log-items read before are registered.
+        """
+        if self._checkpoints is None or not self._files.get(filename) or filename in self._failed:
+            return
+
+        self._checkpoints.set(filename, self._files[filename])
+
+        if not self._registrar.count:
+            self._commit_checkpoints()
+
     def registerLogItem(self, filename, ob):
-        self.register_log_message((
+        self.register_log_message(self.getLogItemArgs(filename, ob))
+
+    def getLogItemArgs(self, filename, ob):
+        """
+            Makes `REGISTER_LogMessage_sp` arguments for the given Log-item
+        """
+        return (
             self.source_id,
             self.module_id,
             self.log_id,
@@ -1301,7 +2008,7 @@ class AbstractSource:
             self.getLogMessage(ob),
             self.getEventDate(ob),
             getDate(getToday(), format=UTC_FULL_TIMESTAMP)
-        ))
+        )
 
     def pickupLogs(self, order, id):
         """
@@ -1323,13 +2030,287 @@ class AbstractSource:
 
         return self._pickup_logs(logs)
 
+    def _is_skipped_file(self, filename, keys, suppressed, check_filename=False):
+        """
+            Checks if filename is supressed or not matched with given client keys
+        """
+        fname = filename.lower()
+
+        if check_filename and keys:
+            found = False
+            for x in keys:
+                if x and x in fname:
+                    found = True
+                    break
+            if not found:
+                if IsDebug:
+                    self.logger.out('skipped: %s' % filename)
+                return True
+
+        if suppressed:
+            found = False
+            for key in suppressed:
+                if key and key in fname:
+                    found = True
+                    break
+            if found:
+                if IsDebug:
+                    self.logger.out('suppressed: %s' % filename)
+                return True
+
+        return False
+
+    def _emit_line(self, filename, line, orders, _found, case_insensitive=False):
+        """
+            Matches Log-line with the given candidate Orders and registers it by the first matched one.
+            `_found` counts matched Log-items of the order (registration is deferred).
+
+            Returns 1 if Log-line was matched.
+        """
+        if IsTrace and IsDeepDebug:
+            print_to(None, '%s' % line)
+
+        # ------------------------------------------
+        # Add Log-line to launching lines-collection
+        # Never lade emitter by recurring lines!!!
+        # ------------------------------------------
+
+        self._lines = [(filename, line,)] #self._lines.append((filename, line,))
+
+        for i, id in enumerate(orders):
+            order = self.orders.get(id)
+
+            if not id in _found:
+                _found[id] = 0
+
+            # ----------------------------
+            # Match Log-line with an Order
+            # ----------------------------
+
+            logged = self.launchEvent(order, id, case_insensitive=case_insensitive, no_span=True, deferred=True)
+
+            if not self.orders.is_indexed(id) and order.get(ORDER_REFRESHED):
+                self.orders.index(id)
+
+            if not logged:
+                continue
+
+            _found[id] += logged
+
+            # ---------------------------------------------
+            # If Log-line done, break and take the next one
+            # ---------------------------------------------
+
+            if metrics.enabled:
+                metrics.matched_lines.inc()
+
+            return 1
+
+        if metrics.enabled:
+            metrics.unresolved_lines.inc()
+
+        return 0
+
+    def _emit_file(self, filename, _found, limit, _processed, case_insensitive=False, decoder_trace=False):
+        """
+            Emits Log-lines of the file (from its current pointer) and matches them with the candidate Orders.
+
+            Returns:
+                _processed       -- int: number of processed Log-lines (with the given ones)
+                is_break         -- bool: lines limit is reached
+        """
+        for l, line in enumerate(lines_emitter(filename, 'rb', default_unicode, 'EMITTER', 
+                                               decoder_trace=decoder_trace,
+                                               files=self._files,
+                                               decoders=self._decoders,
+                                               globals=self.config,
+                                               )):
+            if IsDeepDebug:
+                self.logger.out('line %d: [%s]' % (l, len(line)))
+
+            # -----------------------------------
+            # Skip invalid (broken) Log-line data
+            # -----------------------------------
+
+            if not self._is_line_valid(line):
+                continue
+
+            # --------------------------
+            # Check Order via given line
+            # --------------------------
+
+            _processed += self._emit_line(filename, line, self.orders.getCandidates(line), _found,
+                                          case_insensitive=case_insensitive)
+
+            # -----------------
+            # Check lines limit
+            # -----------------
+
+            if limit and _processed > limit:
+                return _processed, True
+
+        return _processed, False
+
+    def _catchup(self, filenames, _found, limit, workers, inflight, case_insensitive=False, decoder_trace=False, done=None):
+        """
+            Parallel catch-up of Log-files.
+
+            Log-files are read, decoded and matched with a snapshot of the Orders keys index
+            by `ProcessPoolExecutor` workers. Matched Log-lines are returned by chunks (`_CATCHUP_CHUNK_LINES`)
+            and registered here in order of files and lines.
+            If there are active Orders without keys (every line is their candidate), the file is emitted
+            here sequentially instead of passing all its lines from the worker.
+
+            Arguments:
+                filenames        -- list: Log-files to emit (in order)
+                _found           -- dict: number of Log-messages found by order, [output]
+                limit            -- int: limit of processed lines
+                workers          -- int: number of worker processes
+                inflight         -- int: max number of files in progress
+
+            Keyword arguments:
+                done             -- set: Log-files registered up to the end (or inactive), [output]
+
+            Returns:
+                _processed       -- int: number of processed Log-lines
+        """
+        if done is None:
+            done = set()
+
+        _processed = 0
+
+        is_break = False
+
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+        jobs = deque()
+        files = deque(filenames)
+
+        options = { \
+            'case_insensitive' : case_insensitive,
+            'decoder_trace'    : decoder_trace,
+            'chunk'            : _CATCHUP_CHUNK_LINES,
+            'globals'          : dict([(x, self.config.get(x)) for x in _CATCHUP_GLOBALS if x in self.config]),
+        }
+
+        try:
+            while files or jobs:
+                if is_break or self.stop:
+                    break
+
+                # -----------------------------------------------
+                # Submit Log-files with a snapshot of Orders keys
+                # -----------------------------------------------
+
+                while files and len(jobs) < inflight:
+                    filename = files.popleft()
+
+                    self._files[filename] = self._resume_pointer(filename)
+
+                    if self.orders.refresh(date_from=self._parse_datefrom(filename), extra=self.refreshOrder,
+                                           prefetch=self.prefetchOrders) == 0:
+                        if IsDebug:
+                            self.logger.out('inactive: %s' % filename)
+                        done.add(filename)
+                        continue
+
+                    active = self.orders.getActiveItems()
+                    index, unkeyed = self.orders.snapshot()
+
+                    if unkeyed:
+                        jobs.append((filename, active, index, None,))
+                        continue
+
+                    jobs.append((filename, active, index, executor.submit(catchup_file, filename, default_unicode, index,
+                                                                          offset=self._files[filename], **options)))
+
+                if not jobs:
+                    continue
+
+                # ------------------------------------------
+                # Register Log-lines of the first file ready
+                # ------------------------------------------
+
+                filename, active, index, job = jobs.popleft()
+
+                self._filename = filename
+
+                # ------------------------------------------------
+                # Orders without keys: emit the file sequentially
+                # ------------------------------------------------
+
+                if job is None:
+                    if self.orders.refresh(date_from=self._parse_datefrom(filename), extra=self.refreshOrder,
+                                           prefetch=self.prefetchOrders) > 0:
+                        _processed, is_break = self._emit_file(filename, _found, limit, _processed,
+                                                               case_insensitive=case_insensitive,
+                                                               decoder_trace=decoder_trace,
+                                                               )
+                    if not is_break:
+                        self._checkpoint(filename)
+                        done.add(filename)
+                    continue
+
+                pointer, lines, stats, is_more = job.result()
+
+                # ------------------------------------------
+                # Continue the file scan from the next chunk
+                # ------------------------------------------
+
+                if is_more:
+                    jobs.appendleft((filename, active, index, executor.submit(catchup_file, filename, default_unicode, index,
+                                                                              offset=pointer, **options)))
+
+                if metrics.enabled:
+                    metrics.read_bytes.inc(max(pointer - self._files[filename], 0))
+
+                if IsDebug:
+                    self.logger.out('catchup: %s lines: %d [%d] %s' % (filename, len(lines), pointer, stats))
+
+                for line, ids in lines:
+                    if not self._is_line_valid(line):
+                        continue
+
+                    orders = [x for x in active if x in ids]
+
+                    _processed += self._emit_line(filename, line, orders, _found, case_insensitive=case_insensitive)
+
+                    if limit and _processed > limit:
+                        is_break = True
+                        break
+
+                if pointer > 0:
+                    self._files[filename] = pointer
+
+                    if not is_break and not is_more:
+                        self._checkpoint(filename)
+
+                if not is_break and not is_more:
+                    done.add(filename)
+
+        finally:
+            for filename, active, index, job in jobs:
+                if job is not None:
+                    job.cancel()
+            executor.shutdown(wait=True)
+
+        return _processed
+
+    @profiled('emitter')
     def emitter(self, engine, limit):
         """
             Lines Emitter Scenario.
 
             Config parameters:
-                check_filename -- flag: match Log filename with client name or alias
-                decoder_trace  -- flag: prints decoder errors
+                check_filename   -- flag: match Log filename with client name or alias
+                decoder_trace    -- flag: prints decoder errors
+                catchup_workers  -- int: number of processes for parallel catch-up of Log-files (0 - sequential)
+                catchup_inflight -- int: max number of Log-files in progress for parallel catch-up
+
+            Returns:
+                _processed       -- int: number of matched Log-lines
+                _found           -- dict: number of matched Log-lines by order (registration of Log-items
+                                    is buffered, new messages are not known here)
         """
         _processed = 0
         _found = {}
@@ -1343,6 +2324,9 @@ class AbstractSource:
         decoder_trace = self.config.get('decoder_trace') or False
         case_insensitive = self.config.get('case_insensitive') or False
 
+        workers = self.config.get('catchup_workers') or 0
+        inflight = self.config.get('catchup_inflight') or workers * 2
+
         client = self.config.get('client')
 
         keys = []
@@ -1363,7 +2347,29 @@ class AbstractSource:
         # Get Orders for given Logger config params
         # -----------------------------------------
 
-        self.orders.refresh(date_from=date_from, delta=self._delta_datefrom[0])
+        self.orders.refresh(date_from=date_from, delta=self._delta_datefrom[0], prefetch=self.prefetchOrders)
+
+        filenames = [x for x in sorted(self._files.keys()) if not self._is_skipped_file(x, keys, suppressed, check_filename)]
+
+        # ---------------------------------
+        # Parallel catch-up of the Log-files
+        # ---------------------------------
+
+        if workers > 1 and len(filenames) > 1 and ProcessPoolExecutor is not None:
+            done = set()
+            try:
+                _processed = self._catchup(filenames, _found, limit, workers, max(inflight, 1),
+                                           case_insensitive=case_insensitive,
+                                           decoder_trace=decoder_trace,
+                                           done=done,
+                                           )
+                filenames = []
+            except:
+                if IsPrintExceptions:
+                    print_exception()
+
+                # Continue sequentially with the files not registered (submitted ones have resume pointers)
+                filenames = [x for x in filenames if x not in done]
 
         # -----------------
         # Observe Log-files
@@ -1371,38 +2377,10 @@ class AbstractSource:
 
         is_break = False
 
-        for n, filename in enumerate(sorted(self._files.keys())):
+        for n, filename in enumerate(filenames):
             if is_break or self.stop:
                 break
 
-            # ---------------------------------------------------------------
-            # Skip filename if supressed or not matched with given client key
-            # ---------------------------------------------------------------
-
-            fname = filename.lower()
-
-            if check_filename and keys:
-                found = False
-                for x in keys:
-                    if x and x in fname:
-                        found = True
-                        break
-                if not found:
-                    if IsDebug:
-                        self.logger.out('skipped: %s' % filename)
-                    continue
-
-            if suppressed:
-                found = False
-                for key in suppressed:
-                    if key and key in fname:
-                        found = True
-                        break
-                if found:
-                    if IsDebug:
-                        self.logger.out('suppressed: %s' % filename)
-                    continue
-
             self._message = ':%d-%d' % (len(self._files), n+1,)
 
             # -----------------------------------
@@ -1411,20 +2389,21 @@ class AbstractSource:
 
             self._filename = filename
 
-            # ----------------------------------------------
-            # Set Logs pointers at the beginning of the file
-            # ----------------------------------------------
+            # ------------------------------------------------------------------
+            # Set Logs pointers at the last checkpoint or the beginning of the file
+            # ------------------------------------------------------------------
 
             if IsDebug:
                 self.logger.out('file: %s [%d]' % (filename, self._files[filename]))
 
-            self._files[filename] = 0
+            self._files[filename] = self._resume_pointer(filename)
 
             # -------------------------
             # Refresh Orders collection
             # -------------------------
 
-            if self.orders.refresh(date_from=self._parse_datefrom(filename), extra=self.refreshOrder) == 0:
+            if self.orders.refresh(date_from=self._parse_datefrom(filename), extra=self.refreshOrder,
+                                   prefetch=self.prefetchOrders) == 0:
                 if IsDebug:
                     self.logger.out('inactive: %s' % filename)
                 continue
@@ -1433,71 +2412,25 @@ class AbstractSource:
             # Generate Log-lines stream from the file
             # ---------------------------------------
 
-            for l, line in enumerate(lines_emitter(filename, 'rb', default_unicode, 'EMITTER', 
+            _processed, is_break = self._emit_file(filename, _found, limit, _processed,
+                                                   case_insensitive=case_insensitive,
                                                    decoder_trace=decoder_trace,
-                                                   files=self._files,
-                                                   globals=self.config,
-                                                   )):
-                if IsDeepDebug:
-                    self.logger.out('line %d: [%s]' % (l, len(line)))
-
-                # -----------------------------------
-                # Skip invalid (broken) Log-line data
-                # -----------------------------------
-
-                if not self._is_line_valid(line):
-                    continue
-
-                if IsTrace and IsDeepDebug:
-                    print_to(None, '%s' % line)
-
-                # ------------------------------------------
-                # Add Log-line to launching lines-collection
-                # Never lade emitter by recurring lines!!!
-                # ------------------------------------------
-
-                self._lines = [(filename, line,)] #self._lines.append((filename, line,))
-
-                # --------------------------
-                # Check Order via given line
-                # --------------------------
+                                                   )
 
-                orders = self.orders.getActiveItems()
+            # -----------------------------------------------
+            # Checkpoint of the Log-file read up to the end
+            # -----------------------------------------------
 
-                for i, id in enumerate(orders):
-                    order = self.orders.get(id)
+            if not is_break:
+                self._checkpoint(filename)
 
-                    if not id in _found:
-                        _found[id] = 0
-
-                    # ----------------------------
-                    # Match Log-line with an Order
-                    # ----------------------------
-
-                    logged = self.launchEvent(order, id, case_insensitive=case_insensitive, no_span=True)
-
-                    if not logged:
-                        continue
-
-                    _found[id] += logged
-                    _processed += 1
-
-                    # ---------------------------------------------
-                    # If Log-line done, break and take the next one
-                    # ---------------------------------------------
-
-                    break
-
-                # -----------------
-                # Check lines limit
-                # -----------------
-
-                if limit and _processed > limit:
-                    is_break = True
+        self._lines = []
 
-                    break
+        # ----------------------------------
+        # Register the rest of the Log-items
+        # ----------------------------------
 
-        self._lines = []
+        self.flushLogItems()
 
         # ---------------
         # Finish Scenario
@@ -1558,6 +2491,7 @@ class AbstractSource:
 
         checkfile(filename, 'rb', default_unicode, None, [], None, 'OBSERVER', decoder_trace=decoder_trace,
                   files=self._files, lines=self._lines,
+                  decoders=self._decoders,
                   globals=self.config,
                   )
 
@@ -1602,6 +2536,7 @@ class AbstractSource:
             return
 
         del self._files[filename]
+        self._decoders.pop(filename, None)
 
         if IsDebug:
             self.logger.out('>>> file deleted: %s' % filename)
@@ -1626,9 +2561,13 @@ class AbstractSource:
         del self._files[filename]
         self._files[new] = 0
 
+        if filename in self._decoders:
+            self._decoders[new] = self._decoders.pop(filename)
+
         if IsDebug:
             self.logger.out('>>> file moved from: %s to: %s' % (filename, new))
 
+    @profiled('unresolved')
     def lanchUnresolved(self, date_from=None, case_insensitive=None, force=None):
         if not self._lines or len(self._lines) == 0:
             return
@@ -1661,6 +2600,9 @@ class AbstractSource:
         if force:
             self._lines = []
 
+            if metrics.enabled:
+                metrics.unresolved_lines.inc(n)
+
             if IsDebug:
                 self.logger.out('*** Overstock: reset')
 
@@ -1669,6 +2611,7 @@ class AbstractSource:
         else:
             self._unresolved_lines(force=force)
 
+    @profiled('observer')
     def launchObserverEvent(self):
         """
             Consume the watched Observer event.
@@ -1692,6 +2635,8 @@ class AbstractSource:
 
         self._evolute_date(date_from)
 
+        lines = len(self._lines)
+
         # ------------
         # Launch Event
         # ------------
@@ -1710,6 +2655,16 @@ class AbstractSource:
         if IsDebug:
             self.logger.out('*** Logged: %d' % logged)
 
+        if metrics.enabled and lines > len(self._lines):
+            metrics.matched_lines.inc(lines - len(self._lines))
+
+        # -----------------------------------------------------------
+        # Checkpoint of the Log-file if all its lines were registered
+        # -----------------------------------------------------------
+
+        if not [1 for filename, line in self._lines if filename == self._filename]:
+            self._checkpoint(self._filename)
+
         n = len(self._lines)
 
         force = False
@@ -1731,7 +2686,37 @@ def observer_trace(message, lock, event=None):
              message, 
              event and (' %s' % repr(event)) or '',
              lock.locked(),
-             ))
+             ), level=TRACE_DEBUG)
+
+
+class UnresolvedSweeper(threading.Thread):
+    """
+        Idle-time timer of the consumer: launches unresolved (overstock) Log-lines periodically.
+    """
+
+    def __init__(self, consumer, producer, busy, interval):
+        threading.Thread.__init__(self, daemon=True)
+
+        self._consumer = consumer
+        self._producer = producer
+        self._busy = busy
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def cancel(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            if not self._producer.is_empty():
+                continue
+
+            try:
+                with self._busy:
+                    self._consumer.lanchUnresolved()
+            except:
+                if IsPrintExceptions:
+                    print_exception()
 
 
 class LogConsumer(threading.Thread):
@@ -1752,11 +2737,28 @@ class LogConsumer(threading.Thread):
 
         self._found = {}
 
+        # Consumer is busy (event processing or unresolved sweep)
+        self._busy = threading.Lock()
+        self._sweeper = UnresolvedSweeper(self._consumer, self._producer, self._busy, self._sleep * _CHECK_UNRESOLVED_LIMIT)
+
+        # Latency from watchdog event: to the end of processing, to DB registration of new messages
+        self.event_latency = Histogram('event_latency')
+        self.register_latency = Histogram('register_latency')
+
     def stop(self):
         if IsDebug:
             self._logger.out('observer stop')
 
         self._should_be_run = False
+        self._sweeper.cancel()
+
+        with self._lock:
+            self._producer.wakeup()
+
+        if IsDebug:
+            for histogram in (self.event_latency, self.register_latency,):
+                print_to(None, '... %s' % histogram)
+
         return self._found
 
     def run(self):
@@ -1770,44 +2772,50 @@ class LogConsumer(threading.Thread):
                 print_exception()
 
     def process(self):
-        n = 0
-        while self._should_be_run:
-            time.sleep(self._sleep)
+        self._sweeper.start()
 
-            if IsObserverTrace and IsDeepDebug:
-                observer_trace('observer attempts to get event', self._lock)
+        while self._should_be_run:
 
-            event = None
+            # ---------------------------------------
+            # Wait for the producer signal (or sleep)
+            # ---------------------------------------
 
             with self._lock:
-                if not self._producer.is_empty():
-                    event = self._producer.next_event()
-                elif n < _CHECK_UNRESOLVED_LIMIT:
-                    n += 1
-                    continue
-                else:
-                    self._consumer.lanchUnresolved()
-                    n = 0
-                    continue
+                event = self._producer.wait_event(self._sleep)
 
-            self._consumer.watch(event)
+            # --------------------------
+            # Drain all pending events
+            # --------------------------
 
-            if IsObserverTrace:
-                observer_trace('extracted event', self._lock, event=event)
+            while event is not None and self._should_be_run:
+                if IsObserverTrace:
+                    observer_trace('extracted event', self._lock, event=event)
 
-            logged = self._consumer.launchObserverEvent()
+                with self._busy:
+                    self._consumer.watch(event)
 
-            with self._lock:
-                done_event = self._producer.pop()
+                    logged = self._consumer.launchObserverEvent()
+
+                with self._lock:
+                    pushed = self._producer.watched_at
+                    done_event = self._producer.pop()
+                    watched, event = event, self._producer.next_event()
+
+                if watched.key != done_event.key:
+                    self._logger.out('!!! check observer: %s' % repr(watched))
+
+                latency = time.time() - pushed
+                self.event_latency.observe(latency)
 
-            if event.key != done_event.key:
-                self._logger.out('!!! check observer: %s' % repr(event))
+                if logged > 0:
+                    self.register_latency.observe(latency)
 
-            if logged > 0:
-                key = event.src_path
-                if key not in self._found:
-                    self._found[key] = 0
-                self._found[key] += logged
+                    key = done_event.src_path
+                    if key not in self._found:
+                        self._found[key] = 0
+                    self._found[key] += logged
+
+        self._sweeper.cancel()
 
         if IsDebug:
             self._logger.out('observer finish')
@@ -1829,11 +2837,18 @@ class LogProducer(RegexMatchingEventHandler):
         
         self._watch_everything = kw.get('watch_everything') or False
 
-        self._stack = []
+        self._stack = deque()
+        self._keys = {}
+
+        # Signal to the consumer: a new event was registered
+        self._ready = threading.Condition(lock)
 
         self._watched = None
         self._timestamp = getToday()
 
+        metrics.queue_depth.set_function(lambda: len(self._stack))
+        metrics.oldest_event_age.set_function(self.oldest_event_age)
+
         if IsDebug:
             self._logger.out('LogProducer[%s] activated' % self._source)
 
@@ -1846,7 +2861,8 @@ class LogProducer(RegexMatchingEventHandler):
             self._logger.out('LogProducer stop')
 
         with self._lock:
-            self._stack = []
+            self._stack.clear()
+            self._keys.clear()
 
         if IsDebug:
             self._logger.out('>>> stack is%sreleased, the latest event: %s' % (
@@ -1858,11 +2874,22 @@ class LogProducer(RegexMatchingEventHandler):
             Check `watched` event key with the current one.
             NOTE! Simultaneously produced events on the given object is possible.
         """
-        index = self._watched and self._watched.key == event.key and 1 or 0
-        return event.key in [e.key for i, e in enumerate(self._stack) if i >= index]
+        count = self._keys.get(event.key, 0)
+        if self._watched is not None and self._watched.key == event.key:
+            count -= 1
+        return count > 0
 
     def is_empty(self):
-        return True if not self._stack or len(self._stack) == 0 else False
+        return len(self._stack) == 0
+
+    def oldest_event_age(self):
+        """
+            Age of the oldest event in the queue (sec), 0 if the queue is empty
+        """
+        try:
+            return time.time() - self._stack[0][1]
+        except IndexError:
+            return 0.0
 
     def push(self, event):
         """
@@ -1886,13 +2913,20 @@ class LogProducer(RegexMatchingEventHandler):
         if not event:
             return
 
+        key = event.key
+
         with self._lock:
-            if self._watch_everything or not self.exists(event):
-                self._stack.append(event)
-                self._timestamp = getToday()
+            is_registered = self._watch_everything or not self.exists(event)
+            if is_registered:
+                self._stack.append((event, time.time(),))
+                self._keys[key] = self._keys.get(key, 0) + 1
+                self._ready.notify()
 
-                if IsObserverTrace:
-                    observer_trace('registered a new event', self._lock, event=event)
+        if is_registered:
+            self._timestamp = getToday()
+
+            if IsObserverTrace:
+                observer_trace('registered a new event', self._lock, event=event)
 
     def is_file(self, event):
         return 0 if event.is_directory else 1
@@ -1941,11 +2975,33 @@ class LogProducer(RegexMatchingEventHandler):
 
         self.push(event)
 
+    @property
+    def watched_at(self):
+        """
+            Time of registration of the watched event
+        """
+        return self._stack and self._stack[0][1] or time.time()
+
+    def wakeup(self):
+        """
+            Wakes up the waiting consumer (should be called under the lock)
+        """
+        self._ready.notify_all()
+
+    def wait_event(self, timeout=None):
+        """
+            Waits for a new event if the queue is empty (should be called under the lock).
+            Returns the next event or None by timeout.
+        """
+        if self.is_empty():
+            self._ready.wait(timeout)
+        return self.next_event()
+
     def next_event(self):
         """
-            Return event which is next in the queue, but not extract it
+            Return event which is next in the queue, but not extract it (None if the queue is empty)
         """
-        self._watched = self._stack[0]
+        self._watched = self._stack and self._stack[0][0] or None
         return self._watched
 
     def pop(self):
@@ -1953,4 +3009,12 @@ class LogProducer(RegexMatchingEventHandler):
             Extract the first event from the Producer queue (FIFO)
         """
         self._watched = None
-        return self._stack.pop(0)
+        event, registered = self._stack.popleft()
+
+        count = self._keys.get(event.key, 0) - 1
+        if count > 0:
+            self._keys[event.key] = count
+        else:
+            self._keys.pop(event.key, None)
+
+        return event
@@ -21,6 +21,8 @@ class Source(AbstractSource):
     def __init__(self, config, logger): 
         super(Source, self).__init__(config, logger)
 
+        self._with_batches = True
+
         self._module_splitter = 'Log_'
 
     @before(_database)
@@ -42,7 +44,6 @@ class Source(AbstractSource):
         root, ip, ctype = self.getSourceInfo(as_list=True)
         self.check_source(root=root, ip=ip, ctype=ctype)
 
-    @after(_database)
     def _term(self):
         super(Source, self)._term()
 
@@ -130,6 +131,9 @@ class Source(AbstractSource):
         config = (encoding, root) if root else None
         return config
 
+    def _batches_engine(self):
+        return engines[_database]
+
     def _make_logger_params(self, order, **kw):
         """
             Makes `worker.py` parameters
@@ -162,12 +166,7 @@ class Source(AbstractSource):
         aliases = []
 
         if file_id is not None and not refreshed:
-            keys.append(str(file_id))
-
-            if file_name:
-                keys.append(file_name)
-                if point in file_name:
-                    keys.append(file_name.split(point)[0])
+            keys = self._make_order_keys(order)
 
             where = 'FileID = %s' % file_id
 
@@ -206,6 +205,7 @@ class Source(AbstractSource):
     def refreshOrder(self, order):
         self._make_logger_params(order)
         order[ORDER_REFRESHED] = True
+        self.orders.index(order.get('id'), order)
 
     def getLogs(self, order, **kw):
         """
@@ -40,7 +40,6 @@ class Source(AbstractSource):
         root, ip, ctype = self.getSourceInfo(as_list=True)
         self.check_source(root=root, ip=ip, ctype=ctype)
 
-    @after(_database)
     def _term(self):
         super(Source, self)._term()
 
@@ -301,6 +300,7 @@ class Source(AbstractSource):
     def refreshOrder(self, order):
         self._make_logger_params(order)
         order[ORDER_REFRESHED] = True
+        self.orders.index(order.get('id'), order)
 
     def getLogs(self, order, **kw):
         """
@@ -1,7 +1,7 @@
 ﻿# -*- coding: utf-8 -*-
 
 from . import *
-from ..worker import sdc_log_config, check_sdc_log, getSDCLogInfo
+from ..worker import sdc_log_config, check_sdc_log, getSDCLogInfo, compile_masks
 
 # Source DB: BankDB Database connection name
 _database = 'bankperso'
@@ -18,6 +18,8 @@ class Source(AbstractSource):
     def __init__(self, config, logger): 
         super(Source, self).__init__(config, logger)
 
+        self._with_batches = True
+
         self._module_splitter = 'sdc_'
 
     @before(_database)
@@ -39,7 +41,6 @@ class Source(AbstractSource):
         root, ip, ctype = self.getSourceInfo(as_list=True)
         self.check_source(root=root, ip=ip, ctype=ctype)
 
-    @after(_database)
     def _term(self):
         super(Source, self)._term()
 
@@ -144,6 +145,9 @@ class Source(AbstractSource):
         config = (encoding, root, filemask, options) if root else None
         return config
 
+    def _batches_engine(self):
+        return engines[_database]
+
     def _make_logger_params(self, order, **kw):
         """
             Makes `worker.py` parameters
@@ -176,12 +180,7 @@ class Source(AbstractSource):
         aliases = []
 
         if file_id is not None and not refreshed:
-            keys.append(str(file_id))
-
-            if file_name:
-                keys.append(file_name)
-                if point in file_name:
-                    keys.append(file_name.split(point)[0])
+            keys = self._make_order_keys(order)
 
             where = 'FileID = %s' % file_id
 
@@ -223,7 +222,7 @@ class Source(AbstractSource):
 
         # Get `Module` cname via `config.filemask`
         filemask = self.config.get('filemask')
-        rfile = re.compile(filemask)
+        rfile = compile_masks(filemask)[0]
         m = rfile.search(log_name)
         cname = m and m.group(1) or ''
 
@@ -238,6 +237,7 @@ class Source(AbstractSource):
     def refreshOrder(self, order):
         self._make_logger_params(order)
         order[ORDER_REFRESHED] = True
+        self.orders.index(order.get('id'), order)
 
     def getLogs(self, order, **kw):
         """
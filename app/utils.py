@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import codecs
 import datetime
 from datetime import timedelta
 import time
@@ -10,7 +11,6 @@ import io
 import xlwt
 from sortedcontainers import SortedDict
 import base64
-import codecs
 import zipfile
 
 from config import (
@@ -137,7 +137,7 @@ def getMaskedPAN(value):
 
 def checkDate(value, format=DEFAULT_DATETIME_FORMAT):
     try:
-        v = datetime.datetime.strptime(value, format)
+        v = get_timestamp_parser(format).parse(value)
         if not (v and v.year > 2010):
             v = None
     except:
@@ -374,6 +374,316 @@ def decoder(data, encodings, info='', is_trace=False, limit=None, level=0, **kw)
 
     return image, encoding
 
+# Fixed-width fields of timestamps: {directive: (datetime argument, width)}
+TIMESTAMP_FIELDS = { \
+    '%Y' : ('year', 4),
+    '%m' : ('month', 2),
+    '%d' : ('day', 2),
+    '%H' : ('hour', 2),
+    '%M' : ('minute', 2),
+    '%S' : ('second', 2),
+}
+
+
+class TimestampParser:
+    """
+        Log-lines timestamps parser.
+
+        Timestamps of fixed-width formats (%Y %m %d %H %M %S with separators, optional trailing %f as in
+        `DEFAULT_DATETIME_PERSOLOG_FORMAT`, `DEFAULT_DATETIME_SDCLOG_FORMAT`, JZDO) are parsed by slicing
+        fixed positions. The parsed date/second prefix and its formatted output are kept, so consecutive lines
+        of the same second reuse them. Other formats and values not matched with the format go to `strptime`.
+
+        Arguments:
+            format      -- string: `strptime` format of timestamps
+            output      -- string: `strftime` format of `format` output (`cdate`)
+    """
+
+    def __init__(self, format, output=None):
+        self.format = format
+        self.output = output
+
+        self._plan = self._make_plan(format)
+        self._memo = (None, None, None)
+        self._is_output_memo = output is not None and '%f' not in output
+
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def _make_plan(format):
+        """
+            Returns (fields, separators, size of prefix, is_fraction) or None if format is not fixed-width
+        """
+        fields, separators = [], []
+        pos = i = 0
+        is_fraction = False
+
+        while i < len(format):
+            if format[i] == '%':
+                code = format[i:i+2]
+                if code in TIMESTAMP_FIELDS:
+                    name, size = TIMESTAMP_FIELDS[code]
+                    fields.append((name, pos, pos + size,))
+                    pos += size
+                elif code == '%f' and i + 2 == len(format):
+                    is_fraction = True
+                else:
+                    return None
+                i += 2
+            else:
+                separators.append((pos, format[i],))
+                pos += 1
+                i += 1
+
+        if not fields:
+            return None
+
+        return tuple(fields), tuple(separators), pos, is_fraction
+
+    def _parse_prefix(self, prefix):
+        fields, separators, size, is_fraction = self._plan
+
+        if len(prefix) != size:
+            return None
+        for pos, c in separators:
+            if prefix[pos] != c:
+                return None
+
+        values = {}
+        try:
+            for name, start, end in fields:
+                x = prefix[start:end]
+                if not x.isdigit():
+                    return None
+                values[name] = int(x)
+        except ValueError:
+            return None
+
+        return datetime.datetime(values.get('year', 1900), values.get('month', 1), values.get('day', 1),
+                                 values.get('hour', 0), values.get('minute', 0), values.get('second', 0))
+
+    def _parse(self, value):
+        """
+            Returns (prefix, datetime of prefix, microseconds) or None if value is not matched with the format
+        """
+        fields, separators, size, is_fraction = self._plan
+
+        prefix = value[:size]
+        microsecond = 0
+
+        if is_fraction:
+            rest = value[size:]
+            if not (rest.isdigit() and len(rest) <= 6):
+                return None
+            try:
+                microsecond = int(rest.ljust(6, '0'))
+            except ValueError:
+                return None
+        elif len(value) != size:
+            return None
+
+        memo = self._memo
+
+        if memo[0] == prefix:
+            self.hits += 1
+            return prefix, memo[1], microsecond
+
+        self.misses += 1
+
+        date = self._parse_prefix(prefix)
+        if date is None:
+            return None
+
+        self._memo = (prefix, date, None)
+
+        return prefix, date, microsecond
+
+    def parse(self, value):
+        """
+            Returns datetime of the timestamp, raises ValueError as `strptime` does
+        """
+        x = self._plan is not None and self._parse(value) or None
+
+        if x is None:
+            self.fallbacks += 1
+            return datetime.datetime.strptime(value, self.format)
+
+        prefix, date, microsecond = x
+
+        return microsecond and date.replace(microsecond=microsecond) or date
+
+    def __call__(self, value):
+        """
+            Returns the timestamp formatted by `output` (as `cdate(strptime(value, format), output)`)
+        """
+        x = self._plan is not None and self._parse(value) or None
+
+        if x is None:
+            self.fallbacks += 1
+            return cdate(datetime.datetime.strptime(value, self.format), self.output)
+
+        prefix, date, microsecond = x
+
+        if self._is_output_memo:
+            memo = self._memo
+            if memo[0] != prefix:
+                return cdate(date, self.output)
+            if memo[2] is None:
+                memo = self._memo = (prefix, date, cdate(date, self.output))
+            return memo[2]
+
+        return cdate(microsecond and date.replace(microsecond=microsecond) or date, self.output)
+
+    def stats(self):
+        return 'hits:%d misses:%d fallbacks:%d' % (self.hits, self.misses, self.fallbacks)
+
+
+_timestamp_parsers = {}
+
+def get_timestamp_parser(format, output=None):
+    """
+        Returns shared parser of the format
+    """
+    key = (format, output)
+    if key not in _timestamp_parsers:
+        _timestamp_parsers[key] = TimestampParser(format, output)
+    return _timestamp_parsers[key]
+
+
+# Size of Log-file sample to detect its dominant encoding (bytes)
+DECODER_SAMPLE_SIZE = 1024*64
+
+_non_ascii = re.compile(b'[\x80-\xff]')
+
+
+class FileDecoder:
+    """
+        Decoder of Log-file lines with the dominant encoding of the file detected once.
+
+        The dominant encoding is tried first for every line, only failed lines are repaired
+        by the mixed-encoding `decoder`. Single-byte encodings (cp1251, latin-1) decode any bytes,
+        so they are dominant only if no line of the sample is valid in a strict (utf) encoding,
+        a file with mixed lines is decoded line by line by `decoder` in order of `encodings`.
+
+        Arguments:
+            encodings   -- tuple: encodings to check (preffered first)
+
+        Class attributes:
+            encoding    -- string: dominant encoding of the file
+            mixed       -- bool: file has lines of strict and single-byte encodings
+            counters    -- dict: number of lines decoded by encoding
+            repairs     -- int: number of lines repaired by `decoder`
+    """
+
+    def __init__(self, encodings):
+        self.encodings = tuple(encodings)
+        self.encoding = None
+        self.mixed = False
+        self.counters = {}
+        self.repairs = 0
+
+    @staticmethod
+    def is_strict(encoding):
+        """
+            Encoding fails on invalid bytes (utf family), single-byte encodings don't
+        """
+        try:
+            return codecs.lookup(encoding).name.startswith('utf')
+        except LookupError:
+            return False
+
+    @property
+    def detected(self):
+        return self.encoding is not None
+
+    def detect(self, filename, size=None):
+        """
+            Detects dominant encoding by the first `size` bytes of the file (whole lines only).
+        """
+        try:
+            with open(filename, 'rb') as fi:
+                data = fi.read(size or DECODER_SAMPLE_SIZE)
+        except:
+            return None
+
+        n = data.rfind(b'\n')
+        if n > -1:
+            data = data[:n+1]
+
+        # ASCII lines are the same for any encoding
+        lines = [x for x in data.split(b'\n') if x and _non_ascii.search(x)]
+
+        strict = [x for x in self.encodings if self.is_strict(x)]
+        single = [x for x in self.encodings if x not in strict]
+
+        def _count(encoding):
+            count = 0
+            for line in lines:
+                try:
+                    line.decode(encoding)
+                    count += 1
+                except UnicodeError:
+                    pass
+            return count
+
+        self.mixed = False
+
+        if not lines:
+            self.encoding = self.encodings[0]
+            return self.encoding
+
+        # -------------------------------------------------
+        # Strict encoding decodes the whole sample: dominant
+        # -------------------------------------------------
+
+        counts = [(x, _count(x),) for x in strict]
+
+        for encoding, count in counts:
+            if count == len(lines):
+                self.encoding = encoding
+                return self.encoding
+
+        # ------------------------------------------------------------------
+        # Single-byte encoding is dominant only if there are no strict lines
+        # ------------------------------------------------------------------
+
+        if single and not [1 for encoding, count in counts if count > 0]:
+            self.encoding = max([(_count(x), -i, x,) for i, x in enumerate(single)])[2]
+            return self.encoding
+
+        self.encoding = self.encodings[0]
+        self.mixed = True
+
+        return self.encoding
+
+    def decode(self, data, info='', is_trace=False):
+        """
+            Decodes the line. Returns decoded line and its encoding as `decoder` does.
+        """
+        if self.mixed:
+            line, encoding = decoder(data, self.encodings, info=info, is_trace=is_trace)
+            self.counters[encoding] = self.counters.get(encoding, 0) + 1
+            return line, encoding
+
+        encoding = self.encoding or self.encodings[0]
+
+        try:
+            line = data.decode(encoding, errors=encoding == default_iso and 'surrogateescape' or 'strict')
+        except UnicodeError:
+            encodings = (encoding,) + tuple([x for x in self.encodings if x != encoding])
+            line, encoding = decoder(data, encodings, info=info, is_trace=is_trace)
+            self.repairs += 1
+
+        self.counters[encoding] = self.counters.get(encoding, 0) + 1
+
+        return line, encoding
+
+    def stats(self):
+        return '%s%s %s repairs:%d' % (self.encoding, self.mixed and ' mixed' or '', ', '.join(['%s:%d' % (k, v) for k, v in sorted(self.counters.items())]), self.repairs)
+
+
 def pickupKeyInLine(line, key, span=''):
     if not (line and key):
         return line
@@ -5,17 +5,23 @@ import codecs
 import sys
 import os
 import re
+import time
 from operator import itemgetter
 
 from config import (
      BP_ROOT, INFOEXCHANGE_ROOT, SDC_ROOT, EXCHANGE_ROOT, IsDebug, IsDeepDebug, IsTrace, IsLogTrace, IsPrintExceptions,
      default_unicode, default_encoding, UTC_FULL_TIMESTAMP,
-     print_to, print_exception
+     print_to, print_exception, flush_trace
      )
 
 from .settings import DEFAULT_DATETIME_FORMAT, DEFAULT_DATETIME_INLINE_FORMAT, MAX_LOGS_LEN
-from .utils import normpath, cdate, getDate, getToday, decoder, pickupKeyInLine
+from .utils import normpath, cdate, getDate, getToday, pickupKeyInLine, FileDecoder, get_timestamp_parser
 from .booleval import Token
+from .matcher import KeyMatcher
+from .cache import LRUCache
+from .reader import BlockReader, LineReader, MmapReader
+from .logitem import LogItem
+from . import metrics
 
 try:
     from types import UnicodeType, StringType
@@ -31,6 +37,34 @@ if is_v3:
 IsCheckFolders = 0
 IsDisableOutput = 0
 
+# Size of block to read Log-files (bytes), 0 - line by line
+ReadBlockSize = 1024*1024*4
+# Mode to read local Log-files: block|mmap
+ReadMode = 'block'
+# Size of Log-file sample to detect its dominant encoding (bytes)
+DecoderSampleSize = 1024*64
+
+# Marks of Log-lines to skip (see `is_valid_line`)
+INVALID_LINE_MARKS = ('-->', '==>', '>>>',)
+INVALID_LINE_BYTES = tuple([x.encode() for x in INVALID_LINE_MARKS])
+
+# Compiled keys matchers (by keys set)
+MAX_MATCHERS = 1000
+_matchers = LRUCache(MAX_MATCHERS)
+
+# Folders checked by Client aliases: {(folder, aliases): is_found}
+MAX_CHECKED_FOLDERS = 10000
+_checked_folders = LRUCache(MAX_CHECKED_FOLDERS)
+
+# Directory listings by directory mtime: {root: (mtime, [(name, path, is_dir)])}
+MAX_LISTINGS = 10000
+_listings = LRUCache(MAX_LISTINGS)
+# Listings of the directories changed last seconds are not cached (mtime resolution of FS/SMB)
+LISTING_SETTLE_TIME = 2
+
+# Compiled `dir`, `file`, `filemask` regexes (by masks)
+_masks = {}
+
 perso_log_config = { \
     'root'    : 'Bin',
     'dir'     : ('Log_.*',), # 'HomeCredit_.*',
@@ -108,9 +142,15 @@ def _pout(s, **kw):
         print(s, **kw)
 
 def set_globals(config):
-    global IsDebug, IsDeepDebug, IsTrace, IsLogTrace, IsPrintExceptions
+    global IsDebug, IsDeepDebug, IsTrace, IsLogTrace, IsPrintExceptions, ReadBlockSize, ReadMode, DecoderSampleSize
     if not config:
         return
+    if 'read_block' in config:
+        ReadBlockSize = (config.get('read_block') or 0) * 1024
+    if 'read_mode' in config:
+        ReadMode = config.get('read_mode') or ''
+    if 'decoder_sample' in config:
+        DecoderSampleSize = (config.get('decoder_sample') or 0) * 1024
     if 'debug' in config:
         IsDebug = config.get('debug') or 0
     if 'deepdebug' in config:
@@ -288,6 +328,19 @@ def _extract_keys(keys):
         return keys.get_keys()
     return keys or []
 
+def get_matcher(keys, case_insensitive=False):
+    """
+        Returns compiled keys matcher for the given keys set (cached)
+    """
+    key = (tuple(keys), case_insensitive and True or False)
+    matcher = _matchers.get(key)
+    if matcher is None:
+        matcher = KeyMatcher(case_insensitive=case_insensitive)
+        matcher.add(None, keys)
+        matcher.commit()
+        _matchers.set(key, matcher)
+    return matcher
+
 def _register_error(logs, e, **kw):
     logs.append({
         'Date' : cdate(getToday(), kw.get('date_format') or UTC_FULL_TIMESTAMP),
@@ -360,10 +413,70 @@ def closefile(fin):
     if fin and not fin.closed:
         fin.close()
 
+def is_local_file(filename):
+    return filename and not (filename.startswith('//') or filename.startswith('\\\\')) and True or False
+
+def get_reader(fin, filename, keys=None):
+    """
+        Returns Log-file lines reader: by blocks (or memory-mapped) for binary mode, line by line otherwise.
+
+        Arguments:
+            fin      -- file: opened Log-file
+            filename -- string: full path to Log-file
+            keys     -- tuple of bytes: prefilter of lines for memory-mapped mode (optional)
+    """
+    if 'b' not in getattr(fin, 'mode', ''):
+        pass
+    elif ReadMode == 'mmap' and is_local_file(filename) and MmapReader.is_available(fin):
+        return MmapReader(fin, skip=INVALID_LINE_BYTES, keys=keys)
+    elif ReadBlockSize:
+        return BlockReader(fin, block_size=ReadBlockSize)
+    return LineReader(fin, filename)
+
+def get_file_decoder(filename, encodings, decoders=None):
+    """
+        Returns decoder of the Log-file. If `decoders` collection is given, dominant encoding
+        of the file is detected once and the decoder is kept in the collection.
+    """
+    fdecoder = decoders is not None and decoders.get(filename) or None
+    if fdecoder is None:
+        fdecoder = FileDecoder(encodings)
+        if decoders is not None:
+            fdecoder.detect(filename, DecoderSampleSize)
+            decoders[filename] = fdecoder
+    return fdecoder
+
+def get_prefilter_keys(keys):
+    """
+        Returns keys as bytes to prefilter raw lines if they are ASCII (same bytes for any encoding)
+    """
+    try:
+        return tuple([x.encode('ascii') for x in keys if x]) or None
+    except:
+        return None
+
 def is_valid_line(line, is_bytes):
-    keys = is_bytes and (b'-->', b'==>', b'>>>',) or ('-->', '==>', '>>>',)
+    keys = is_bytes and INVALID_LINE_BYTES or INVALID_LINE_MARKS
     return line and len([1 for key in keys if key not in line]) == len(keys) and True or False
 
+def count_read(size, lines, fdecoder, counters):
+    """
+        Adds reading of the Log-file to the metrics: bytes, lines and lines decoded by encoding.
+
+        Arguments:
+            size             -- int: number of bytes read
+            lines            -- int: number of lines read
+            fdecoder         -- FileDecoder: decoder of the Log-file
+            counters         -- dict: decoder counters before reading
+    """
+    metrics.read_bytes.inc(max(size, 0))
+    metrics.read_lines.inc(lines)
+
+    for encoding, count in fdecoder.counters.items():
+        count -= counters.get(encoding, 0)
+        if count > 0:
+            metrics.decoded_lines.inc(count, encoding)
+
 def checkfile(filename, mode, encoding, logs, keys, getter, msg, **kw):
     """
         Checks Log-file lines, decodes their and generates Logs-items.
@@ -388,6 +501,7 @@ def checkfile(filename, mode, encoding, logs, keys, getter, msg, **kw):
             no_span          -- bool: if True, don't insert <span> tag inside the log context
             decoder_trace    -- bool: lines decoder trace
             files            -- dict: processed Logs-files seek pointers, [output]
+            decoders         -- dict: Logs-files decoders (dominant encoding and counters), [output]
             lines            -- list: obtained Log-lines only, [output]
 
         Returns [output] by ref.
@@ -399,6 +513,7 @@ def checkfile(filename, mode, encoding, logs, keys, getter, msg, **kw):
     no_span = kw.get('no_span') or False
     decoder_trace = kw.get('decoder_trace') or False
     files = kw.get('files') or None
+    decoders = kw.get('decoders')
     lines = kw.get('lines')
 
     set_globals(kw.get('globals'))
@@ -430,6 +545,7 @@ def checkfile(filename, mode, encoding, logs, keys, getter, msg, **kw):
     # Set opposite encoding for decoder-tricks
     #
     encodings = (encoding, get_opposite_encoding(encoding),)
+    fdecoder = get_file_decoder(filename, encodings, decoders)
     #
     # Get FSO-pointer for a given Log-file
     #
@@ -439,10 +555,14 @@ def checkfile(filename, mode, encoding, logs, keys, getter, msg, **kw):
     #
     IsLinesOnly = lines is not None and True or False
 
+    counters = dict(fdecoder.counters) if metrics.enabled else None
+
     num_logged = 0
     num_line = 0
     pointer = 0
 
+    info = ''
+
     try:
         #
         # Start reading the file from the last seek-position
@@ -450,17 +570,17 @@ def checkfile(filename, mode, encoding, logs, keys, getter, msg, **kw):
         if is_opened and spointer is not None:
             fin.seek(spointer, 0)
 
-        while is_opened:
-            size = 0
-            pointer = fin.tell()
+        prefilter = not (forced or IsLinesOnly or token is not None or case_insensitive) and get_prefilter_keys(keys) or None
 
-            if pointer == os.path.getsize(filename):
-                break
+        reader = is_opened and get_reader(fin, filename, keys=prefilter) or []
+
+        for pointer, line in reader:
+            size = len(line)
+            num_line += 1
 
             try:
-                line = fin.readline()
-                size = len(line)
-                num_line += 1
+                if isinstance(line, memoryview):
+                    line = line.tobytes()
 
                 if not is_valid_line(line, is_bytes):
                     continue
@@ -471,7 +591,7 @@ def checkfile(filename, mode, encoding, logs, keys, getter, msg, **kw):
                 # Decode bytes as string with more preffered encoding
                 #
                 if is_bytes:
-                    line, encoding = decoder(line, encodings, info=info, is_trace=decoder_trace)
+                    line, encoding = fdecoder.decode(line, info=info, is_trace=decoder_trace)
                 #
                 # Check end of the stream
                 #
@@ -502,8 +622,6 @@ def checkfile(filename, mode, encoding, logs, keys, getter, msg, **kw):
                     print_to(None, '>>> INVALID %s LINE[%s]: %s %s' % (msg, filename, info, line))
                 if IsPrintExceptions:
                     print_exception()
-                if size > 0 and fin.tell() - pointer > size:
-                    fin.seek(pointer+size, 0)
             except:
                 if IsDeepDebug and IsLogTrace:
                     print_to(None, '!!! CHECKFILE ERROR[%s]: %s %s' % (filename, info, line))
@@ -511,17 +629,23 @@ def checkfile(filename, mode, encoding, logs, keys, getter, msg, **kw):
                     print_exception()
                 raise
 
+        if is_opened:
+            pointer = reader.position
+
     except EOFError:
         pass
 
     closefile(fin)
 
+    if counters is not None and is_opened:
+        count_read(pointer - (spointer or 0), num_line, fdecoder, counters)
+
     if files is not None and pointer > 0: # and num_logged > 0
         files[filename] = pointer
 
     if IsLogTrace:
-        print_to(None, '--> file: %s %s %s %s [%d]: %d' % ( \
-            mdate(filename), filename, forced_encoding, is_opened, num_logged, pointer
+        print_to(None, '--> file: %s %s %s %s [%d]: %d %s' % ( \
+            mdate(filename), filename, forced_encoding, is_opened, num_logged, pointer, fdecoder.stats()
             ))
 
 def lines_emitter(filename, mode, encoding, msg, **kw):
@@ -537,9 +661,11 @@ def lines_emitter(filename, mode, encoding, msg, **kw):
         Keyword arguments:
             decoder_trace    -- bool: lines decoder trace
             files            -- dict: processed Logs-files seek pointers, [output]
+            decoders         -- dict: Logs-files decoders (dominant encoding and counters), [output]
     """
     decoder_trace = kw.get('decoder_trace') or False
     files = kw.get('files') or None
+    decoders = kw.get('decoders')
 
     set_globals(kw.get('globals'))
 
@@ -552,14 +678,19 @@ def lines_emitter(filename, mode, encoding, msg, **kw):
     # Set opposite encoding for decoder-tricks
     #
     encodings = (encoding, get_opposite_encoding(encoding),)
+    fdecoder = get_file_decoder(filename, encodings, decoders)
     #
     # Get FSO-pointer for a given Log-file
     #
     spointer = files is not None and filename in files and files[filename] or None
 
+    counters = dict(fdecoder.counters) if metrics.enabled else None
+
     num_line = 0
     pointer = 0
 
+    info = ''
+
     try:
         #
         # Start reading the file from the last seek-position
@@ -567,17 +698,15 @@ def lines_emitter(filename, mode, encoding, msg, **kw):
         if is_opened and spointer is not None:
             fin.seek(spointer, 0)
 
-        while is_opened:
-            size = 0
-            pointer = fin.tell()
+        reader = is_opened and get_reader(fin, filename) or []
 
-            if pointer == os.path.getsize(filename):
-                break
+        for pointer, line in reader:
+            size = len(line)
+            num_line += 1
 
             try:
-                line = fin.readline()
-                size = len(line)
-                num_line += 1
+                if isinstance(line, memoryview):
+                    line = line.tobytes()
 
                 if not is_valid_line(line, is_bytes):
                     continue
@@ -588,7 +717,7 @@ def lines_emitter(filename, mode, encoding, msg, **kw):
                 # Decode bytes as string with more preffered encoding
                 #
                 if is_bytes:
-                    line, encoding = decoder(line, encodings, info=info, is_trace=decoder_trace)
+                    line, encoding = fdecoder.decode(line, info=info, is_trace=decoder_trace)
                 #
                 # Check end of the stream
                 #
@@ -602,13 +731,18 @@ def lines_emitter(filename, mode, encoding, msg, **kw):
                 #
                 yield line.strip()
 
+            except GeneratorExit:
+                #
+                # The stream is closed by consumer: the next seek-pointer is the end of the last line given
+                #
+                if is_opened:
+                    pointer = reader.position
+                break
             except (ValueError, UnicodeError):
                 if IsLogTrace:
                     print_to(None, '>>> INVALID %s LINE[%s]: %s\n%s' % (msg, filename, info, line))
                 if IsPrintExceptions:
                     print_exception()
-                if size > 0 and fin.tell() - pointer > size:
-                    fin.seek(pointer+size, 0)
             except:
                 if IsLogTrace:
                     print_to(None, '!!! EMITTER ERROR[%s]: %s\n%s' % (filename, info, line))
@@ -617,20 +751,91 @@ def lines_emitter(filename, mode, encoding, msg, **kw):
                     break
                 else:
                     raise
+        else:
+            if is_opened:
+                pointer = reader.position
 
     except EOFError:
         pass
 
     closefile(fin)
 
+    if counters is not None and is_opened:
+        count_read(pointer - (spointer or 0), num_line, fdecoder, counters)
+
     if files is not None and pointer > 0:
         files[filename] = pointer
 
     if IsLogTrace:
-        print_to(None, '--> file: %s %s %s %s [%d]: %d' % ( \
-            mdate(filename), filename, forced_encoding, is_opened, num_line, pointer
+        print_to(None, '--> file: %s %s %s %s [%d]: %d %s' % ( \
+            mdate(filename), filename, forced_encoding, is_opened, num_line, pointer, fdecoder.stats()
             ))
 
+def catchup_file(filename, encoding, index, **kw):
+    """
+        Catch-up scan of the Log-file (runs in a worker process).
+
+        Reads and decodes the Log-file from the beginning (or `offset`) and matches its lines with the keys index.
+
+        Arguments:
+            filename         -- string: full path to Log-file
+            encoding         -- string: preffered encoding to decode messages
+            index            -- dict: Orders keys index {key: set of Order IDs}
+
+        Keyword arguments:
+            offset           -- int: the file seek pointer to start from
+            chunk            -- int: max number of matched lines to return, the scan is stopped after them
+            case_insensitive -- bool: if True, use case-insensitive keys check
+            decoder_trace    -- bool: lines decoder trace
+            globals          -- dict: logger config flags
+
+        Returns:
+            pointer          -- int: the file seek pointer after scan
+            lines            -- list: matched lines [(line, set of Order IDs)...]
+            stats            -- string: decoder stats
+            is_more          -- bool: the scan is stopped by `chunk`, continue from `pointer`
+    """
+    matcher = KeyMatcher(case_insensitive=kw.get('case_insensitive'))
+    for key in index:
+        matcher.add(key, [key])
+    matcher.commit()
+
+    chunk = kw.get('chunk') or 0
+
+    files = {filename: kw.get('offset') or 0}
+    decoders = {}
+    lines = []
+
+    is_more = False
+
+    emitter = lines_emitter(filename, 'rb', encoding, 'CATCHUP', 
+                            decoder_trace=kw.get('decoder_trace'),
+                            files=files,
+                            decoders=decoders,
+                            globals=kw.get('globals'),
+                            )
+
+    for line in emitter:
+        ids = set()
+        for key in matcher.search(line):
+            ids.update(index[key])
+        if ids:
+            lines.append((line, ids,))
+
+            if chunk and len(lines) >= chunk:
+                is_more = True
+                break
+
+    # Save the seek pointer of the stopped scan
+    emitter.close()
+
+    fdecoder = decoders.get(filename)
+
+    # Worker processes don't run `atexit`
+    flush_trace()
+
+    return files[filename], lines, fdecoder is not None and fdecoder.stats() or '', is_more
+
 def checkline(line, logs, keys, getter, **kw):
     """
         Checks the Log-file line and makes a new logs-item
@@ -682,17 +887,29 @@ def checkline(line, logs, keys, getter, **kw):
         # Search given keys
         #
         if token is not None:
-            for key in keys:
-                line, is_found = _findkey(line, key['value'], case_insensitive=case_insensitive, no_span=no_span)
+            values = [key['value'] for key in keys]
+            matcher = get_matcher(values, case_insensitive=case_insensitive)
+            found = matcher.search(line)
+            bits = 0
+            for n, key in enumerate(keys):
+                is_found = matcher.fold(key['value']) in found
+                if is_found and not no_span:
+                    line, is_found = _findkey(line, key['value'], case_insensitive=case_insensitive, no_span=no_span)
                 key['res'] = is_found
-            token.set_values(keys)
-            IsFound = token()
-        else:
-            for key in keys:
-                line, is_found = _findkey(line, key, case_insensitive=case_insensitive, no_span=no_span)
                 if is_found:
-                    IsFound = True
-                    break
+                    bits |= 1 << n
+            if keys:
+                IsFound = token.evaluate(bits)
+            else:
+                IsFound = token()
+        elif keys:
+            matcher = get_matcher(keys, case_insensitive=case_insensitive)
+            found = matcher.search(line)
+            if found:
+                IsFound = True
+                if not no_span:
+                    key = [x for x in keys if matcher.fold(x) in found][0]
+                    line, is_found = _findkey(line, key, case_insensitive=case_insensitive, no_span=no_span)
         #
         # Add a new item to logs
         #
@@ -708,8 +925,19 @@ def checkline(line, logs, keys, getter, **kw):
 
     return logged
 
+def compile_masks(masks):
+    """
+        Returns compiled regexes of the masks (compiled once)
+    """
+    if isinstance(masks, StringTypes):
+        masks = (masks,)
+    key = tuple(masks or ())
+    if key not in _masks:
+        _masks[key] = tuple([re.compile(x) for x in key if x])
+    return _masks[key]
+
 def is_mask_matched(mask, value):
-    return mask and value and re.match(mask, value)
+    return mask and value and compile_masks(mask)[0].match(value)
 
 def is_today_file(name, dates=None, filemask=None, filename=None, format=None):
     """
@@ -740,7 +968,7 @@ def is_today_file(name, dates=None, filemask=None, filename=None, format=None):
     # Should be present 2 groups: `module`, `sdate`
     #
     elif filemask is not None:
-        rfile = re.compile(filemask)
+        rfile = compile_masks(filemask)[0]
         m = rfile.search(name)
         sdate = m and len(m.groups()) > 1 and m.group(2) or None
         if not dates:
@@ -760,11 +988,50 @@ def is_today_file(name, dates=None, filemask=None, filename=None, format=None):
 def valid_name(mode, value):
     if not config.get(mode):
         return True
-    for mask in config.get(mode):
-        if is_mask_matched(mask, value) is not None:
+    for rmask in compile_masks(config.get(mode)):
+        if rmask.match(value) is not None:
             return True
     return False
 
+def scan_dir(root):
+    """
+        Returns the directory listing: [(name, path, is_dir)].
+
+        Listing is made by `os.scandir` (type of entry is given by the directory itself, no extra `stat`)
+        and cached by mtime of the directory, so unchanged directories are not listed again.
+    """
+    try:
+        mtime = os.stat(root).st_mtime
+    except OSError:
+        return []
+
+    cached = _listings.get(root)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    items = []
+
+    if hasattr(os, 'scandir'):
+        for entry in os.scandir(root):
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            items.append((entry.name, normpath(entry.path), is_dir,))
+    else:
+        for name in os.listdir(root):
+            path = normpath(os.path.join(root, name))
+            if not os.path.exists(path):
+                continue
+            items.append((name, path, os.path.isdir(path),))
+
+    if time.time() - mtime > LISTING_SETTLE_TIME:
+        _listings.set(root, (mtime, items,))
+    else:
+        _listings.discard(root)
+
+    return items
+
 def check_path(root, logger):
     for name in os.listdir(root):
         folder = normpath(os.path.join(root, name))
@@ -775,10 +1042,19 @@ def check_path(root, logger):
             check_path(folder, logger)
 
 def check_aliases(folder, aliases):
-    for alias in aliases:
-        if alias.lower() in folder.lower():
-            return True
-    return False
+    key = (folder, tuple(aliases))
+    is_found = _checked_folders.get(key)
+
+    if is_found is None:
+        name = folder.lower()
+        is_found = False
+        for alias in aliases:
+            if alias.lower() in name:
+                is_found = True
+                break
+        _checked_folders.set(key, is_found)
+
+    return is_found
 
 def walk(logs, checker, root, **kw):
     client = kw.get('client')
@@ -786,25 +1062,19 @@ def walk(logs, checker, root, **kw):
     aliases = kw.get('aliases') or None
     files = kw.get('files')
 
-    obs = os.listdir(root)
-
-    for name in obs:
-        folder = normpath(os.path.join(root, name))
+    for name, folder, is_dir in scan_dir(root):
         #
         # Check Logs limit
         #
         if logs and len(logs) > MAX_LOGS_LEN:
             break
 
-        if not os.path.exists(folder):
-            continue
-
         if name in config.get('suspend'):
             continue
         #
         # Check folder name
         #
-        elif os.path.isdir(folder): # and not os.path.islink(folder):
+        elif is_dir: # and not os.path.islink(folder):
             if not valid_name('dir', name):
                 continue
             if '*' in options:
@@ -821,7 +1091,7 @@ def walk(logs, checker, root, **kw):
         else:
             if not valid_name('file', name):
                 continue
-            filename = normpath(os.path.join(root, name))
+            filename = folder
             if not is_today_file(name, dates=kw.get('dates'), filemask=kw.get('filemask'), 
                                  filename=filename, format=kw.get('fmt')):
                 continue
@@ -851,9 +1121,11 @@ def check_perso_log(logs, filename, encoding=default_encoding, **kw):
 
     set_globals(kw.get('globals'))
 
+    timestamp = fmt and get_timestamp_parser(fmt[1], date_format) or None
+
     def _get_log_item(line):
         values = line.split(split_by)
-        ob = {'filename': filename}
+        ob = LogItem(filename)
 
         try:
             for n, column in enumerate(columns):
@@ -862,8 +1134,7 @@ def check_perso_log(logs, filename, encoding=default_encoding, **kw):
             pass
 
         try:
-            x = datetime.datetime.strptime('%s' % ob['Date'], fmt[1])
-            ob['Date'] = cdate(x, date_format)
+            ob['Date'] = timestamp('%s' % ob['Date'])
         except:
             if IsDebug and IsPrintExceptions:
                 print_exception()
@@ -988,13 +1259,15 @@ def check_infoexchange_log(logs, filename, encoding=default_encoding, **kw):
 
     original_logger = kw.get('original_logger') and True or False
 
+    timestamp = fmt and get_timestamp_parser(fmt[1], date_format) or None
+
     def _get_log_item(line):
         if not line:
             return None
         values = line.split(split_by)
         if len(values) != len(columns):
             return None
-        ob = {'filename': filename}
+        ob = LogItem(filename)
 
         try:
             for n, column in enumerate(columns):
@@ -1004,8 +1277,7 @@ def check_infoexchange_log(logs, filename, encoding=default_encoding, **kw):
                 print_exception()
 
         try:
-            x = datetime.datetime.strptime('%s' % ob['Date'], fmt[1])
-            ob['Date'] = cdate(x, date_format)
+            ob['Date'] = timestamp('%s' % ob['Date'])
         except:
             if IsDebug and IsPrintExceptions:
                 print_exception()
@@ -1140,9 +1412,11 @@ def check_sdc_log(logs, filename, encoding=default_encoding, **kw):
 
     set_globals(kw.get('globals'))
 
+    timestamp = fmt and get_timestamp_parser(fmt[1], date_format) or None
+
     def _get_log_item(line):
         values = line.split(split_by)
-        ob = {'filename': filename}
+        ob = LogItem(filename)
 
         try:
             for n, column in enumerate(columns):
@@ -1151,8 +1425,7 @@ def check_sdc_log(logs, filename, encoding=default_encoding, **kw):
             pass
 
         try:
-            x = datetime.datetime.strptime('%s %s' % (ob['Date'], ob['Time']), fmt[1])
-            ob['Date'] = cdate(x, date_format)
+            ob['Date'] = timestamp('%s %s' % (ob['Date'], ob['Time']))
         except:
             return None
 
@@ -1267,6 +1540,11 @@ def check_exchange_log(logs, filename, encoding=default_encoding, **kw):
     #
     is_jzdo = 'jzdo' in options and 'jzdo' in filename.lower()
 
+    if is_jzdo:
+        timestamp = get_timestamp_parser('%Y-%m-%d %H:%M:%S.%f', date_format)
+    else:
+        timestamp = fmt and get_timestamp_parser(fmt[1], date_format) or None
+
     def _get_log_item(line):
         if split_by in line:
             values = line.split(split_by)
@@ -1293,11 +1571,8 @@ def check_exchange_log(logs, filename, encoding=default_encoding, **kw):
                 'INFO', 
                 ' '.join([x.strip() for x in values[3:]]),
             )
-            datetime_format = '%Y-%m-%d %H:%M:%S.%f'
-        else:
-            datetime_format = fmt[1]
 
-        ob = {'filename': filename}
+        ob = LogItem(filename)
 
         try:
             for n, column in enumerate(columns):
@@ -1306,8 +1581,7 @@ def check_exchange_log(logs, filename, encoding=default_encoding, **kw):
             pass
 
         try:
-            x = datetime.datetime.strptime('%s %s' % (ob['Date'], ob['Time']), datetime_format)
-            ob['Date'] = cdate(x, date_format)
+            ob['Date'] = timestamp('%s %s' % (ob['Date'], ob['Time']))
         except:
             return None
 
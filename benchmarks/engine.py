@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import threading
+import sqlite3
+import time
+
+from app.database import database_config
+from app.metrics import Histogram
+
+# Tables of the stand-in by `database_config` items
+TABLES = { \
+    'orders'              : 'orders',
+    'batches'             : 'batches',
+    'orderstate-aliases'  : 'aliases',
+    'orderlog-dimensions' : 'dimensions',
+}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS orders (
+    FileID       INTEGER PRIMARY KEY,
+    FName        TEXT,
+    FQty         INTEGER,
+    BankName     TEXT,
+    ClientID     INTEGER,
+    FileTypeID   INTEGER,
+    FileType     TEXT,
+    FileStatusID INTEGER,
+    FileStatus   TEXT,
+    StatusDate   TIMESTAMP,
+    RegisterDate TIMESTAMP,
+    ReadyDate    TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS batches (
+    TID          INTEGER PRIMARY KEY,
+    TZ           INTEGER,
+    FileID       INTEGER,
+    BatchType    TEXT,
+    BatchTypeID  INTEGER,
+    BatchNo      INTEGER,
+    ElementQty   INTEGER,
+    Status       TEXT,
+    StatusDate   TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS batches_fileid ON batches (FileID);
+CREATE TABLE IF NOT EXISTS aliases (
+    TID          INTEGER PRIMARY KEY,
+    Name         TEXT,
+    Title        TEXT,
+    Aliases      TEXT
+);
+CREATE TABLE IF NOT EXISTS sources (
+    SourceID     INTEGER PRIMARY KEY AUTOINCREMENT,
+    Root         TEXT,
+    IP           TEXT,
+    SystemType   TEXT,
+    UNIQUE (Root, IP, SystemType)
+);
+CREATE TABLE IF NOT EXISTS modules (
+    ModuleID     INTEGER PRIMARY KEY AUTOINCREMENT,
+    SourceID     INTEGER,
+    Module       TEXT,
+    ModulePath   TEXT,
+    UNIQUE (SourceID, Module, ModulePath)
+);
+CREATE TABLE IF NOT EXISTS logs (
+    LogID        INTEGER PRIMARY KEY AUTOINCREMENT,
+    ModuleID     INTEGER,
+    LogFile      TEXT,
+    UNIQUE (ModuleID, LogFile)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    TID          INTEGER PRIMARY KEY AUTOINCREMENT,
+    SourceID     INTEGER,
+    ModuleID     INTEGER,
+    LogID        INTEGER,
+    FileID       INTEGER,
+    FileName     TEXT,
+    BatchID      INTEGER,
+    Client       TEXT,
+    Code         TEXT,
+    Count        INTEGER,
+    Message      TEXT,
+    EventDate    TEXT,
+    RD           TEXT,
+    UNIQUE (LogID, EventDate, Code, Count, Message)
+);
+CREATE VIEW IF NOT EXISTS dimensions AS
+    SELECT m.SourceID, m.ModuleID, l.LogID, m.Module, m.ModulePath, l.LogFile
+    FROM modules m LEFT JOIN logs l ON l.ModuleID = m.ModuleID;
+'''
+
+_ORDER_COLUMNS = ('FileID', 'FName', 'FQty', 'BankName', 'ClientID', 'FileTypeID', 'FileType', 'FileStatusID', 'FileStatus',
+                  'StatusDate', 'RegisterDate', 'ReadyDate',)
+_BATCH_COLUMNS = ('TID', 'TZ', 'FileID', 'BatchType', 'BatchTypeID', 'BatchNo', 'ElementQty', 'Status', 'StatusDate',)
+_ALIAS_COLUMNS = ('TID', 'Name', 'Title', 'Aliases',)
+
+
+def _value(x):
+    if isinstance(x, datetime.datetime):
+        return x.strftime('%Y-%m-%d %H:%M:%S')
+    return x
+
+
+class Database:
+    """
+        In-process SQLite database of the stand-in: `BankDB` Orders/Batches, `OrderState` Aliases and
+        `OrderLog` dimensions (Sources, Modules, Logs) with registered messages. Shared by all the engines.
+
+        Arguments:
+            path        -- string: SQLite database file (`:memory:` by default)
+            delay       -- float: emulated round-trip of every request to the server (sec)
+
+        Attributes:
+            calls       -- dict: number of requests by `database_config` item
+            latency     -- Histogram: duration of `REGISTER_LogMessage_sp` calls (item by item or batch)
+    """
+
+    def __init__(self, path=None, delay=0):
+        self.path = path or ':memory:'
+        self.delay = delay or 0
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+
+        self.calls = {}
+        self.registered = 0
+        self.existing = 0
+        self.latency = Histogram('register')
+
+    def seed(self, dataset):
+        """
+            Loads `generator.make_dataset` rows (Orders, Batches, Aliases)
+        """
+        with self._lock:
+            for table, columns, rows in ( \
+                    ('orders', _ORDER_COLUMNS, dataset.get('orders')),
+                    ('batches', _BATCH_COLUMNS, dataset.get('batches')),
+                    ('aliases', _ALIAS_COLUMNS, dataset.get('aliases')),
+                ):
+                self._conn.executemany('INSERT OR REPLACE INTO %s (%s) VALUES (%s)' % (
+                    table, ','.join(columns), ','.join(['?'] * len(columns))),
+                    [tuple([_value(row.get(x)) for x in columns]) for row in rows or []])
+            self._conn.commit()
+
+    def update_orders(self, where, **values):
+        """
+            Changes Orders (status of orders as the production does), for example: `FileStatusID=999`
+        """
+        names = sorted(values.keys())
+        with self._lock:
+            self._conn.execute('UPDATE orders SET %s WHERE %s' % (','.join(['%s=?' % x for x in names]), where),
+                               tuple([_value(values[x]) for x in names]))
+            self._conn.commit()
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _roundtrip(self):
+        if self.delay:
+            time.sleep(self.delay)
+
+    def select(self, name, sql):
+        self._count(name)
+        self._roundtrip()
+        with self._lock:
+            return self._conn.execute(sql).fetchall()
+
+    def _identity(self, select, insert, args):
+        row = self._conn.execute(select, args).fetchone()
+        if row is None:
+            row = (self._conn.execute(insert, args).lastrowid,)
+        return row
+
+    def check_source(self, root, ip, ctype):
+        return self._identity('SELECT SourceID FROM sources WHERE Root=? and IP=? and SystemType=?',
+                              'INSERT INTO sources (Root, IP, SystemType) VALUES (?, ?, ?)', (root, ip, ctype,))
+
+    def check_module(self, source_id, cname, cpath):
+        return self._identity('SELECT ModuleID FROM modules WHERE SourceID=? and Module=? and ModulePath=?',
+                              'INSERT INTO modules (SourceID, Module, ModulePath) VALUES (?, ?, ?)', (source_id, cname, cpath,))
+
+    def check_log(self, module_id, cname):
+        return self._identity('SELECT LogID FROM logs WHERE ModuleID=? and LogFile=?',
+                              'INSERT INTO logs (ModuleID, LogFile) VALUES (?, ?)', (module_id, cname,))
+
+    def register(self, args):
+        """
+            `REGISTER_LogMessage_sp`: returns (MessageID, Status), status `ID:<n>` for a new message
+        """
+        source_id, module_id, log_id, source_info, module_info, log_info, file_id, batch_id, client, filename, \
+            code, count, message, event_date, rd = args
+
+        # Dimensions are resolved by info-strings if IDs were not given
+        if not source_id:
+            source_id = self.check_source(*(source_info.split('::') + ['', '', ''])[:3])[0]
+        if not module_id:
+            module_id = self.check_module(source_id, *(module_info.split('::') + ['', ''])[:2])[0]
+        if not log_id:
+            log_id = self.check_log(module_id, log_info)[0]
+
+        row = self._conn.execute('SELECT TID FROM messages WHERE LogID=? and EventDate=? and Code=? and Count=? and Message=?',
+                                 (log_id, event_date, code, count, message,)).fetchone()
+        if row is not None:
+            self.existing += 1
+            return (row[0], 'EX:%s' % row[0],)
+
+        id = self._conn.execute('INSERT INTO messages (SourceID, ModuleID, LogID, FileID, FileName, BatchID, Client, Code, '
+                                'Count, Message, EventDate, RD) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                (source_id, module_id, log_id, file_id, filename, batch_id, client, code, count, message,
+                                 event_date, rd,)).lastrowid
+        self.registered += 1
+        return (id, 'ID:%s' % id,)
+
+    def execute(self, name, func, items):
+        """
+            Runs the procedure for every item in one transaction, returns the first rows of responses
+        """
+        started = time.time()
+
+        self._count(name)
+        self._roundtrip()
+
+        with self._lock:
+            try:
+                rows = [func(*x) for x in items]
+                self._conn.commit()
+            except:
+                self._conn.rollback()
+                raise
+
+        if name == 'orderlog-register-log-message':
+            self.latency.observe(time.time() - started)
+
+        return rows
+
+    def count(self, table):
+        with self._lock:
+            return self._conn.execute('SELECT count(*) FROM %s' % table).fetchone()[0]
+
+    def stats(self):
+        return { \
+            'calls'      : dict(self.calls),
+            'registered' : self.registered,
+            'existing'   : self.existing,
+            'messages'   : self.count('messages'),
+            'latency'    : self.latency.snapshot(),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BenchEngine:
+    """
+        Stand-in of `BankPersoEngine` backed by the shared SQLite `Database`.
+
+        Implements `runQuery` of `orders`, `batches`, `orderstate-aliases`, `orderlog-dimensions` views and `runProcedure`/`runProcedureBatch` of `orderlog-check-*` and `orderlog-register-log-message`.
+        Values are stored decoded, so `encode_columns` are not recoded.
+    """
+
+    database = None
+
+    def __init__(self, name=None, user=None, connection=None, pooled=None):
+        self.name = name or 'default'
+        self.connection = connection
+        self.engine = None
+        self.conn = None
+        self.engine_error = False
+        self.user = user
+        self.pooled = False
+
+        self.create_engine()
+
+    def create_engine(self):
+        self.engine = self.database
+
+    def open(self):
+        self.conn = self.engine
+
+    def close(self):
+        self.conn = None
+
+    def dispose(self):
+        pass
+
+    def getReferenceID(self, name, key, value, tid='TID'):
+        if isinstance(value, str):
+            where = "%s='%s'" % (key, value)
+        else:
+            where = '%s=%s' % (key, value)
+        cursor = self.runQuery(name, top=1, columns=(tid,), where=where, distinct=True)
+        return cursor and cursor[0][0] or None
+
+    def runQuery(self, name, top=None, columns=None, where=None, order=None, distinct=False, as_dict=False, **kw):
+        if self.engine_error:
+            return []
+
+        query_columns = columns or database_config[name].get('columns')
+
+        sql = 'SELECT %(distinct)s %(columns)s FROM %(table)s %(where)s %(order)s %(top)s' % { \
+            'distinct' : distinct and 'DISTINCT' or '',
+            'columns'  : ','.join(query_columns),
+            'table'    : TABLES[name],
+            'where'    : where and 'WHERE %s' % where or '',
+            'order'    : order and 'ORDER BY %s' % order or '',
+            'top'      : top and 'LIMIT %s' % top or '',
+        }
+
+        try:
+            cursor = self.database.select(name, sql)
+        except sqlite3.Error:
+            self.engine_error = True
+            return []
+
+        if as_dict:
+            return [dict(zip(query_columns, row)) for row in cursor]
+        return [list(row) for row in cursor]
+
+    def _procedure(self, name):
+        db = self.database
+        return { \
+            'orderlog-check-source'         : lambda root, ip, ctype: db.check_source(root, ip, ctype),
+            'orderlog-check-module'         : lambda source_id, cname, cpath: db.check_module(source_id, cname, cpath),
+            'orderlog-check-log'            : lambda source_id, module_id, cname: db.check_log(module_id, cname),
+            'orderlog-register-log-message' : lambda *args: db.register(args),
+        }[name]
+
+    def _args(self, name, kw):
+        if name == 'orderlog-check-source':
+            return (kw.get('root'), kw.get('ip'), kw.get('ctype'),)
+        if name == 'orderlog-check-module':
+            return (kw.get('source_id'), kw.get('cname'), kw.get('cpath'),)
+        if name == 'orderlog-check-log':
+            return (kw.get('source_id'), kw.get('module_id'), kw.get('cname'),)
+        return tuple(kw.get('args') or ())
+
+    def runProcedure(self, name, args=None, no_cursor=False, **kw):
+        if self.engine_error:
+            return
+
+        try:
+            rows = self.database.execute(name, self._procedure(name), [args or self._args(name, kw)])
+        except sqlite3.Error:
+            self.engine_error = True
+            return None
+
+        return not no_cursor and rows or []
+
+    def runProcedureBatch(self, name, items):
+        if self.engine_error or not items:
+            return None
+
+        try:
+            return self.database.execute(name, self._procedure(name), items)
+        except sqlite3.Error:
+            return None
+
+
+_installed = {}
+
+def install(database, dataset=None):
+    """
+        Replaces `BankPersoEngine` of the sources by the stand-in on the given database
+    """
+    from app import sources
+
+    if dataset is not None:
+        database.seed(dataset)
+
+    BenchEngine.database = database
+
+    if 'engine' not in _installed:
+        _installed['engine'] = sources.BankPersoEngine
+
+    sources.BankPersoEngine = BenchEngine
+    sources.engines.clear()
+
+    return database
+
+def uninstall():
+    from app import sources
+
+    if 'engine' in _installed:
+        sources.BankPersoEngine = _installed.pop('engine')
+    sources.engines.clear()
+
+    BenchEngine.database = None
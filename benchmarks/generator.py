@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+
+import os
+import datetime
+import random
+import json
+
+# Defaults of the generated tree
+DEFAULT_LINES = 20000
+DEFAULT_FILES = 20
+DEFAULT_ORDERS = 300
+DEFAULT_BATCHES = 3
+DEFAULT_DENSITY = 0.3
+DEFAULT_MALFORMED = 0.01
+DEFAULT_ENCODINGS = ('cp1251', 'utf-8', 'mixed',)
+DEFAULT_SEED = 2020
+
+# Share of lines in the other encoding in `mixed` files
+MIXED_SHARE = 0.05
+
+SOURCES = ('bankperso', 'sdc', 'exchange',)
+
+# Clients: (Name, Title, Aliases), the last one is JZDO client of Exchange (OCG/PPCARD orders)
+CLIENTS = ( \
+    ('VTB24',      'Банк ВТБ24',          'VTB24:VTB'),
+    ('PostBank',   'Почта Банк',          'PostBank:POChTABANK:VBEX'),
+    ('CITI_BANK',  'Ситибанк',            'CITI_BANK:CITI'),
+    ('HomeCredit', 'Хоум Кредит',         'HomeCredit:HCFB'),
+    ('JZDO',       'Железные дороги',     'JZDO:PPCARD:OCG'),
+)
+
+FILE_TYPES = ('CARDS', 'PIN', 'REISSUE', 'EMBOSS',)
+BATCH_TYPES = ('Персонализация', 'ПИН-конверты', 'Упаковка',)
+
+# Status IDs: in progress and complete (`COMPLETE_STATUSES`)
+ACTIVE_STATUSES = (1, 5, 11, 27, 51, 62,)
+COMPLETE_STATUS = 999
+
+BANKPERSO_MODULES = ('Log_Load_SyncroRes', 'Log_BatchResult', 'Log_ReportRunnerV02', 'Log_OrderGenerate',)
+SDC_MODULES = ('SERVER1', 'SERVER2', 'SDC3',)
+EXCHANGE_MODULES = ('Postbank', 'VTB24', 'Citi', 'JZDO',)
+
+CODES = ('INFO',) * 16 + ('WARNING',) * 3 + ('ERROR',)
+
+KEYED_MESSAGES = ( \
+    'Файл %(FName)s загружен, FileID:%(FileID)s, записей: %(n)d',
+    'ТЗ %(TZ)s партия %(TID)s: обработано карт %(n)d',
+    'Формирование отчета по заказу %(FileID)s завершено успешно, строк %(n)d',
+    'Заказ %(FName)s передан на персонализацию, партий: %(n)d',
+)
+PLAIN_MESSAGES = ( \
+    'Проверка входного каталога, новых файлов не найдено (%(n)d)',
+    'Сервис синхронизации активен, очередь заданий: %(n)d',
+    'Connection to the server restored after %(n)d attempts',
+    'Обновление справочников выполнено, изменено записей: %(n)d',
+)
+JZDO_MESSAGES = ( \
+    '%(FName)s %(n)d bytes transferred',
+    'sftp session %(n)d closed by the remote host',
+)
+
+MALFORMED = ('short', 'timestamp', 'columns', 'bytes', 'marker',)
+
+
+def make_dataset(orders=DEFAULT_ORDERS, batches=DEFAULT_BATCHES, date=None, seed=DEFAULT_SEED):
+    """
+        Makes Orders, Batches and Client Aliases of the benchmark (rows of `BankDB`/`OrderState` views).
+
+        Keyword arguments:
+            orders      -- int: number of Orders
+            batches     -- int: number of Batches (TID/TZ) of every Order
+            date        -- date: day of the Orders (today by default)
+            seed        -- int: random seed
+
+        Returns:
+            dataset     -- dict: {'date', 'orders', 'batches', 'aliases'}, rows are dicts with view columns
+    """
+    rng = random.Random(seed)
+
+    date = date or datetime.date.today()
+    day = datetime.datetime(date.year, date.month, date.day)
+
+    items = []
+    rows = []
+
+    for i in range(orders):
+        client_id = i % len(CLIENTS)
+        client = CLIENTS[client_id][0]
+        file_id = 100000 + i
+
+        if client == 'JZDO':
+            name = '%s_%s_%04d.xml' % (rng.choice(('PPCARD', 'OCG',)), date.strftime('%Y%m%d'), i)
+        else:
+            name = '%s_%s_%s_%04d.TXT' % (client, rng.choice(FILE_TYPES), date.strftime('%Y%m%d'), i)
+
+        # Every 10-th Order is complete (finalized), the others are in progress
+        is_complete = i % 10 == 9
+
+        items.append({ \
+            'FileID'       : file_id,
+            'FName'        : name,
+            'FQty'         : rng.randint(10, 5000),
+            'BankName'     : client,
+            'ClientID'     : client_id + 1,
+            'FileTypeID'   : rng.randint(1, len(FILE_TYPES)),
+            'FileType'     : rng.choice(FILE_TYPES),
+            'FileStatusID' : is_complete and COMPLETE_STATUS or rng.choice(ACTIVE_STATUSES),
+            'FileStatus'   : is_complete and 'Отгружен' or 'В работе',
+            'StatusDate'   : day + datetime.timedelta(minutes=rng.randint(0, 600)),
+            'RegisterDate' : day - datetime.timedelta(days=rng.randint(0, 3), minutes=rng.randint(0, 600)),
+            'ReadyDate'    : day + datetime.timedelta(days=rng.randint(1, 5)),
+        })
+
+        for j in range(batches):
+            rows.append({ \
+                'TID'          : 500000 + i * batches + j,
+                'TZ'           : 9000 + i * batches + j,
+                'FileID'       : file_id,
+                'BatchType'    : BATCH_TYPES[j % len(BATCH_TYPES)],
+                'BatchTypeID'  : j % len(BATCH_TYPES) + 1,
+                'BatchNo'      : j + 1,
+                'ElementQty'   : rng.randint(1, 500),
+                'Status'       : 'Готово',
+                'StatusDate'   : day + datetime.timedelta(minutes=rng.randint(0, 600)),
+            })
+
+    aliases = [{'TID': n + 1, 'Name': name, 'Title': title, 'Aliases': value}
+               for n, (name, title, value) in enumerate(CLIENTS)]
+
+    return {'date': date, 'orders': items, 'batches': rows, 'aliases': aliases}
+
+
+def _suffix(n, items):
+    return n >= len(items) and '-%d' % (n // len(items)) or ''
+
+
+def save_dataset(dataset, filename):
+    def _default(x):
+        if isinstance(x, (datetime.datetime, datetime.date,)):
+            return str(x)
+        raise TypeError(repr(x))
+
+    with open(filename, 'w', encoding='utf-8') as fo:
+        json.dump(dataset, fo, default=_default, ensure_ascii=False, indent=1)
+
+
+class LogGenerator:
+    """
+        Generator of Log-files trees of the sources with realistic Log-lines.
+
+        Trees (under `root`, as `config.root` of the source):
+            bankperso   -- Bin/Log_<module>/YYYYMMDD_<module>.log
+            sdc         -- LOG/<server>/sdc_<client>_dd.mm.yyyy.txt
+            exchange    -- #logs/<module>/<module>_dd.mm.yyyy.txt, JZDO: #logs/JZDO/jzdo_dd.mm.yyyy.txt
+
+        Arguments:
+            root        -- string: root folder of the tree
+            dataset     -- dict: `make_dataset` Orders (keys of Log-lines)
+
+        Keyword arguments:
+            date        -- date: day of Log-files (dataset date by default)
+            encodings   -- tuple: encodings of files (cycled): cp1251, utf-8 or `mixed` (cp1251 with utf-8 lines)
+            density     -- float: share of Log-lines with keys of Orders (FileID, FName, TZ/TID)
+            malformed   -- float: share of malformed Log-lines (broken timestamps/columns/bytes, markers)
+            seed        -- int: random seed
+
+        Attributes:
+            stats       -- dict: numbers of generated `lines`, `keyed`, `malformed` lines and `size` (bytes)
+    """
+
+    def __init__(self, root, dataset, date=None, encodings=None, density=None, malformed=None, seed=None):
+        self.root = root
+        self.date = date or dataset.get('date') or datetime.date.today()
+        self.encodings = encodings or DEFAULT_ENCODINGS
+        self.density = DEFAULT_DENSITY if density is None else density
+        self.malformed = DEFAULT_MALFORMED if malformed is None else malformed
+
+        self._rng = random.Random(DEFAULT_SEED if seed is None else seed)
+        self._orders = [x for x in dataset['orders'] if x['BankName'] != 'JZDO']
+        self._jzdo = [x for x in dataset['orders'] if x['BankName'] == 'JZDO']
+        self._batches = {}
+        for row in dataset['batches']:
+            self._batches.setdefault(row['FileID'], []).append(row)
+
+        self._files = {}
+        self._seconds = 0.0
+
+        self.stats = {'files': 0, 'lines': 0, 'keyed': 0, 'malformed': 0, 'size': 0}
+
+    @property
+    def files(self):
+        return sorted(self._files.keys())
+
+    def _timestamp(self, step):
+        self._seconds = (self._seconds + self._rng.random() * step) % 86399
+        return datetime.datetime(self.date.year, self.date.month, self.date.day) + \
+            datetime.timedelta(seconds=self._seconds)
+
+    def _message(self, jzdo=False):
+        rng = self._rng
+        orders = jzdo and self._jzdo or self._orders
+
+        if orders and rng.random() < self.density:
+            order = rng.choice(orders)
+            batch = rng.choice(self._batches.get(order['FileID']) or [{}])
+            values = { \
+                'FileID' : order['FileID'],
+                'FName'  : order['FName'],
+                'TZ'     : batch.get('TZ', ''),
+                'TID'    : batch.get('TID', ''),
+                'n'      : rng.randint(1, 9999),
+            }
+            self.stats['keyed'] += 1
+            return (jzdo and JZDO_MESSAGES[0] or rng.choice(KEYED_MESSAGES)) % values
+
+        values = {'n': rng.randint(1, 9999)}
+        return (jzdo and JZDO_MESSAGES[1] or rng.choice(PLAIN_MESSAGES)) % values
+
+    def _format(self, kind, module, ts, code, message):
+        if kind == 'bankperso':
+            return '%s\t[%s]\t%s' % (ts.strftime('%Y-%m-%d %H:%M:%S'), code, message)
+        if kind == 'sdc':
+            return '%s\t%s,%03d\t[%s]\t%s' % (ts.strftime('%d.%m.%Y'), ts.strftime('%H:%M:%S'), ts.microsecond // 1000,
+                                              code, message)
+        if kind == 'jzdo':
+            return '%s %s %s.%06d %s' % (self._rng.choice('.<>'), ts.strftime('%Y-%m-%d'), ts.strftime('%H:%M:%S'),
+                                         ts.microsecond, message)
+        return '%s\t%s,%03d\t%s[%d]\t[%s]\t%s' % (ts.strftime('%d.%m.%Y'), ts.strftime('%H:%M:%S'), ts.microsecond // 1000,
+                                                  module, self._rng.randint(1, 3), code, message)
+
+    def _malformed(self, kind, line):
+        """
+            Returns broken line of the given kind (str or bytes)
+        """
+        rng = self._rng
+        x = rng.choice(MALFORMED)
+
+        self.stats['malformed'] += 1
+
+        if x == 'short':
+            return line[:rng.randint(5, 30)]
+        if x == 'timestamp':
+            return '99.99.99 25:61\t%s' % line.split('\t', 1)[-1]
+        if x == 'columns':
+            return line.replace('\t', ' ')
+        if x == 'marker':
+            return '--> %s' % line
+        return line.encode('utf-8')[:40] + b'\x98\xff\xfe' + line.encode('utf-8')[40:]
+
+    def _encode(self, line, encoding):
+        if isinstance(line, bytes):
+            return line
+        if encoding == 'mixed':
+            encoding = self._rng.random() < MIXED_SHARE and 'utf-8' or 'cp1251'
+        return line.encode(encoding, 'replace')
+
+    def make_lines(self, filename, count, now=False):
+        """
+            Makes `count` encoded Log-lines (bytes with EOL) of the file registered by `add_file`
+        """
+        kind, module, encoding = self._files[filename]
+
+        step = 86400.0 / max(count, 1)
+        lines = []
+
+        for n in range(count):
+            ts = now and datetime.datetime.now() or self._timestamp(step)
+            line = self._format(kind, module, ts, self._rng.choice(CODES), self._message(jzdo=kind == 'jzdo'))
+
+            if self.malformed and self._rng.random() < self.malformed:
+                line = self._malformed(kind, line)
+
+            lines.append(self._encode(line, encoding) + b'\r\n')
+
+        self.stats['lines'] += count
+
+        return lines
+
+    def add_file(self, kind, folder, name, module):
+        filename = os.path.join(self.root, folder, name).replace('\\', '/')
+        encoding = self.encodings[len(self._files) % len(self.encodings)]
+
+        if kind == 'jzdo' and encoding == 'mixed':
+            encoding = 'cp1251'
+
+        self._files[filename] = (kind, module, encoding,)
+
+        return filename
+
+    def write(self, filename, lines, mode='wb'):
+        folder = os.path.dirname(filename)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        data = b''.join(lines)
+
+        with open(filename, mode) as fo:
+            fo.write(data)
+
+        self.stats['size'] += len(data)
+
+        return len(data)
+
+    def append(self, filename, count):
+        """
+            Appends Log-lines of the current time to the file (as an application does). Returns size of data.
+        """
+        return self.write(filename, self.make_lines(filename, count, now=True), mode='ab')
+
+    def bankperso(self, lines, files):
+        date = self.date.strftime('%Y%m%d')
+        for n in range(files):
+            module = BANKPERSO_MODULES[n % len(BANKPERSO_MODULES)]
+            folder = 'Bin/%s%s' % (module, _suffix(n, BANKPERSO_MODULES))
+            self.add_file('bankperso', folder, '%s_%s.log' % (date, module[4:]), module)
+        return self._write_all(lines)
+
+    def sdc(self, lines, files):
+        date = self.date.strftime('%d.%m.%Y')
+        for n in range(files):
+            server = SDC_MODULES[n % len(SDC_MODULES)]
+            client = CLIENTS[n % (len(CLIENTS) - 1)][0]
+            self.add_file('sdc', 'LOG/%s' % server, 'sdc_%s%s_%s.txt' % (client, _suffix(n, SDC_MODULES), date), server)
+        return self._write_all(lines)
+
+    def exchange(self, lines, files, jzdo=True):
+        date = self.date.strftime('%d.%m.%Y')
+        for n in range(files):
+            if jzdo and n % len(EXCHANGE_MODULES) == len(EXCHANGE_MODULES) - 1:
+                self.add_file('jzdo', '#logs/JZDO', 'jzdo%s_%s.txt' % (_suffix(n, EXCHANGE_MODULES), date), 'JZDO')
+                continue
+            module = EXCHANGE_MODULES[n % (len(EXCHANGE_MODULES) - 1)]
+            self.add_file('exchange', '#logs/%s' % module, '%s%s_%s.txt' % (module, _suffix(n, EXCHANGE_MODULES), date),
+                          module)
+        return self._write_all(lines)
+
+    def make(self, source, lines=DEFAULT_LINES, files=DEFAULT_FILES):
+        """
+            Generates the tree of the given source, `lines` are spread over `files`. Returns list of files.
+        """
+        if source not in SOURCES:
+            raise ValueError('Unknown source: %s' % source)
+        return getattr(self, source)(lines, files)
+
+    def _write_all(self, lines):
+        filenames = self.files
+        for n, filename in enumerate(filenames):
+            count = lines // len(filenames) + (n < lines % len(filenames) and 1 or 0)
+            self.write(filename, self.make_lines(filename, count))
+        self.stats['files'] = len(filenames)
+        return filenames
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generates Log-files tree of the source and its dataset (dataset.json)')
+    parser.add_argument('root', help='root folder of the tree (`root` of the source config)')
+    parser.add_argument('--source', choices=SOURCES, default='bankperso')
+    parser.add_argument('--lines', type=int, default=DEFAULT_LINES, help='number of Log-lines')
+    parser.add_argument('--files', type=int, default=DEFAULT_FILES, help='number of Log-files')
+    parser.add_argument('--orders', type=int, default=DEFAULT_ORDERS, help='number of Orders')
+    parser.add_argument('--density', type=float, default=DEFAULT_DENSITY, help='share of Log-lines with Orders keys')
+    parser.add_argument('--malformed', type=float, default=DEFAULT_MALFORMED, help='share of malformed Log-lines')
+    parser.add_argument('--encodings', default=':'.join(DEFAULT_ENCODINGS), help='encodings of files: cp1251:utf-8:mixed')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+
+    args = parser.parse_args()
+
+    dataset = make_dataset(orders=args.orders, seed=args.seed)
+
+    generator = LogGenerator(args.root, dataset,
+                             encodings=tuple(filter(None, args.encodings.split(':'))),
+                             density=args.density,
+                             malformed=args.malformed,
+                             seed=args.seed,
+                             )
+    generator.make(args.source, lines=args.lines, files=args.files)
+
+    save_dataset(dataset, os.path.join(args.root, 'dataset.json'))
+
+    print('--> %s: %s' % (args.root, generator.stats))
@@ -0,0 +1,541 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import time
+import json
+import shutil
+import tempfile
+import threading
+import platform
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from watchdog.events import FileModifiedEvent
+
+from config import SDC_ROOT, EXCHANGE_ROOT, default_unicode, setErrorlog
+
+try:
+    from app.metrics import Histogram
+except ImportError:
+    Histogram = None
+
+from app.worker import Logger
+from app.utils import getDate, getToday
+from app.sources import LogProducer, LogConsumer
+from app.sources.bankperso import Source as Bankperso
+from app.sources.sdc import Source as SDC
+from app.sources.exchange import Source as Exchange
+
+from .generator import DEFAULT_LINES, DEFAULT_FILES, DEFAULT_ORDERS, DEFAULT_DENSITY, DEFAULT_MALFORMED, DEFAULT_ENCODINGS, \
+     DEFAULT_SEED, SOURCES, LogGenerator, make_dataset
+from .engine import Database, install, uninstall
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Observer path: number of events, Log-lines appended by every event, max time to drain the events (sec)
+DEFAULT_EVENTS = 200
+DEFAULT_EVENT_LINES = 10
+DRAIN_TIMEOUT = 300
+
+# Latency buckets (sec): per Log-line and per event
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,)
+
+# Config of the benchmarked source (as `logger.<ctype>.config`), trace is off
+BENCH_CONFIG = { \
+    'ip'               : '127.0.0.1',
+    'client'           : '*',
+    'alias'            : 'bench',
+    'encoding'         : 'utf-8',
+    'sleep'            : 1,
+    'debug'            : 0,
+    'deepdebug'        : 0,
+    'trace'            : 0,
+    'logtrace'         : 0,
+    'existstrace'      : 0,
+    'observertrace'    : 0,
+    'disableoutput'    : 1,
+    'printexceptions'  : 1,
+    'suppressed'       : [],
+    'check_filename'   : 0,
+    'check_datefrom'   : 0,
+    'delta_datefrom'   : [-3, -7],
+    'forced_refresh'   : 0,
+    'decoder_trace'    : 0,
+    'stack_events'     : 0,
+    'emitter'          : 1,
+    'limit'            : 0,
+    'case_insensitive' : 0,
+    'watch_everything' : 0,
+    'register_batch'   : 100,
+    'register_age'     : 5,
+    'dimensions_cache' : 1000,
+    'read_block'       : 4096,
+    'read_mode'        : 'block',
+    'decoder_sample'   : 64,
+    'catchup_workers'  : 0,
+    'catchup_inflight' : 8,
+    'mail_async'       : 0,
+    'orders_reconcile' : 300,
+    'aliases_ttl'      : 3600,
+}
+
+SOURCE_CONFIG = { \
+    'bankperso' : {'ctype': 'bankperso'},
+    'sdc'       : {'ctype': 'sdc', 'filemask': SDC_ROOT['default'][2], 'options': ''},
+    'exchange'  : {'ctype': 'exchange', 'filemask': EXCHANGE_ROOT['default'][2], 'options': 'jzdo:unique:count'},
+}
+
+SOURCE_CLASSES = { \
+    'bankperso' : Bankperso,
+    'sdc'       : SDC,
+    'exchange'  : Exchange,
+}
+
+# Metrics to compare with the baseline: (section, key, more is better)
+COMPARED = ( \
+    ('emitter', 'lines_per_sec', True),
+    ('emitter', 'registrations_per_sec', True),
+    ('emitter', 'p50', False),
+    ('emitter', 'p99', False),
+    ('emitter', 'peak_rss', False),
+    ('observer', 'lines_per_sec', True),
+    ('observer', 'registrations_per_sec', True),
+    ('observer', 'p50', False),
+    ('observer', 'p99', False),
+    ('observer', 'peak_rss', False),
+)
+
+
+def peak_rss():
+    """
+        Returns peak RSS of the process (bytes), None if unknown
+    """
+    if resource is not None:
+        x = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return sys.platform == 'darwin' and x or x * 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', None) or info.rss
+    return None
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=basedir,
+                                       stderr=subprocess.STDOUT).decode().strip()
+    except Exception:
+        return None
+
+def _rate(value, duration):
+    return duration and round(value / duration, 1) or 0.0
+
+
+class LatencyHistogram:
+    """
+        Latency histogram of the runner for the trees without `app.metrics` (the same interface as `Histogram`)
+    """
+
+    def __init__(self, name, buckets):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        self.values = []
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        return len(self.values)
+
+    def observe(self, value):
+        with self._lock:
+            self.values.append(value)
+
+    def quantile(self, q):
+        if not self.values:
+            return 0.0
+        values = sorted(self.values)
+        value = values[min(int(q * len(values)), len(values) - 1)]
+        for bound in self.buckets:
+            if value <= bound:
+                return bound
+        return values[-1]
+
+    def snapshot(self):
+        values = list(self.values)
+        cumulative = [(bound, len([x for x in values if x <= bound]),) for bound in self.buckets]
+        cumulative.append(('+Inf', len(values),))
+        return { \
+            'name'    : self.name,
+            'count'   : len(values),
+            'sum'     : sum(values),
+            'max'     : values and max(values) or 0.0,
+            'buckets' : cumulative,
+        }
+
+def make_histogram(name):
+    return (Histogram or LatencyHistogram)(name, LATENCY_BUCKETS)
+
+
+class Benchmark:
+    """
+        End-to-end throughput benchmark of the source: generated Log-files tree, SQLite stand-in of the databases
+        and the real `Source` driven by `emitter` (catch-up of the tree) and by the observer path
+        (`LogProducer`/`LogConsumer` with file events of appended Log-lines).
+
+        Arguments:
+            source      -- string: bankperso|sdc|exchange
+            workdir     -- string: folder of the tree, errorlog and SQLite database
+
+        Keyword arguments:
+            lines, files, orders, density, malformed, encodings, seed -- parameters of `generator`
+            events      -- int: number of observer events (0 - no observer path)
+            event_lines -- int: number of Log-lines appended by every event
+            delay       -- float: emulated DB round-trip (sec)
+            config      -- dict: overridden config items (`register_batch`, `catchup_workers`, `read_mode`...)
+    """
+
+    def __init__(self, source, workdir, **kw):
+        self.source = source
+        self.workdir = workdir
+
+        self.params = { \
+            'source'      : source,
+            'lines'       : kw.get('lines') or DEFAULT_LINES,
+            'files'       : kw.get('files') or DEFAULT_FILES,
+            'orders'      : kw.get('orders') or DEFAULT_ORDERS,
+            'density'     : kw.get('density', DEFAULT_DENSITY),
+            'malformed'   : kw.get('malformed', DEFAULT_MALFORMED),
+            'encodings'   : list(kw.get('encodings') or DEFAULT_ENCODINGS),
+            'seed'        : kw.get('seed') or DEFAULT_SEED,
+            'events'      : kw.get('events', DEFAULT_EVENTS),
+            'event_lines' : kw.get('event_lines') or DEFAULT_EVENT_LINES,
+            'delay'       : kw.get('delay') or 0,
+            'config'      : kw.get('config') or {},
+        }
+
+        self.root = os.path.join(workdir, source).replace('\\', '/')
+        self.logger = Logger(False, encoding=default_unicode)
+
+        self.database = None
+        self.generator = None
+        self.app = None
+
+    def _make_config(self):
+        config = dict(BENCH_CONFIG)
+        config.update(SOURCE_CONFIG[self.source])
+        config.update({ \
+            'root'     : self.root,
+            'seen'     : os.path.join(self.workdir, 'seen.%s' % self.source),
+            'errorlog' : os.path.join(self.workdir, 'traceback-%s.log' % self.source),
+            'now'      : getDate(getToday(), format='%Y%m%d'),
+        })
+        config.update(self.params['config'])
+        return config
+
+    def setup(self):
+        """
+            Generates the tree, seeds the database and starts the source (as `logger.run` does)
+        """
+        params = self.params
+
+        dataset = make_dataset(orders=params['orders'], seed=params['seed'])
+
+        self.generator = LogGenerator(self.root, dataset,
+                                      encodings=params['encodings'],
+                                      density=params['density'],
+                                      malformed=params['malformed'],
+                                      seed=params['seed'],
+                                      )
+        self.generator.make(self.source, lines=params['lines'], files=params['files'])
+
+        self.database = install(Database(os.path.join(self.workdir, 'bench.db'), delay=params['delay']), dataset)
+
+        config = self._make_config()
+
+        setErrorlog(config['errorlog'])
+
+        self.app = SOURCE_CLASSES[self.source](config, self.logger)
+        self.app._init_state(date_from=getDate(dataset['date'], format='%Y-%m-%d'), source=self.root,
+                             encoding=default_unicode)
+
+    def _snapshot(self):
+        return self.database.registered, time.time()
+
+    def _result(self, lines, snapshot, latency, **kw):
+        registered, started = snapshot
+        duration = time.time() - started
+        registered = self.database.registered - registered
+
+        result = { \
+            'duration'              : round(duration, 3),
+            'lines'                 : lines,
+            'registered'            : registered,
+            'lines_per_sec'         : _rate(lines, duration),
+            'registrations_per_sec' : _rate(registered, duration),
+            'p50'                   : latency.quantile(0.5),
+            'p99'                   : latency.quantile(0.99),
+            'latency'               : latency.snapshot(),
+            'peak_rss'              : peak_rss(),
+        }
+        result.update(kw)
+        return result
+
+    def run_emitter(self):
+        """
+            Catch-up of the tree by `Source.emitter`. Latency is a time of `_emit_line` (match and registration),
+            a time of the whole `emitter` call for the trees without `_emit_line`.
+        """
+        app = self.app
+        latency = make_histogram('emit_line')
+        emit_line = getattr(app, '_emit_line', None)
+
+        def _emit_line(*args, **kw):
+            started = time.time()
+            try:
+                return emit_line(*args, **kw)
+            finally:
+                latency.observe(time.time() - started)
+
+        if emit_line is not None:
+            app._emit_line = _emit_line
+
+        snapshot = self._snapshot()
+        started = time.time()
+
+        try:
+            processed, found = app.emitter(limit=0)
+        finally:
+            if emit_line is not None:
+                del app._emit_line
+            else:
+                latency.observe(time.time() - started)
+
+        self._flush()
+
+        return self._result(self.generator.stats['lines'], snapshot, latency, matched=processed,
+                            latency_of=emit_line is not None and 'line' or 'emitter')
+
+    def _flush(self):
+        """
+            Registers buffered Log-items (the trees with batch registration)
+        """
+        flush = getattr(self.app, 'flushLogItems', None)
+        if flush is not None:
+            flush()
+
+    def _watch_latency(self, dispatched):
+        """
+            Measures event latency by the runner (the trees without `LogConsumer.event_latency`):
+            a time from the first dispatch of the file event to the end of `launchObserverEvent`.
+
+            Arguments:
+                dispatched  -- dict: time of the first dispatch by file, {src_path: time}
+
+            Returns:
+                event_latency, register_latency -- histograms
+        """
+        app = self.app
+        event_latency = make_histogram('event_latency')
+        register_latency = make_histogram('register_latency')
+
+        watch, launch = app.watch, app.launchObserverEvent
+        watched = []
+
+        def _watch(event, *args, **kw):
+            watched[:] = [dispatched.pop(event.src_path, None)]
+            return watch(event, *args, **kw)
+
+        def _launch(*args, **kw):
+            logged = launch(*args, **kw)
+            pushed = watched and watched[0]
+            if pushed:
+                latency = time.time() - pushed
+                event_latency.observe(latency)
+                if logged and logged > 0:
+                    register_latency.observe(latency)
+            return logged
+
+        app.watch = _watch
+        app.launchObserverEvent = _launch
+
+        return event_latency, register_latency
+
+    def run_observer(self):
+        """
+            Observer path: Log-lines are appended to the files and events are dispatched to `LogProducer`
+            (as watchdog does), `LogConsumer` processes them. Latency is a time from event to the end of processing.
+        """
+        app = self.app
+        params = self.params
+
+        events, count = params['events'], params['event_lines']
+
+        lock = threading.Lock()
+
+        app._beforeObserve()
+
+        producer = LogProducer(app, lock, source=app._observer_source(), logger=self.logger,
+                               watch_everything=app.config.get('watch_everything'))
+        consumer = LogConsumer(args=(app, producer, lock, self.logger, float(app.config.get('sleep') or 1)))
+
+        # Latency is measured by the consumer or by the runner (older trees)
+        dispatched = {}
+
+        if hasattr(consumer, 'event_latency'):
+            consumer.event_latency = event_latency = make_histogram('event_latency')
+            consumer.register_latency = register_latency = make_histogram('register_latency')
+        else:
+            event_latency, register_latency = self._watch_latency(dispatched)
+
+        filenames = self.generator.files
+
+        snapshot = self._snapshot()
+
+        consumer.start()
+
+        try:
+            for n in range(events):
+                filename = filenames[n % len(filenames)]
+                self.generator.append(filename, count)
+                dispatched.setdefault(filename, time.time())
+                producer.dispatch(FileModifiedEvent(filename))
+
+            started = time.time()
+            while not producer.is_empty() and time.time() - started < DRAIN_TIMEOUT:
+                time.sleep(0.01)
+        finally:
+            consumer.stop()
+            consumer.join()
+
+            for name in ('watch', 'launchObserverEvent',):
+                if name in app.__dict__:
+                    delattr(app, name)
+
+        self._flush()
+
+        return self._result(events * count, snapshot, event_latency,
+                            events=events,
+                            processed=event_latency.count,
+                            overstock=len(app._lines),
+                            register_latency=register_latency.snapshot(),
+                            )
+
+    def run(self):
+        results = { \
+            'commit'   : git_commit(),
+            'date'     : getDate(getToday(), format='%Y-%m-%d %H:%M:%S'),
+            'python'   : platform.python_version(),
+            'platform' : platform.platform(),
+            'params'   : self.params,
+        }
+
+        self.setup()
+
+        try:
+            results['dataset'] = dict(self.generator.stats)
+            results['emitter'] = self.run_emitter()
+            if self.params['events']:
+                results['observer'] = self.run_observer()
+            results['database'] = self.database.stats()
+        finally:
+            self.app._term()
+            uninstall()
+            self.database.close()
+
+        return results
+
+
+def compare(baseline, results):
+    """
+        Returns changes of the compared metrics: [(name, baseline, current, change %)], change > 0 is better
+    """
+    items = []
+
+    for section, key, is_more_better in COMPARED:
+        a = (baseline.get(section) or {}).get(key)
+        b = (results.get(section) or {}).get(key)
+
+        if not a or b is None:
+            continue
+
+        change = (b - a) * 100.0 / a
+        items.append(('%s.%s' % (section, key), a, b, round(is_more_better and change or -change, 1),))
+
+    return items
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='End-to-end throughput benchmark of the Logger source')
+    parser.add_argument('output', help='JSON file of results')
+    parser.add_argument('--source', choices=SOURCES, default='bankperso')
+    parser.add_argument('--lines', type=int, default=DEFAULT_LINES, help='number of Log-lines of the tree')
+    parser.add_argument('--files', type=int, default=DEFAULT_FILES, help='number of Log-files')
+    parser.add_argument('--orders', type=int, default=DEFAULT_ORDERS, help='number of Orders')
+    parser.add_argument('--density', type=float, default=DEFAULT_DENSITY, help='share of Log-lines with Orders keys')
+    parser.add_argument('--malformed', type=float, default=DEFAULT_MALFORMED, help='share of malformed Log-lines')
+    parser.add_argument('--encodings', default=':'.join(DEFAULT_ENCODINGS), help='encodings of files: cp1251:utf-8:mixed')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--events', type=int, default=DEFAULT_EVENTS, help='number of observer events (0 - emitter only)')
+    parser.add_argument('--event-lines', type=int, default=DEFAULT_EVENT_LINES, help='Log-lines appended by every event')
+    parser.add_argument('--delay', type=float, default=0, help='emulated DB round-trip (sec)')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='config item, for example: register_batch=0, catchup_workers=4, read_mode=mmap')
+    parser.add_argument('--baseline', help='JSON file of the previous run to compare with')
+    parser.add_argument('--workdir', help='folder of the tree (temporary by default)')
+    parser.add_argument('--keep', action='store_true', help='keep the tree and the database')
+
+    args = parser.parse_args()
+
+    config = {}
+    for item in args.set:
+        key, value = item.split('=', 1)
+        config[key.strip()] = value.isdigit() and int(value) or value
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='logger-bench-')
+
+    try:
+        benchmark = Benchmark(args.source, workdir,
+                              lines=args.lines,
+                              files=args.files,
+                              orders=args.orders,
+                              density=args.density,
+                              malformed=args.malformed,
+                              encodings=tuple(filter(None, args.encodings.split(':'))),
+                              seed=args.seed,
+                              events=args.events,
+                              event_lines=args.event_lines,
+                              delay=args.delay,
+                              config=config,
+                              )
+        results = benchmark.run()
+    finally:
+        if not (args.keep or args.workdir):
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as fo:
+        json.dump(results, fo, indent=2, default=str)
+
+    for section in ('emitter', 'observer',):
+        if section in results:
+            x = results[section]
+            print('--> %-8s lines: %d, %.1f lines/s, %.1f registrations/s, p50: %s, p99: %s, peak RSS: %s' % (
+                section, x['lines'], x['lines_per_sec'], x['registrations_per_sec'], x['p50'], x['p99'], x['peak_rss']))
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as fin:
+            baseline = json.load(fin)
+
+        print('--> baseline: %s, current: %s' % (baseline.get('commit'), results.get('commit')))
+
+        for name, a, b, change in compare(baseline, results):
+            print('--> %-32s %12s %12s %+7.1f%%' % (name, a, b, change))
@@ -5,9 +5,16 @@ import sys
 import datetime
 import traceback
 import re
+import threading
+import atexit
 
 from collections import Iterable
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 basedir = \
     os.path.split(sys.executable)[1] == 'service.exe' and 'G:/apps/LoggerService' or \
     os.path.abspath(os.path.dirname(__file__))
@@ -25,6 +32,18 @@ IsExistsTrace          = 1  # Flag: prints DB-status for existent Log-items
 IsDisableOutput        = 0  # Flag: disabled stdout
 IsPrintExceptions      = 1  # Flag: sets printing of exceptions
 IsNoEmail              = 1  # Flag: don't send email
+IsAsyncTrace           = 1  # Flag: write trace by a background thread (TraceSink)
+
+# Trace sink: records queue size, flush interval (sec), batch size, sampling of INFO-records under backpressure
+TRACE_QUEUE_SIZE = 10000
+TRACE_FLUSH_INTERVAL = 1.0
+TRACE_BATCH_SIZE = 500
+TRACE_SAMPLE = 10
+
+# Trace levels
+TRACE_DEBUG = 0
+TRACE_INFO = 1
+TRACE_ERROR = 2
 
 LOCAL_FULL_TIMESTAMP   = '%d-%m-%Y %H:%M:%S'
 LOCAL_EXCEL_TIMESTAMP  = '%d.%m.%Y %H:%M:%S'
@@ -50,6 +69,19 @@ CONNECTION = {
     'orderlog'     : { 'server':'localhost', 'user':'sa', 'password':'admin', 'database':'OrderLog', 'timeout':15  },
 }
 
+# ---------------------------------------------------------------------
+# Database engines pool, may be overridden by `CONNECTION[name]['pool']`
+# ---------------------------------------------------------------------
+
+DB_POOL = {
+    'pooled'       : 1,     # Flag: keep one long-lived pooled engine per `CONNECTION` item
+    'size'         : 5,     # Number of connections kept open in the pool
+    'overflow'     : 5,     # Number of extra connections over `size` under the load
+    'timeout'      : 30,    # Seconds to wait for a free connection
+    'recycle'      : 3600,  # Seconds of connection life before recycle (idle connections drop)
+    'pre_ping'     : 1,     # Flag: ping connection on checkout and reconnect if it's dead
+}
+
 smtphost1 = {
     'host'         : '172.19.13.5', 
     'port'         : 25,
@@ -175,17 +207,158 @@ class Config(object):
 
 ##  --------------------------------------- ##
 
-def print_to(f, v, mode='ab', request=None, encoding=default_encoding):
+##  --------------------------------------- ##
+
+class TraceSink:
+    """
+        Asynchronous trace writer.
+
+        Records (bytes) are taken through a bounded queue and written by a background thread
+        in batches, files are kept open and flushed periodically. Under backpressure records
+        are dropped by level: TRACE_DEBUG are dropped, TRACE_INFO are sampled, TRACE_ERROR wait for the queue.
+    """
+
+    def __init__(self, size=TRACE_QUEUE_SIZE, interval=TRACE_FLUSH_INTERVAL):
+        self._size = size
+        self._interval = interval
+        self._n = 0
+
+        self._reset()
+
+        self.dropped = 0
+
+        # The writer thread is not running in a forked child (catch-up workers)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """
+            Sets a new state of the sink: records queued by the parent process are not inherited
+        """
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self._size)
+        self._handles = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='TraceSink', daemon=True)
+                self._thread.start()
+
+    def put(self, path, data, level=TRACE_INFO):
+        if self._thread is None or not self._thread.is_alive():
+            self._start()
+
+        try:
+            self._queue.put_nowait((path, data,))
+            return True
+        except queue.Full:
+            pass
+
+        if level == TRACE_INFO:
+            self._n += 1
+            if self._n % TRACE_SAMPLE:
+                level = TRACE_DEBUG
+
+        if level == TRACE_DEBUG:
+            self.dropped += 1
+            return False
+
+        try:
+            self._queue.put((path, data,), timeout=self._interval)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def rollover(self, path):
+        """
+            Closes the file of the given path (after all its queued records)
+        """
+        if path and self._thread is not None:
+            self._queue.put((path, None,))
+
+    def flush(self):
+        """
+            Waits until queued records are written
+        """
+        if self._thread is None and self._queue.empty():
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._start()
+        self._queue.join()
+
+    def _write(self, batch):
+        for path, data in batch:
+            try:
+                if data is None:
+                    fo = self._handles.pop(path, None)
+                    if fo is not None:
+                        fo.close()
+                    continue
+                fo = self._handles.get(path)
+                if fo is None:
+                    fo = self._handles[path] = open(path, mode='ab')
+                fo.write(data)
+            except:
+                pass
+
+        for fo in self._handles.values():
+            try:
+                fo.flush()
+            except:
+                pass
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self._interval)]
+            except queue.Empty:
+                continue
+
+            while len(batch) < TRACE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+
+            for x in batch:
+                self._queue.task_done()
+
+
+_trace_sink = IsAsyncTrace and TraceSink() or None
+
+def flush_trace():
+    if _trace_sink is not None:
+        _trace_sink.flush()
+
+atexit.register(flush_trace)
+
+def _write_to(f, data, mode='ab', level=TRACE_INFO):
+    if _trace_sink is not None and mode == 'ab':
+        _trace_sink.put(f, data, level)
+    else:
+        with open(f, mode=mode) as fo:
+            fo.write(data)
+
+def print_to(f, v, mode='ab', request=None, encoding=default_encoding, level=TRACE_INFO):
     items = not isIterable(v) and [v] or v
     if not f:
         f = getErrorlog()
-    fo = open(f, mode=mode)
+    output = []
     def _out(s):
         if not isinstance(s, bytes):
-            fo.write(s.encode(encoding, 'ignore'))
+            output.append(s.encode(encoding, 'ignore'))
         else:
-            fo.write(s)
-        fo.write(cr.encode())
+            output.append(s)
+        output.append(cr.encode())
     for text in items:
         try:
             if IsDeepDebug:
@@ -195,17 +368,19 @@ def print_to(f, v, mode='ab', request=None, encoding=default_encoding):
             _out(text)
         except Exception as e:
             pass
-    fo.close()
+    _write_to(f, b''.join(output), mode=mode, level=level)
 
 def print_exception(stack=None):
-    print_to(errorlog, '%s>>> %s:%s' % (cr, datetime.datetime.now().strftime(LOCAL_FULL_TIMESTAMP), cr))
-    traceback.print_exc(file=open(errorlog, 'a'))
+    output = ['%s>>> %s:%s' % (cr, datetime.datetime.now().strftime(LOCAL_FULL_TIMESTAMP), cr), cr, traceback.format_exc()]
     if stack is not None:
-        print_to(errorlog, '%s>>> Traceback stack:%s' % (cr, cr))
-        traceback.print_stack(file=open(errorlog, 'a'))
+        output += ['%s>>> Traceback stack:%s' % (cr, cr), cr] + traceback.format_stack()
+    _write_to(errorlog, ''.join(output).encode(default_encoding, 'ignore'), level=TRACE_ERROR)
 
 def setErrorlog(s):
-    _config.errorlog = s and normpath(os.path.join(basedir, s))
+    path = s and normpath(os.path.join(basedir, s))
+    if _trace_sink is not None and _config.errorlog and _config.errorlog != path:
+        _trace_sink.rollover(_config.errorlog)
+    _config.errorlog = path
 
 def getErrorlog():
     return _config.errorlog
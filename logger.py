@@ -9,6 +9,7 @@ import os
 import re
 import time
 import threading
+from multiprocessing import freeze_support
 
 from watchdog.observers import Observer
 
@@ -195,6 +196,8 @@ def run(**kw):
 
 
 if __name__ == "__main__":
+    freeze_support()
+
     argv = sys.argv
 
     setup_console(default_encoding)